@@ -1,23 +1,27 @@
+import io
 import os
+import hmac
+import csv
+import time
+import uuid
 import logging
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+import click
+from functools import wraps
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, make_response, Response, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-from werkzeug.security import generate_password_hash, check_password_hash
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from itsdangerous import URLSafeTimedSerializer
+from replicas import RoutingSession, replica_binds, replicas
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 # Create the app
 app = Flask(__name__)
@@ -40,10 +44,20 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# Connections per worker process; size pool_size to the worker's thread count (see gunicorn.conf.py)
+if not db_url.startswith("sqlite"):
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    })
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Optional read replicas, e.g. DATABASE_REPLICA_URLS=postgresql://replica-1/typing,postgresql://replica-2/typing
+app.config["SQLALCHEMY_BINDS"] = replica_binds(os.environ.get("DATABASE_REPLICA_URLS"))
 
 # Initialize the app with the extension
 db.init_app(app)
+replicas.init_app(app)
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -51,45 +65,96 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'  # type: ignore
 
 # Import models after db initialization
-from models import User, Lesson, Progress, Achievement
+from models import User, Progress, Achievement
+import telemetry
+import unlocks
+import history
+import progress_sync
+import export
+import roster
+import lesson_bundle
+from identity_cache import identity_cache
+from leaderboard import leaderboards
+from mailer import mail_queue
+from lesson_catalog import catalog as lesson_catalog
+from instrumentation import metrics
+from assets import assets, build_assets
+from page_cache import page_cache
+from hashing import hasher, HashingBusy
+from drills import drills
+
+telemetry.buffer.init_app(app)
+lesson_catalog.init_app(app)
+identity_cache.init_app(app)
+leaderboards.init_app(app)
+metrics.init_app(app)
+assets.init_app(app)
+page_cache.init_app(app)
+hasher.init_app(app)
+drills.init_app(app)
+metrics.register_stats('typing_identity_cache', identity_cache.stats)
+metrics.register_stats('typing_telemetry', telemetry.buffer.stats)
+metrics.register_stats('typing_mail', mail_queue.stats)
+metrics.register_stats('typing_page_cache', page_cache.stats)
+metrics.register_stats('typing_password_hashing', hasher.stats)
+metrics.register_stats('typing_replicas', replicas.stats)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Initialize DB and lessons once at startup
-with app.app_context():
-    db.create_all()
-    
-    # Create lessons if they don't exist
-    if Lesson.query.count() == 0:
-        for i in range(1, 22):
-            try:
-                with open(f'lessons/lesson{i}.txt', 'r') as f:
-                    content = f.read().strip()
-                lesson = Lesson()
-                lesson.number = i
-                lesson.content = content
-                lesson.title = f"Lesson {i}"
-                db.session.add(lesson)
-                logging.info(f"Added lesson {i}")
-            except FileNotFoundError:
-                logging.warning(f"lessons/lesson{i}.txt not found")
-        db.session.commit()
+    # Served from the identity cache; only a miss costs a primary-key lookup
+    return identity_cache.load(int(user_id))
+
+# Staff who may export data, e.g. ADMIN_EMAILS=teacher@school.org,analyst@school.org
+app.config['ADMIN_EMAILS'] = {email.strip().lower() for email in os.environ.get('ADMIN_EMAILS', '').split(',') if email.strip()}
+# Lets scripts call admin endpoints with "Authorization: Bearer <token>" instead of a login
+app.config['ADMIN_TOKEN'] = os.environ.get('ADMIN_TOKEN')
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+            return view(*args, **kwargs)
+        if not current_user.is_authenticated:
+            return login_manager.unauthorized()
+        if current_user.email.lower() not in app.config['ADMIN_EMAILS']:
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+def init_db(force=False):
+    """Create missing tables and sync lessons from the lesson bundle.
+
+    Run once per deploy with 'flask init-db' rather than in every worker.
+    force compares every lesson even if the bundle was already applied.
+    """
+    # Primary only: replicas get the schema through replication
+    db.create_all(bind_key=None)
+    return lesson_bundle.sync_lessons(force=force)
 
 @app.route('/')
+@page_cache.cached_page
 def home():
     return render_template('home.html')
 @app.route('/index')
 @app.route('/lessons')
+@page_cache.cached_page
 def index():
-    lessons = Lesson.query.order_by(Lesson.number).all()
+    if current_user.is_authenticated:
+        # Rebuilt only when this user's progress or the lessons change
+        lesson_grid = page_cache.fragment('lesson_grid', current_user.id, lambda: render_lesson_grid(current_user.id))
+    else:
+        lesson_grid = render_lesson_grid(None)
+    return render_template('index.html', lesson_grid=lesson_grid)
+
+def render_lesson_grid(user_id):
+    lessons = lesson_catalog.all()
     user_progress = {}
     unlocked_lessons = [1]  # First lesson is always unlocked
     
-    if current_user.is_authenticated:
+    if user_id is not None:
         # Get user's progress for each lesson
-        progress_records = Progress.query.filter_by(user_id=current_user.id).all()
+        progress_records = Progress.query.filter_by(user_id=user_id).all()
         for progress in progress_records:
             user_progress[progress.lesson_id] = {
                 'wpm': progress.wpm,
@@ -97,17 +162,11 @@ def index():
                 'completed': progress.accuracy >= 95.0
             }
         
-        # Calculate unlocked lessons based on 95% accuracy requirement
-        for i in range(1, 22):
-            if i == 1:  # First lesson always unlocked
-                continue
-            prev_progress = user_progress.get(i - 1)
-            if prev_progress and prev_progress['completed']:
-                unlocked_lessons.append(i)
-            else:
-                break  # Stop at first locked lesson
+        # Unlocks come from the maintained frontier instead of walking the records
+        frontier = unlocks.get_frontier(user_id)
+        unlocked_lessons = unlocks.unlocked_numbers(frontier, len(lessons))
     
-    return render_template('index.html', lessons=lessons, user_progress=user_progress, unlocked_lessons=unlocked_lessons)
+    return render_template('lesson_grid.html', lessons=lessons, user_progress=user_progress, unlocked_lessons=unlocked_lessons)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -132,8 +191,9 @@ def register():
             flash("Email already exists.", "error")
             return redirect(url_for('register'))
         
+        # Outside the try so a full hashing pool answers 503 rather than a generic error
+        password_hash = hasher.hash(password)
         try:
-            password_hash = generate_password_hash(password)
             user = User()
             user.email = email
             user.first_name = first_name
@@ -159,7 +219,12 @@ def login():
         password = request.form['password']
         
         user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password_hash, password):
+        matches, new_hash = hasher.verify(user.password_hash, password) if user else (False, None)
+        if matches:
+            if new_hash:
+                # Stored with an older PASSWORD_HASH_METHOD; upgrade while we have the password
+                user.password_hash = new_hash
+                db.session.commit()
             login_user(user)
             return redirect(url_for('home'))
         else:
@@ -167,9 +232,13 @@ def login():
     
     return render_template('login.html')
 
-# Email Configuration (Gmail SMTP)
-app.config['MAIL_USERNAME'] = 'jeancloete.ncape@gmail.com'
-app.config['MAIL_PASSWORD'] = 'your-app-password'  # NOT your regular password
+# Email Configuration (Gmail SMTP by default, override with MAIL_* environment variables)
+app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', 'jeancloete.ncape@gmail.com')
+app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', 'your-app-password')  # NOT your regular password
+mail_queue.init_app(app)
+
+# Signs password reset tokens
+serializer = URLSafeTimedSerializer(app.secret_key)
 
 @app.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
@@ -188,14 +257,7 @@ def forgot_password():
         token = serializer.dumps(user.email, salt='password-reset-salt')
         reset_url = url_for('reset_password', token=token, _external=True)
 
-        # Send email via SMTP
-        try:
-            msg = MIMEMultipart("alternative")
-            msg["Subject"] = "Password Reset Request"
-            msg["From"] = app.config['MAIL_USERNAME']
-            msg["To"] = email
-
-            text = f"""
+        text = f"""
             Hello,
 
             You requested a password reset for your TypingPro account.
@@ -211,7 +273,7 @@ def forgot_password():
             The TypingPro Team
             """
 
-            html = f"""
+        html = f"""
             <p>Hello,</p>
             <p>You requested a password reset for your <strong>TypingPro</strong> account.</p>
             <p><a href="{reset_url}" style="color: #10b981; font-weight: 600;">Reset Your Password</a></p>
@@ -220,24 +282,20 @@ def forgot_password():
             <p>Best regards,<br><strong>The TypingPro Team</strong></p>
             """
 
-            part1 = MIMEText(text, "plain")
-            part2 = MIMEText(html, "html")
-            msg.attach(part1)
-            msg.attach(part2)
-
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-                server.sendmail(msg["From"], msg["To"], msg.as_string())
-
-            flash("If that email is registered, a password reset link has been sent.", "info")
-            return redirect(url_for('login'))
-
+        # Queue the email; mail workers deliver it outside the request
+        try:
+            mail_queue.enqueue(email, "Password Reset Request", text, html)
+            db.session.commit()
+            mail_queue.notify()
         except Exception as e:
-            logging.error(f"SMTP Email Error: {e}")
+            db.session.rollback()
+            logging.error(f"Mail queue error: {e}")
             flash("Failed to send email. Please try again.", "error")
             return redirect(url_for('forgot_password'))
 
+        flash("If that email is registered, a password reset link has been sent.", "info")
+        return redirect(url_for('login'))
+
     return render_template('forgot_password.html')
 
 @app.route('/reset-password/<token>', methods=['GET', 'POST'])
@@ -256,31 +314,37 @@ def reset_password(token):
 
         user = User.query.filter_by(email=email).first()
         if user:
-            user.password_hash = generate_password_hash(password)
+            user.password_hash = hasher.hash(password)
             db.session.commit()
+            identity_cache.invalidate(user.id)
             flash("Your password has been updated.", "success")
             return redirect(url_for('login'))
 
     return render_template('reset_password.html', token=token)
 
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    # Shed load instead of queueing logins behind each other
+    response = make_response("Too many sign-ins at once. Please try again in a few seconds.", 503)
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @app.route('/logout')
 @login_required
 def logout():
+    identity_cache.invalidate(current_user.id)
     logout_user()
     return redirect(url_for('home'))
 
 @app.route('/lesson/<int:lesson_id>')
 def practice(lesson_id):
-    lesson = Lesson.query.filter_by(id=lesson_id).first_or_404()
+    lesson = lesson_catalog.get(lesson_id)
+    if lesson is None:
+        abort(404)
     
     # Check if lesson is unlocked for authenticated users
     if current_user.is_authenticated and lesson_id > 1:
-        prev_progress = Progress.query.filter_by(
-            user_id=current_user.id, 
-            lesson_id=lesson_id - 1
-        ).first()
-        
-        if not prev_progress or prev_progress.accuracy < 95.0:
+        if not unlocks.check_unlocked(current_user.id, lesson.number):
             flash(f"You must complete Lesson {lesson_id - 1} with 95% accuracy to unlock this lesson.", "warning")
             return redirect(url_for('index'))
     
@@ -299,63 +363,176 @@ def practice(lesson_id):
     
     return render_template('practice.html', lesson=lesson, previous_attempt=previous_attempt)
 
+@app.route('/practice/adaptive')
+@login_required
+def adaptive_practice():
+    # A fresh text each visit, weighted toward the keys this user misses most
+    drill = drills.build(current_user.id)
+    return render_template('practice.html', lesson=drill, previous_attempt=None, mode='adaptive')
+
+@app.route('/lesson/<int:lesson_id>/content')
+def lesson_content(lesson_id):
+    """Lesson text as JSON; the URL carries the content hash so it can be cached for good"""
+    lesson = lesson_catalog.get(lesson_id)
+    if lesson is None:
+        abort(404)
+    if lesson_id != 1:
+        if not current_user.is_authenticated or not unlocks.check_unlocked(current_user.id, lesson.number):
+            abort(403)
+
+    response = jsonify({"id": lesson.id, "number": lesson.number, "title": lesson.title, "content": lesson.content})
+    version = lesson.content_hash[:16]
+    response.set_etag(version)
+    if request.args.get('v') == version:
+        response.cache_control.private = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+@app.route('/sw.js')
+def service_worker():
+    """Offline support; served from the root so its scope covers every page"""
+    version = f"{assets.build_id()}-{lesson_catalog.content_hash[:8]}"
+    response = make_response(render_template(
+        'sw.js',
+        version=version,
+        precache=[assets.url('css/app.css'), assets.url('js/progress-queue.js'), assets.url('js/app.js')],
+    ))
+    response.mimetype = 'application/javascript'
+    # Browsers must always see a new worker version promptly
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/save_progress/<int:lesson_id>', methods=['POST'])
 @login_required
 def save_progress(lesson_id):
-    data = request.json or {}
-    wpm = data.get('wpm', 0)
-    accuracy = data.get('accuracy', 0)
-    time_taken = data.get('time_taken', 0)
-    errors = data.get('errors', 0)
-    
-    # Find existing progress or create new
-    progress = Progress.query.filter_by(user_id=current_user.id, lesson_id=lesson_id).first()
-    if not progress:
-        progress = Progress()
-        progress.user_id = current_user.id
-        progress.lesson_id = lesson_id
-    
-    # Update progress only if this attempt is better
-    # Always update if current accuracy is < 95%
-    current_accuracy = progress.accuracy if progress.accuracy is not None else 0.0
-    current_wpm = progress.wpm if progress.wpm is not None else 0
-    if current_accuracy < 95.0:
-        progress.wpm = wpm
-        progress.accuracy = accuracy
-        progress.time_taken = time_taken
-        progress.error_count = errors
+    data = request.get_json(silent=True) or {}
+    # Older clients send no idempotency key; each of their requests counts once
+    attempt = progress_sync.parse_attempt(dict(data, lesson_id=lesson_id, key=data.get('key') or uuid.uuid4().hex))
+    if attempt is None:
+        return jsonify({"status": "invalid"}), 400
+
+    result = progress_sync.sync_attempts(current_user.id, [attempt])[0]
+    if result['status'] == 'saved':
+        page_cache.bump_user(current_user.id)
+    return jsonify(result)
+
+@app.route('/sync_progress', methods=['POST'])
+@login_required
+def sync_progress():
+    """Apply a batch of attempts queued by a client, each with an idempotency key"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('attempts')
+    if not isinstance(items, list):
+        return jsonify({"status": "invalid"}), 400
+    if len(items) > progress_sync.MAX_BATCH:
+        return jsonify({"status": "too_large", "max_batch": progress_sync.MAX_BATCH}), 413
+
+    attempts = []
+    results = []
+    for item in items:
+        attempt = progress_sync.parse_attempt(item)
+        if attempt is None:
+            key = item.get('key') if isinstance(item, dict) else None
+            results.append({"key": key, "status": "invalid"})
+        else:
+            # Filled in below with the result for this position
+            results.append(len(attempts))
+            attempts.append(attempt)
+
+    applied = progress_sync.sync_attempts(current_user.id, attempts) if attempts else []
+    if any(result['status'] == 'saved' for result in applied):
+        page_cache.bump_user(current_user.id)
+    return jsonify({"results": [applied[r] if isinstance(r, int) else r for r in results]})
+
+@app.route('/telemetry/<int:lesson_id>', methods=['POST'])
+@login_required
+def save_telemetry(lesson_id):
+    return queue_telemetry(lesson_id)
+
+@app.route('/telemetry/drill', methods=['POST'])
+@login_required
+def save_drill_telemetry():
+    # Drill keystrokes only update the per-key error counts
+    return queue_telemetry(None)
+
+def queue_telemetry(lesson_id):
+    data = request.get_json(silent=True) or {}
+    attempt_id = str(data.get('attempt', ''))[:36]
+    seq = data.get('seq', 0)
+    if not attempt_id or not isinstance(seq, int) or not 0 <= seq <= telemetry.MAX_SEQ:
+        return jsonify({"status": "invalid"}), 400
+    if lesson_id is not None and lesson_catalog.get(lesson_id) is None:
+        abort(404)
+
+    try:
+        events = telemetry.decode_batch(data)
+    except ValueError as e:
+        return jsonify({"status": "invalid", "error": str(e)}), 400
+
+    # Only queue the batch here; the write-behind buffer does the database work
+    if not telemetry.buffer.submit(current_user.id, lesson_id, attempt_id, seq, events):
+        response = jsonify({"status": "busy"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    return jsonify({"status": "queued"}), 202
+
+@app.route('/admin/export/<dataset>.<fmt>')
+@admin_required
+def export_data(dataset, fmt):
+    """Stream Progress or AttemptLog rows with their user and lesson as CSV or NDJSON"""
+    if fmt not in export.FORMATS:
+        abort(404)
+    filters = {
+        'lesson': request.args.get('lesson'),
+        'since': request.args.get('since'),
+        'until': request.args.get('until'),
+        'cohort': request.args.get('cohort'),
+    }
+    try:
+        filters['lesson'] = export.parse_lesson(filters['lesson'])
+        query = export.export_query(dataset, **filters)
+    except ValueError as e:
+        return jsonify({"status": "invalid", "error": str(e)}), 400
+
+    response = Response(stream_with_context(export.render(query, fmt)), content_type=export.CONTENT_TYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export.filename(dataset, fmt, **filters)}"'
+    response.headers['Cache-Control'] = 'no-store'
+    # Ask proxies such as nginx to pass chunks through rather than buffer the whole export
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/admin/roster', methods=['POST'])
+@admin_required
+def import_roster():
+    """Create accounts from an uploaded CSV roster (form field 'roster', or a text/csv body)"""
+    upload = request.files.get('roster')
+    if upload is not None:
+        lines = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
     else:
-        # Only update if new attempt is better (protect passing score)
-        if wpm > progress.wpm or (wpm == progress.wpm and accuracy > progress.accuracy):
-            progress.wpm = wpm
-            progress.accuracy = accuracy
-            progress.time_taken = time_taken
-            progress.error_count = errors
-    
-    db.session.add(progress)
-    db.session.commit()
-    
-    # Check for achievements
-    achievements = []
-    if accuracy >= 95.0 and lesson_id < 23:
-        achievements.append(f"Lesson {lesson_id} completed! Lesson {lesson_id + 1} unlocked!")
-    elif accuracy >= 95.0 and lesson_id == 23:
-        achievements.append("Congratulations! You've completed all lessons!")
-    
-    if wpm >= 40 and accuracy >= 95.0:
-        achievements.append("Speed Demon! 40+ WPM with 95%+ accuracy!")
-    
-    return jsonify({
-        "status": "saved",
-        "achievements": achievements,
-        "accuracy_met": accuracy >= 95.0,
-        "next_lesson_unlocked": accuracy >= 95.0 and lesson_id < 23
-    })
+        lines = io.StringIO(request.get_data(as_text=True).lstrip('\ufeff'), newline='')
+    try:
+        result = roster.import_roster(
+            lines,
+            start_lesson=request.values.get('start_lesson'),
+            dry_run=request.values.get('dry_run', '0') not in ('', '0', 'false'),
+        )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"status": "invalid", "error": str(e)}), 400
+    response = jsonify(dict(result, status="ok"))
+    # The body can carry generated passwords
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 @app.route('/lesson_complete/<int:lesson_id>')
 @login_required
 def lesson_complete(lesson_id):
-    lesson = Lesson.query.get_or_404(lesson_id)
+    lesson = lesson_catalog.get(lesson_id)
+    if lesson is None:
+        abort(404)
     progress = Progress.query.filter_by(user_id=current_user.id, lesson_id=lesson_id).first()
     
     # Must have completed with ≥95% accuracy
@@ -364,15 +541,21 @@ def lesson_complete(lesson_id):
     
     next_lesson = None
     if lesson_id < 23:
-        next_lesson = Lesson.query.filter_by(number=lesson.number + 1).first()
+        next_lesson = lesson_catalog.by_number(lesson.number + 1)
     
-    return render_template('lesson_complete.html', lesson=lesson, progress=progress, next_lesson=next_lesson)
+    # This worker's board may predate the save if another worker handled it
+    leaderboards.record(lesson_id, current_user.id, progress.wpm, progress.accuracy)
+    standing = leaderboards.standing(lesson_id, current_user.id)
+    leaders = leaderboards.top(lesson_id, 10)
+    
+    return render_template('lesson_complete.html', lesson=lesson, progress=progress, next_lesson=next_lesson,
+                           standing=standing, leaders=leaders)
 
 @app.route('/progress')
 @login_required
 def progress():
     records = Progress.query.filter_by(user_id=current_user.id).order_by(Progress.lesson_id).all()
-    lessons = {l.id: l for l in Lesson.query.all()}
+    lessons = lesson_catalog.by_id()
     
     # Calculate statistics
     total_lessons = len(records)
@@ -388,7 +571,116 @@ def progress():
         'completion_rate': round((completed_lessons / 21) * 100, 1)
     }
     
-    return render_template('progress.html', records=records, lessons=lessons, stats=stats)
+    for r in records:
+        leaderboards.record(r.lesson_id, current_user.id, r.wpm, r.accuracy)
+    standings = {r.lesson_id: leaderboards.standing(r.lesson_id, current_user.id) for r in records}
+    trend = history.user_trend(current_user.id, period='week', count=12)
+    
+    return render_template('progress.html', records=records, lessons=lessons, stats=stats, standings=standings,
+                           trend=trend)
+
+@app.cli.command('init-db')
+@click.option('--force', is_flag=True, help="Compare every lesson even if the bundle was already applied.")
+def init_db_command(force):
+    """Create tables and sync lessons from lessons/manifest.json"""
+    result = init_db(force=force)
+    if result['skipped']:
+        click.echo(f"Lesson bundle v{result['version']} already applied")
+    else:
+        click.echo(f"Lesson bundle v{result['version']}: {result['added']} added, "
+                   f"{result['updated']} updated, {result['unchanged']} unchanged")
+
+@app.cli.command('build-lesson-bundle')
+def build_lesson_bundle():
+    """Rewrite lessons/manifest.json after editing lesson files"""
+    manifest = lesson_bundle.build_manifest()
+    click.echo(f"Lesson bundle v{manifest['version']} ({len(manifest['lessons'])} lessons, "
+               f"{manifest['bundle_sha256'][:12]})")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress CSS/JS into static/dist"""
+    manifest = build_assets()
+    for name, entry in sorted(manifest.items()):
+        click.echo(f"{name} -> {entry['path']} ({entry['bytes']} B, gzip {entry['gz']} B, brotli {entry.get('br', '-')} B)")
+
+@app.cli.command('check-frontiers')
+@click.option('--fix', is_flag=True, help="Rewrite frontiers that disagree with Progress.")
+def check_frontiers(fix):
+    """Rebuild unlock frontiers from Progress and report mismatches"""
+    mismatches = unlocks.rebuild_frontiers(fix=fix)
+    for user_id, stored, expected in mismatches:
+        click.echo(f"user {user_id}: stored {stored}, expected {expected}")
+    click.echo(f"{len(mismatches)} mismatched frontier(s){' fixed' if fix and mismatches else ''}")
+
+@app.cli.command('compact-attempts')
+@click.option('--raw-days', default=90, show_default=True, help="Keep raw attempts this many days.")
+@click.option('--daily-days', default=400, show_default=True, help="Keep daily rollups this many days.")
+def compact_attempts(raw_days, daily_days):
+    """Delete raw attempts and daily rollups past their retention window"""
+    raw_deleted, daily_deleted = history.compact_attempts(raw_days=raw_days, daily_days=daily_days)
+    # Sync receipts only need to outlive client retries, which never take as long as raw attempts are kept
+    receipts_deleted = progress_sync.prune_receipts(days=raw_days)
+    click.echo(f"Deleted {raw_deleted} raw attempt(s), {daily_deleted} daily rollup(s) "
+               f"and {receipts_deleted} sync receipt(s)")
+
+@app.cli.command('export')
+@click.argument('dataset', type=click.Choice(export.DATASETS))
+@click.option('--format', 'fmt', type=click.Choice(export.FORMATS), default='csv', show_default=True)
+@click.option('--lesson', type=int, help="Only this lesson number.")
+@click.option('--since', help="Rows recorded on or after this date (YYYY-MM-DD).")
+@click.option('--until', help="Rows recorded before this date (YYYY-MM-DD).")
+@click.option('--cohort', help="Users who signed up in this month (YYYY-MM).")
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help="File to write (default: stdout).")
+def export_command(dataset, fmt, lesson, since, until, cohort, output):
+    """Stream progress or attempt rows with user and lesson details"""
+    try:
+        query = export.export_query(dataset, lesson=lesson, since=since, until=until, cohort=cohort)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for chunk in export.render(query, fmt):
+        output.write(chunk)
+
+@app.cli.command('import-roster')
+@click.argument('roster_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--start-lesson', type=int, help="Lesson new students start on, unless the roster says otherwise.")
+@click.option('--workers', type=int, default=os.cpu_count(), show_default=True, help="Hashing processes (0 hashes in this process).")
+@click.option('--chunk-size', type=int, default=roster.CHUNK_SIZE, show_default=True, help="Users per INSERT batch and commit.")
+@click.option('--credentials', type=click.File('w', encoding='utf-8'), default='-', help="Where to write email,password for generated passwords (default: stdout).")
+@click.option('--dry-run', is_flag=True, help="Validate the roster and report duplicates without creating anything.")
+def import_roster_command(roster_file, start_lesson, workers, chunk_size, credentials, dry_run):
+    """Create accounts from a CSV roster (email, first_name, last_name[, password, start_lesson])"""
+    try:
+        result = roster.import_roster(roster_file, start_lesson=start_lesson, chunk_size=chunk_size,
+                                      workers=workers, dry_run=dry_run)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    for line, email, reason in result['problems']:
+        click.echo(f"line {line}: {email or '(no email)'}: {reason}", err=True)
+    if result['credentials']:
+        writer = csv.writer(credentials)
+        writer.writerow(['email', 'password'])
+        writer.writerows(result['credentials'])
+    verb = "Would create" if dry_run else "Created"
+    rate = result['created'] / result['seconds'] if result['seconds'] else 0
+    click.echo(f"{verb} {result['created']} user(s), skipped {result['skipped']} in {result['seconds']:.2f}s ({rate:.0f} users/s)", err=True)
+
+@app.cli.command('mail-worker')
+@click.option('--workers', type=int, default=None, help="Worker threads (default: MAIL_WORKERS).")
+@click.option('--once', is_flag=True, help="Send everything that is due, then exit.")
+def mail_worker(workers, once):
+    """Deliver queued mail from this process"""
+    if once:
+        click.echo(f"Handled {mail_queue.process_due()} message(s)")
+        return
+    mail_queue.start(workers)
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        mail_queue.stop()
 
 if __name__ == '__main__':
+    with app.app_context():
+        init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,371 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import mimetypes
+import threading
+
+from flask import request, send_file, abort, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_NAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+ASSET_DIRS = ('css', 'js')
+
+# Logical bundle name -> source files (relative to static/), concatenated in order
+BUNDLES = {
+    'css/app.css': ['css/style.css'],
+    'js/app.js': ['js/typing.js'],
+    'js/progress-queue.js': ['js/progress-queue.js'],
+}
+
+_CSS_TOKEN = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/|\s+', re.S)
+_CSS_TIGHT = set('{};,>')
+_JS_WORD = re.compile(r'[A-Za-z0-9_$\\]')
+_JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw', 'yield')
+
+
+def minify_css(text):
+    """Strip comments and collapse whitespace, leaving strings untouched"""
+    out = []
+
+    def last():
+        for part in reversed(out):
+            if part:
+                return part[-1]
+        return ''
+
+    pos = 0
+    for match in _CSS_TOKEN.finditer(text):
+        out.append(text[pos:match.start()])
+        token = match.group()
+        pos = match.end()
+        if token[0] in '"\'':
+            out.append(token)
+        elif token.startswith('/*'):
+            continue
+        else:
+            following = text[pos:pos + 1]
+            if last() and following and last() not in _CSS_TIGHT and last() != ':' and following not in _CSS_TIGHT:
+                out.append(' ')
+    out.append(text[pos:])
+    css = ''.join(out)
+    return css.replace(';}', '}').strip()
+
+
+def _skip_string(text, i, quote):
+    """Index just past the string literal starting at text[i]"""
+    i += 1
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def _skip_template(text, i):
+    """Index just past the template literal starting at text[i], including ${...} expressions"""
+    i += 1
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '`':
+            return i + 1
+        if c == '$' and text[i + 1:i + 2] == '{':
+            depth = 1
+            i += 2
+            while i < len(text) and depth:
+                c = text[i]
+                if c in '"\'':
+                    i = _skip_string(text, i, c)
+                    continue
+                if c == '`':
+                    i = _skip_template(text, i)
+                    continue
+                depth += c == '{'
+                depth -= c == '}'
+                i += 1
+            continue
+        i += 1
+    return i
+
+
+def _skip_regex(text, i):
+    """Index just past the regex literal (and flags) starting at text[i]"""
+    i += 1
+    in_class = False
+    while i < len(text):
+        c = text[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            break
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(text) and _JS_WORD.match(text[i]):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def minify_js(text):
+    """Remove comments and redundant whitespace without renaming anything.
+
+    Line breaks are kept wherever automatic semicolon insertion could depend
+    on them; strings, template literals and regex literals pass through as is.
+    """
+    out = []
+    i = 0
+    n = len(text)
+
+    def last():
+        for part in reversed(out):
+            if part:
+                return part[-1]
+        return ''
+
+    def regex_allowed():
+        code = ''.join(out[-8:]).rstrip()
+        if not code or code[-1] in _JS_REGEX_AFTER:
+            return True
+        return any(code.endswith(word) and (len(code) == len(word) or not _JS_WORD.match(code[-len(word) - 1]))
+                   for word in _JS_REGEX_KEYWORDS)
+
+    while i < n:
+        c = text[i]
+        if c in '"\'':
+            end = _skip_string(text, i, c)
+            out.append(text[i:end])
+            i = end
+        elif c == '`':
+            end = _skip_template(text, i)
+            out.append(text[i:end])
+            i = end
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end == -1 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            # A comment spanning lines still separates statements
+            out.append('\n' if '\n' in text[i:end] else ' ')
+            i = end
+        elif c == '/' and regex_allowed():
+            end = _skip_regex(text, i)
+            out.append(text[i:end])
+            i = end
+        elif c.isspace():
+            end = i
+            while end < n and text[end].isspace():
+                end += 1
+            newline = '\n' in text[i:end]
+            prev = last()
+            following = text[end:end + 1]
+            if newline and prev and prev not in '{;,(\n' and following not in ('}', ')', ''):
+                out.append('\n')
+            elif prev and following and (
+                (_JS_WORD.match(prev) and _JS_WORD.match(following)) or (prev in '+-' and following in '+-')
+            ):
+                out.append(' ')
+            i = end
+        else:
+            out.append(c)
+            i += 1
+
+    js = ''.join(out)
+    # Whitespace-only runs collapsed above can leave "\n " or " \n" pairs
+    return re.sub(r' ?\n[ \n]*', '\n', js).strip() + '\n'
+
+
+def _fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _hashed_name(name, digest):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def _sources(static_dir):
+    """Every CSS and JS file under static/ as its own asset, plus the bundles"""
+    assets = {}
+    for directory in ASSET_DIRS:
+        base = os.path.join(static_dir, directory)
+        if not os.path.isdir(base):
+            continue
+        for filename in sorted(os.listdir(base)):
+            if filename.endswith(('.css', '.js')):
+                name = f"{directory}/{filename}"
+                assets[name] = [name]
+    assets.update(BUNDLES)
+    return assets
+
+
+def build_assets(static_dir=STATIC_DIR, with_brotli=True):
+    """Minify, fingerprint and precompress every asset into static/dist.
+
+    Returns the manifest: logical name -> {path, bytes, sources, gz, br}.
+    """
+    dist_dir = os.path.join(static_dir, DIST_NAME)
+    os.makedirs(dist_dir, exist_ok=True)
+    keep = {MANIFEST_NAME}
+    manifest = {}
+
+    for name, sources in _sources(static_dir).items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), 'r', encoding='utf-8') as f:
+                parts.append(f.read())
+        text = '\n'.join(parts)
+        text = minify_css(text) if name.endswith('.css') else minify_js(text)
+        data = text.encode('utf-8')
+
+        hashed = _hashed_name(name, _fingerprint(data))
+        path = os.path.join(dist_dir, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'path': hashed, 'bytes': len(data), 'sources': sources}
+
+        variants = [('', data), ('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None and with_brotli:
+            variants.append(('.br', brotli.compress(data, quality=11)))
+        for suffix, payload in variants:
+            with open(path + suffix, 'wb') as f:
+                f.write(payload)
+            keep.add(hashed + suffix)
+            if suffix:
+                entry[suffix[1:]] = len(payload)
+        manifest[name] = entry
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    # Drop outputs from earlier builds
+    for root, _dirs, files in os.walk(dist_dir):
+        for filename in files:
+            relative = os.path.relpath(os.path.join(root, filename), dist_dir).replace(os.sep, '/')
+            if relative not in keep:
+                os.remove(os.path.join(root, filename))
+    return manifest
+
+
+class AssetPipeline:
+    """Serves the built assets under /assets with immutable caching.
+
+    Templates call asset_url('css/app.css'); the URL carries the content hash,
+    so responses can be cached for a year. The precompressed .br or .gz file is
+    chosen from Accept-Encoding and nothing is compressed per request. If no
+    build exists yet (or, in debug mode, a source changed) the assets are built
+    on first use. With ASSETS_ENABLED off, asset_url falls back to the plain
+    static files.
+    """
+
+    def __init__(self, app=None, static_dir=STATIC_DIR):
+        self.app = app
+        self.static_dir = static_dir
+        self.dist_dir = os.path.join(static_dir, DIST_NAME)
+        self._manifest = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('ASSETS_ENABLED', os.environ.get('ASSETS_ENABLED', '1') != '0')
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        app.add_url_rule('/assets/<path:filename>', 'assets', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+
+    def _stale(self):
+        path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return True
+        if not self.app.debug:
+            return False
+        built = os.path.getmtime(path)
+        return any(
+            os.path.getmtime(os.path.join(self.static_dir, source)) > built
+            for sources in _sources(self.static_dir).values() for source in sources
+        )
+
+    def manifest(self):
+        if self._manifest is not None and not self.app.debug:
+            return self._manifest
+        with self._lock:
+            if self._stale():
+                logging.info("Building static assets")
+                self._manifest = build_assets(self.static_dir)
+            elif self._manifest is None:
+                with open(os.path.join(self.dist_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)
+                if set(BUNDLES) - set(self._manifest):
+                    # Built before a bundle was added
+                    logging.info("Rebuilding static assets for new bundles")
+                    self._manifest = build_assets(self.static_dir)
+        return self._manifest
+
+    def build_id(self):
+        """Short hash of the current build, for cache keys of pages that link assets"""
+        if not self.app.config['ASSETS_ENABLED']:
+            return 'static'
+        paths = ','.join(sorted(entry['path'] for entry in self.manifest().values()))
+        return _fingerprint(paths.encode('utf-8'))
+
+    def url(self, name):
+        if not self.app.config['ASSETS_ENABLED']:
+            sources = BUNDLES.get(name, [name])
+            return url_for('static', filename=sources[0])
+        return url_for('assets', filename=self.manifest()[name]['path'])
+
+    def serve(self, filename):
+        known = {entry['path']: entry for entry in self.manifest().values()}
+        entry = known.get(filename)
+        if entry is None:
+            abort(404)
+
+        path = os.path.join(self.dist_dir, filename)
+        encoding = None
+        accept = request.accept_encodings
+        if 'br' in entry and accept.quality('br') > 0:
+            encoding = 'br'
+        elif 'gz' in entry and accept.quality('gzip') > 0:
+            encoding = 'gzip'
+        if encoding:
+            path += '.br' if encoding == 'br' else '.gz'
+
+        response = send_file(
+            path,
+            mimetype=mimetypes.guess_type(filename)[0],
+            max_age=self.app.config['ASSETS_MAX_AGE'],
+            conditional=True,
+            etag=f"{filename}-{encoding or 'identity'}",
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.immutable = True
+        response.cache_control.public = True
+        return response
+
+
+assets = AssetPipeline()
@@ -0,0 +1,105 @@
+"""Compare static asset bytes transferred with and without the asset pipeline.
+
+Usage:
+    python benchmarks/bench_assets.py
+    python benchmarks/bench_assets.py --encoding gzip      # client without brotli support
+
+A simulated browser loads the home, lesson grid and practice pages with a cold
+cache, then loads them again. It follows the cache headers the way a browser
+does: responses marked immutable (or still fresh) are not requested again,
+others are revalidated with If-None-Match / If-Modified-Since. Only local CSS
+and JS are counted; page HTML and third-party fonts are the same either way.
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ASSET_RE = re.compile(r'<(?:link[^>]+href|script[^>]+src)="(/[^"]+\.(?:css|js))"')
+PAGES = ['/', '/lessons', '/lesson/1']
+
+
+class Browser:
+    def __init__(self, client, encoding):
+        self.client = client
+        self.encoding = encoding
+        self.cache = {}  # url -> response headers
+
+    def fetch_asset(self, url):
+        cached = self.cache.get(url)
+        if cached is not None:
+            cache_control = cached.get('Cache-Control', '')
+            if 'immutable' in cache_control or ('max-age=' in cache_control and 'no-cache' not in cache_control):
+                return 0, 0
+        headers = {'Accept-Encoding': self.encoding}
+        if cached is not None:
+            if cached.get('ETag'):
+                headers['If-None-Match'] = cached['ETag']
+            if cached.get('Last-Modified'):
+                headers['If-Modified-Since'] = cached['Last-Modified']
+        response = self.client.get(url, headers=headers)
+        body = response.get_data()
+        if response.status_code == 200:
+            self.cache[url] = response.headers
+        elif response.status_code != 304:
+            raise RuntimeError(f"{url} returned {response.status_code}")
+        return 1, len(body)
+
+    def load(self, page):
+        html = self.client.get(page).get_data(as_text=True)
+        requests = transferred = 0
+        for url in dict.fromkeys(ASSET_RE.findall(html)):
+            count, size = self.fetch_asset(url)
+            requests += count
+            transferred += size
+        return requests, transferred
+
+
+def run(app, enabled, encoding):
+    app.config['ASSETS_ENABLED'] = enabled
+    client = app.test_client()
+    client.post('/login', data={'email': 'bench@example.com', 'password': 'benchmark-pass'})
+    browser = Browser(client, encoding)
+    results = {}
+    for visit in ('first', 'repeat'):
+        totals = [0, 0]
+        for page in PAGES:
+            requests, transferred = browser.load(page)
+            totals[0] += requests
+            totals[1] += transferred
+        results[visit] = totals
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--encoding', default='gzip, deflate, br', help="Accept-Encoding the client sends")
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'assets_bench.db')}"
+    from app import app, db, init_db
+    from models import User
+    from assets import build_assets
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        init_db()
+        db.session.add(User(email='bench@example.com', first_name='Bench', last_name='User',
+                            password_hash=generate_password_hash('benchmark-pass')))
+        db.session.commit()
+    build_assets()
+
+    print(f"pages: {', '.join(PAGES)}   Accept-Encoding: {args.encoding}")
+    print(f"{'':24s} {'requests':>9s} {'bytes':>10s}")
+    for label, enabled in (('before (static/)', False), ('after (/assets)', True)):
+        results = run(app, enabled, args.encoding)
+        for visit in ('first', 'repeat'):
+            requests, transferred = results[visit]
+            print(f"{label + ' ' + visit:24s} {requests:9d} {transferred:10d}")
+
+
+if __name__ == '__main__':
+    main()
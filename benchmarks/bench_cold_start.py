@@ -0,0 +1,73 @@
+"""Measure worker cold start: time to import app.py and serve the first responses.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--app-dir PATH] [--database-url URL]
+
+Each run is a fresh interpreter, like a newly forked gunicorn worker. The
+database is initialised once up front (as a deploy would with
+'flask init-db'), so the numbers show what every worker pays on boot.
+Point --app-dir at another checkout to compare revisions.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, '.')
+import app as application
+imported = time.perf_counter()
+client = application.app.test_client()
+first = client.get('/')
+first_done = time.perf_counter()
+lessons = client.get('/lessons')
+lessons_done = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_response': first_done - start,
+    'lessons_response': lessons_done - first_done,
+    'status': [first.status_code, lessons.status_code],
+}))
+'''
+
+
+def run_probe(app_dir, env):
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=app_dir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def initialise(app_dir, env):
+    # Newer trees have an explicit init step; older ones set up on import
+    has_init = 'init-db' in open(os.path.join(app_dir, 'app.py')).read()
+    command = ['-m', 'flask', '--app', 'app', 'init-db'] if has_init else ['-c', 'import app']
+    subprocess.run([sys.executable] + command, cwd=app_dir, env=env, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--app-dir', default=ROOT)
+    parser.add_argument('--database-url', help="Default: a throwaway SQLite file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'cold_start.db')}"
+    initialise(args.app_dir, env)
+
+    samples = [run_probe(args.app_dir, env) for _ in range(args.runs)]
+    for key in ('import', 'first_response', 'lessons_response'):
+        values = [s[key] * 1000 for s in samples]
+        print(f"{key:18s} median {statistics.median(values):8.1f} ms   min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
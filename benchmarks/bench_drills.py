@@ -0,0 +1,61 @@
+"""Time adaptive drill generation against the lesson corpus.
+
+Usage:
+    python benchmarks/bench_drills.py [--runs 2000] [--length 300] [--keys 60]
+
+Builds the DrillIndex from lessons/ once, then generates --runs drills for
+users with random error counts over --keys characters and bigrams. Reported:
+index build time and generation latency percentiles.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from drills import DrillIndex, error_rates
+
+
+def load_lessons():
+    lessons = []
+    for i in range(1, 22):
+        path = os.path.join(ROOT, 'lessons', f'lesson{i}.txt')
+        if os.path.exists(path):
+            with open(path) as f:
+                lessons.append(f.read().strip())
+    return lessons
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--length', type=int, default=300, help="Characters per drill")
+    parser.add_argument('--keys', type=int, default=60, help="Keys with error counts per user")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = DrillIndex(load_lessons())
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"index: {len(index.words)} words, {len(index.by_key)} keys, built in {build_ms:.1f} ms")
+
+    rng = random.Random(0)
+    keys = sorted(index.by_key)
+    timings = []
+    for _ in range(args.runs):
+        rows = [(key, rng.randint(20, 400), 0) for key in rng.sample(keys, min(args.keys, len(keys)))]
+        rows = [(key, presses, rng.randint(0, presses // 5)) for key, presses, _ in rows]
+        rates = error_rates(rows)
+        started = time.perf_counter()
+        index.generate(rates, args.length, rng=rng)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    pick = lambda pct: timings[min(len(timings) - 1, int(len(timings) * pct / 100))] * 1000
+    print(f"generate ({args.runs} runs): p50 {pick(50):.3f} ms  p95 {pick(95):.3f} ms  p99 {pick(99):.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
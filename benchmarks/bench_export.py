@@ -0,0 +1,131 @@
+"""Bulk export throughput, time to first byte and peak memory.
+
+Usage:
+    python benchmarks/bench_export.py                        # 200k Progress rows in a throwaway SQLite file
+    python benchmarks/bench_export.py --rows 1000000 --format ndjson
+    python benchmarks/bench_export.py --database-url postgresql://localhost/typing_bench --rows 2000000
+
+Seeds --rows Progress rows (users x lessons), then downloads the full export
+through /admin/export/progress.<format> with the test client, each run in a
+fresh interpreter so peak RSS belongs to that run alone:
+
+    buffered  every row loaded with .all() and encoded before the response is sent
+    stream    the endpoint as shipped: yield_per partitions in a chunked response
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def seed(rows):
+    from datetime import datetime, timedelta
+    from sqlalchemy import insert, func
+    from app import db, init_db
+    from models import User, Progress, Lesson
+
+    init_db()
+    if db.session.query(func.count(Progress.id)).scalar() >= rows:
+        return
+    lessons = [lesson_id for (lesson_id,) in db.session.query(Lesson.id).order_by(Lesson.number)]
+    users = -(-rows // len(lessons))
+    start = datetime(2024, 1, 1)
+    for first in range(0, users, 5000):
+        batch = range(first, min(users, first + 5000))
+        db.session.execute(insert(User), [{
+            'email': f'export{n}@example.com', 'first_name': 'Export', 'last_name': f'User{n}',
+            'password_hash': 'x', 'created_at': start + timedelta(hours=n),
+        } for n in batch])
+        ids = [user_id for (user_id,) in db.session.query(User.id).filter(User.email.in_([f'export{n}@example.com' for n in batch]))]
+        db.session.execute(insert(Progress), [{
+            'user_id': user_id, 'lesson_id': lesson_id, 'wpm': 20 + (user_id + lesson_id) % 40,
+            'accuracy': 90 + (user_id * lesson_id) % 10, 'time_taken': 60, 'error_count': user_id % 7,
+            'timestamp': start + timedelta(hours=user_id, minutes=lesson_id),
+        } for user_id in ids for lesson_id in lessons])
+        db.session.commit()
+
+
+def run(mode, fmt):
+    import export
+    from app import app
+
+    app.config['ADMIN_TOKEN'] = 'bench'
+    client = app.test_client()
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if mode == 'buffered':
+        original = export.render
+
+        def buffered(query, fmt, yield_per=None):
+            from app import db
+            # What a naive export does: all rows in memory, then one big body
+            rows = db.session.execute(query).all()
+            chunks = list(original(query, fmt))
+            rows.clear()
+            yield ''.join(chunks)
+        export.render = buffered
+
+    started = time.perf_counter()
+    response = client.get(f'/admin/export/progress.{fmt}', headers={'Authorization': 'Bearer bench'}, buffered=False)
+    first_byte = None
+    size = lines = 0
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+        lines += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+    response.close()
+    elapsed = time.perf_counter() - started
+    rows = lines - (1 if fmt == 'csv' else 0)
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 2),
+        'rows_per_s': round(rows / elapsed),
+        'ttfb_ms': round((first_byte or elapsed) * 1000, 1),
+        'mb': round(size / 1e6, 1),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'growth_mb': round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Database to use (default: temporary SQLite file)")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    parser.add_argument('--mode', choices=['seed', 'buffered', 'stream'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        from app import app
+        with app.app_context():
+            if args.mode == 'seed':
+                seed(args.rows)
+            else:
+                print(json.dumps(run(args.mode, args.format)))
+        return
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'export_bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING')
+    command = [sys.executable, os.path.abspath(__file__), '--rows', str(args.rows), '--format', args.format]
+    started = time.perf_counter()
+    subprocess.run(command + ['--mode', 'seed'], env=env, check=True)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s; format {args.format}")
+
+    print(f"{'mode':9s} {'rows':>9s} {'rows/s':>9s} {'TTFB ms':>9s} {'MB':>7s} {'peak RSS MB':>12s} {'RSS growth MB':>14s}")
+    for mode in ('buffered', 'stream'):
+        output = subprocess.run(command + ['--mode', mode], env=env, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:9s} {result['rows']:9d} {result['rows_per_s']:9d} {result['ttfb_ms']:9.1f} "
+              f"{result['mb']:7.1f} {result['peak_rss_mb']:12.1f} {result['growth_mb']:14.1f}")
+
+
+if __name__ == '__main__':
+    main()
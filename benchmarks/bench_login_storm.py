@@ -0,0 +1,165 @@
+"""Login storm: password hashing throughput and its effect on other routes.
+
+Usage:
+    python benchmarks/bench_login_storm.py
+    python benchmarks/bench_login_storm.py --duration 20 --storm 32 --pool-workers 2
+
+Runs the app in-process twice, each time in a fresh interpreter:
+
+    inline  hashing on the request thread with no admission limit (the old behaviour)
+    pool    hashing in the PASSWORD_HASH_WORKERS process pool with the queue limit
+
+In each run --storm threads log in as fast as they can while --bystanders
+threads load the lesson 1 practice page. A login thread turned away with 503
+waits --backoff seconds before trying again. Reported: successful logins/sec, logins
+shed with 503, login latency, and practice page latency during the storm.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+PASSWORD = 'benchmark-pass'
+
+
+def timed(opener, url, data=None):
+    start = time.perf_counter()
+    try:
+        with opener.open(url, data=data, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    return status, time.perf_counter() - start
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    pick = lambda pct: values[min(len(values) - 1, int(len(values) * pct / 100))]
+    return {f'p{pct}_ms': round(pick(pct) * 1000, 1) for pct in (50, 95, 99)}
+
+
+def run_storm(args):
+    import tempfile
+    from load_test import start_in_process, NoRedirect
+
+    base_url, _counter, server = start_in_process(
+        f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login_storm.db')}"
+    )
+    from app import app, db
+    from models import User
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        # Every user shares one hash so setup does not dominate the run
+        pwhash = generate_password_hash(PASSWORD, app.config['PASSWORD_HASH_METHOD'])
+        db.session.bulk_save_objects([
+            User(email=f'storm{n}@example.com', first_name='Storm', last_name='User', password_hash=pwhash)
+            for n in range(args.users)
+        ])
+        db.session.commit()
+
+    deadline = time.perf_counter() + args.duration
+    lock = threading.Lock()
+    logins, shed, login_latency, page_latency = [0], [0], [], []
+
+    def storm(n):
+        opener = urllib.request.build_opener(NoRedirect)
+        i = n
+        while time.perf_counter() < deadline:
+            data = urllib.parse.urlencode({'email': f'storm{i % args.users}@example.com', 'password': PASSWORD}).encode()
+            status, seconds = timed(opener, base_url + '/login', data)
+            with lock:
+                if status == 302:
+                    logins[0] += 1
+                    login_latency.append(seconds)
+                elif status == 503:
+                    shed[0] += 1
+            if status == 503:
+                # A turned-away user tries again a little later rather than instantly
+                time.sleep(args.backoff)
+            i += args.storm
+
+    def bystander():
+        opener = urllib.request.build_opener(NoRedirect)
+        while time.perf_counter() < deadline:
+            status, seconds = timed(opener, base_url + '/lesson/1')
+            with lock:
+                page_latency.append(seconds)
+
+    threads = [threading.Thread(target=storm, args=(n,)) for n in range(args.storm)]
+    threads += [threading.Thread(target=bystander) for _ in range(args.bystanders)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    return {
+        'logins_per_s': round(logins[0] / elapsed, 1),
+        'shed': shed[0],
+        'login': percentiles(login_latency),
+        'page_requests': len(page_latency),
+        'page': percentiles(page_latency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per run")
+    parser.add_argument('--storm', type=int, default=16, help="Threads logging in")
+    parser.add_argument('--bystanders', type=int, default=4, help="Threads loading the practice page")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--backoff', type=float, default=1.0, help="Seconds a login thread waits after a 503")
+    parser.add_argument('--pool-workers', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--queue', type=int, default=None, help="PASSWORD_HASH_QUEUE for the pool run")
+    parser.add_argument('--mode', choices=['inline', 'pool'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_storm(args)))
+        return
+
+    modes = {
+        'inline': {'PASSWORD_HASH_WORKERS': '0', 'PASSWORD_HASH_QUEUE': '1000000'},
+        'pool': {'PASSWORD_HASH_WORKERS': str(args.pool_workers)},
+    }
+    if args.queue:
+        modes['pool']['PASSWORD_HASH_QUEUE'] = str(args.queue)
+
+    print(f"{args.storm} login threads, {args.bystanders} practice page threads, {args.duration:.0f}s per run")
+    print(f"{'mode':8s} {'logins/s':>9s} {'shed':>6s} {'login p50':>10s} {'login p95':>10s} "
+          f"{'page reqs':>10s} {'page p50':>9s} {'page p95':>9s} {'page p99':>9s}")
+    forwarded = ['--duration', str(args.duration), '--storm', str(args.storm),
+                 '--bystanders', str(args.bystanders), '--users', str(args.users),
+                 '--backoff', str(args.backoff)]
+    for mode, env in modes.items():
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode] + forwarded,
+            env=dict(os.environ, LOG_LEVEL='WARNING', **env),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:8s} {result['logins_per_s']:9.1f} {result['shed']:6d} "
+              f"{result['login']['p50_ms']:10.1f} {result['login']['p95_ms']:10.1f} "
+              f"{result['page_requests']:10d} {result['page']['p50_ms']:9.1f} "
+              f"{result['page']['p95_ms']:9.1f} {result['page']['p99_ms']:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""How much read traffic moves off the primary with DATABASE_REPLICA_URLS.
+
+Usage:
+    python benchmarks/bench_replicas.py                   # two throwaway SQLite files
+    python benchmarks/bench_replicas.py --users 50 --rounds 20
+    python benchmarks/bench_replicas.py --database-url postgresql://primary/typing \\
+        --replica-url postgresql://standby/typing
+
+Simulated students log in, then repeat a round of: index, practice, progress
+and, every --save-every rounds, save_progress followed by lesson_complete.
+Reported: SQL statements run on the primary and on the replica, the share of
+reads that stayed on the primary because of read-your-writes, and the rate at
+which rounds completed. With two SQLite files the replica is a copy of the
+primary taken after seeding; it does not replicate, so pages show what was
+there at copy time unless read-your-writes sends them to the primary.
+
+A round takes milliseconds here where a student takes minutes, so the
+read-your-writes window (REPLICA_MAX_LAG) is scaled down with --max-lag; at
+the production 5 seconds every round of this run would fall inside one.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Primary database (default: temporary SQLite file)")
+    parser.add_argument('--replica-url', help="Replica of --database-url (default: a copy of the SQLite primary)")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=10, help="Rounds of page views per user")
+    parser.add_argument('--save-every', type=int, default=3, help="Save a result every N rounds")
+    parser.add_argument('--max-lag', type=float, default=0.05, help="REPLICA_MAX_LAG in seconds")
+    args = parser.parse_args()
+
+    if args.database_url and not args.replica_url:
+        parser.error("--replica-url is required with --database-url")
+    directory = tempfile.mkdtemp()
+    primary_url = args.database_url or f"sqlite:///{os.path.join(directory, 'primary.db')}"
+    replica_url = args.replica_url or f"sqlite:///{os.path.join(directory, 'replica.db')}"
+    os.environ['DATABASE_URL'] = primary_url
+    os.environ['DATABASE_REPLICA_URLS'] = replica_url
+    os.environ['REPLICA_MAX_LAG'] = str(args.max_lag)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    os.environ['PASSWORD_HASH_WORKERS'] = '0'
+
+    from sqlalchemy import event
+    from werkzeug.security import generate_password_hash
+    from app import app, db, init_db
+    from models import User, Lesson
+    from replicas import replicas
+
+    with app.app_context():
+        init_db()
+        password_hash = generate_password_hash('bench-pass', 'pbkdf2:sha256:1000')
+        emails = [f'replica-bench-{n}@example.com' for n in range(args.users)]
+        for email in emails:
+            if not User.query.filter_by(email=email).first():
+                db.session.add(User(email=email, first_name='Bench', last_name='User', password_hash=password_hash))
+        db.session.commit()
+        lessons = [lesson.id for lesson in Lesson.query.order_by(Lesson.number).limit(3)]
+        engines = {'primary': db.engines[None], 'replica': db.engines['replica0']}
+    if not args.replica_url:
+        for engine in engines.values():
+            engine.dispose()
+        shutil.copy(os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db'))
+    replicas.check()
+
+    statements = dict.fromkeys(engines, 0)
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute',
+                     lambda *a, name=name, **kw: statements.__setitem__(name, statements[name] + 1))
+
+    clients = []
+    for email in emails:
+        client = app.test_client()
+        response = client.post('/login', data={'email': email, 'password': 'bench-pass'})
+        assert response.status_code == 302, response.status_code
+        clients.append(client)
+
+    rng = random.Random(0)
+    for name in statements:
+        statements[name] = 0
+    before = replicas.stats()
+    started = time.perf_counter()
+    for round_number in range(1, args.rounds + 1):
+        for client in clients:
+            lesson_id = rng.choice(lessons)
+            client.get('/index')
+            client.get(f'/practice/{lessons[0]}')
+            client.get('/progress')
+            if round_number % args.save_every == 0:
+                client.post(f'/save_progress/{lesson_id}', json={
+                    'wpm': round(rng.uniform(20, 50), 1), 'accuracy': 97, 'time_taken': 40, 'errors': 1,
+                })
+                client.get(f'/lesson_complete/{lesson_id}')
+    elapsed = time.perf_counter() - started
+    after = replicas.stats()
+
+    total = sum(statements.values())
+    print(f"{args.users} users x {args.rounds} rounds, a save every {args.save_every} rounds, "
+          f"read-your-writes window {args.max_lag}s")
+    print(f"statements on primary  {statements['primary']:7d} ({statements['primary'] * 100 / total:.0f}%)")
+    print(f"statements on replica  {statements['replica']:7d} ({statements['replica'] * 100 / total:.0f}%)")
+    print(f"reads kept on primary  {after['primary_reads'] - before['primary_reads']:7d} "
+          f"(writes, POST routes and read-your-writes windows)")
+    print(f"rounds/s               {args.users * args.rounds / elapsed:7.1f}")
+
+
+if __name__ == '__main__':
+    main()
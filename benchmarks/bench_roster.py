@@ -0,0 +1,88 @@
+"""Accounts created per second: register() one at a time vs. the bulk roster import.
+
+Usage:
+    python benchmarks/bench_roster.py                     # throwaway SQLite file, 200 users per run
+    python benchmarks/bench_roster.py --users 2000 --workers 1,4,8
+    python benchmarks/bench_roster.py --database-url postgresql://localhost/typing_bench --users 5000
+
+Each run creates --users fresh accounts from the same kind of roster:
+
+    register     one POST /register per user (email check, hash, commit each)
+    import/N     roster.import_roster with N hashing processes, CHUNK_SIZE users per commit
+
+Password hashing dominates, so the hash method is a flag: the production
+default (scrypt) shows the parallel speedup, a cheap pbkdf2 setting shows what
+the database side costs.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_roster(count, start_lesson=None):
+    tag = uuid.uuid4().hex[:8]
+    lines = ['email,first_name,last_name,password,start_lesson']
+    for n in range(count):
+        lines.append(f"student{n}-{tag}@school.example,Student,Number{n},pass-{n:06d},{start_lesson or ''}")
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Database to write to (default: temporary SQLite file)")
+    parser.add_argument('--users', type=int, default=200, help="Accounts created per run")
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}", help="Comma-separated hashing process counts")
+    parser.add_argument('--method', default='scrypt', help="PASSWORD_HASH_METHOD, e.g. scrypt or pbkdf2:sha256:1000")
+    parser.add_argument('--start-lesson', type=int, help="Also place every student on this lesson")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'roster_bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ['PASSWORD_HASH_METHOD'] = args.method
+    os.environ['PASSWORD_HASH_WORKERS'] = str(os.cpu_count() or 1)
+
+    import roster
+    from app import app, init_db
+    from hashing import hasher
+
+    with app.app_context():
+        init_db()
+    app.config['PASSWORD_HASH_QUEUE'] = 1000
+
+    print(f"{args.users} users per run, {args.method}, {os.cpu_count()} CPU(s), {app.config['SQLALCHEMY_DATABASE_URI'].split(':')[0]}")
+    print(f"{'run':12s} {'seconds':>8s} {'users/s':>9s}")
+
+    client = app.test_client()
+    lines = make_roster(args.users).splitlines()[1:]
+    started = time.perf_counter()
+    for line in lines:
+        email, first_name, last_name, password, _start = line.split(',')
+        response = client.post('/register', data={'email': email, 'first_name': first_name,
+                                                  'last_name': last_name, 'password': password})
+        assert response.status_code == 302, response.status_code
+    elapsed = time.perf_counter() - started
+    print(f"{'register':12s} {elapsed:8.2f} {args.users / elapsed:9.1f}")
+
+    for workers in sorted({int(w) for w in args.workers.split(',')}):
+        with app.app_context():
+            # Includes starting the import's own hashing processes, as the CLI command does
+            started = time.perf_counter()
+            result = roster.import_roster(io.StringIO(make_roster(args.users, args.start_lesson)),
+                                          start_lesson=args.start_lesson, workers=workers)
+            elapsed = time.perf_counter() - started
+        assert result['created'] == args.users, result['problems'][:5]
+        print(f"{f'import/{workers}':12s} {elapsed:8.2f} {args.users / elapsed:9.1f}")
+    hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Compare the per-character scoring helpers in utils.py with the batch API.
+
+Usage:
+    python benchmarks/bench_scoring.py [--copies 50] [--error-rate 0.03]
+
+Every lesson in lessons/ is typed with random substitutions, omissions and
+insertions; the resulting pairs are scored with calculate_accuracy /
+calculate_typing_errors one at a time, with score_batch, and with align_batch.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils import calculate_accuracy, calculate_typing_errors, score_batch, align_batch
+
+
+def load_lessons():
+    lessons = []
+    for i in range(1, 22):
+        path = os.path.join(ROOT, 'lessons', f'lesson{i}.txt')
+        if os.path.exists(path):
+            with open(path) as f:
+                lessons.append(f.read().strip())
+    return lessons
+
+
+def mistype(text, error_rate, rng):
+    typed = []
+    for char in text:
+        roll = rng.random()
+        if roll < error_rate / 3:
+            typed.append(rng.choice('abcdefghijklmnopqrstuvwxyz'))   # substitution
+        elif roll < 2 * error_rate / 3:
+            continue                                               # omission
+        elif roll < error_rate:
+            typed.append(char + rng.choice('abcdefghijklmnopqrstuvwxyz'))  # insertion
+        else:
+            typed.append(char)
+    return ''.join(typed)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=50, help="Typed attempts per lesson")
+    parser.add_argument('--error-rate', type=float, default=0.03)
+    parser.add_argument('--band', type=int, default=32)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    lessons = load_lessons()
+    originals = [text for text in lessons for _ in range(args.copies)]
+    typed = [mistype(text, args.error_rate, rng) for text in originals]
+    chars = sum(len(text) for text in originals)
+
+    def per_pair():
+        return [(calculate_accuracy(o, t), len(calculate_typing_errors(o, t))) for o, t in zip(originals, typed)]
+
+    loop_result, loop_seconds = timed(per_pair)
+    batch_result, batch_seconds = timed(lambda: score_batch(originals, typed))
+    aligned, align_seconds = timed(lambda: align_batch(originals, typed, band=args.band))
+
+    assert [a for a, _ in loop_result] == batch_result.accuracy.tolist()
+
+    positional_errors = sum(e for _, e in loop_result)
+    aligned_errors = int(aligned.distance.sum())
+    print(f"pairs:              {len(originals)} ({len(lessons)} lessons x {args.copies}), {chars:,} chars")
+    print(f"per-pair loops:     {loop_seconds * 1000:8.1f} ms  ({chars / loop_seconds:,.0f} chars/sec)")
+    print(f"score_batch:        {batch_seconds * 1000:8.1f} ms  ({chars / batch_seconds:,.0f} chars/sec, "
+          f"{loop_seconds / batch_seconds:.1f}x)")
+    print(f"align_batch:        {align_seconds * 1000:8.1f} ms  ({chars / align_seconds:,.0f} chars/sec)")
+    print(f"errors reported:    positional {positional_errors:,} vs aligned {aligned_errors:,} "
+          f"(substitutions {int(aligned.substitutions.sum())}, omissions {int(aligned.omissions.sum())}, "
+          f"insertions {int(aligned.insertions.sum())})")
+
+
+if __name__ == '__main__':
+    main()
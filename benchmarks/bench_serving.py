@@ -0,0 +1,134 @@
+"""Compare throughput of the development server with the gunicorn profile.
+
+Usage:
+    python benchmarks/bench_serving.py
+    python benchmarks/bench_serving.py --clients 40 --database-url postgresql://localhost/typing_bench
+    python benchmarks/bench_serving.py --workers 4 --threads 8 --worker-class gthread
+
+Starts each server as its own process against the same database and runs the
+load_test.py client sessions (register, login, lesson grid, practice,
+save_progress, lesson_complete, progress) against it:
+
+    dev       python main.py - Werkzeug's debug server with the reloader, which is
+              what the old Procfile line (python app.py) meant to start
+    gunicorn  gunicorn -c gunicorn.conf.py app:app
+
+The dev server always listens on port 5000, so that port must be free.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from load_test import Recorder, run_session, summarise
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start listening on port {port}")
+
+
+def run_load(base_url, args):
+    recorder = Recorder()
+
+    def client():
+        for _ in range(args.sessions):
+            run_session(base_url, recorder, args.saves, 1)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    endpoints = summarise(recorder, None, elapsed)
+    latencies = sorted(v for values in recorder.latencies.values() for v in values)
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] * 1000
+    return {
+        'requests': len(latencies),
+        'errors': sum(row['errors'] for row in endpoints.values()),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': pick(50),
+        'p95_ms': pick(95),
+        'save_p95_ms': endpoints.get('save_progress', {}).get('p95_ms', 0.0),
+    }
+
+
+def serve(name, args, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING', MAIL_IN_PROCESS_WORKERS='0')
+    if name == 'dev':
+        port = 5000
+        command = [sys.executable, 'main.py']
+    else:
+        port = free_port()
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app']
+        env.update(PORT=str(port), GUNICORN_WORKER_CLASS=args.worker_class)
+        if args.threads:
+            env['GUNICORN_THREADS'] = str(args.threads)
+        if args.workers:
+            env['WEB_CONCURRENCY'] = str(args.workers)
+    # A session of its own so the debug reloader's child is stopped too
+    process = subprocess.Popen(command, cwd=ROOT, env=env, start_new_session=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port, process)
+        return run_load(f'http://127.0.0.1:{port}', args)
+    finally:
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Database both servers use (default: a fresh SQLite file per run)")
+    parser.add_argument('--clients', type=int, default=20, help="Concurrent clients")
+    parser.add_argument('--sessions', type=int, default=5, help="Sessions per client")
+    parser.add_argument('--saves', type=int, default=5, help="save_progress POSTs per session")
+    parser.add_argument('--workers', type=int, help="WEB_CONCURRENCY for gunicorn (default from gunicorn.conf.py)")
+    parser.add_argument('--threads', type=int, help="GUNICORN_THREADS (default from gunicorn.conf.py)")
+    parser.add_argument('--worker-class', default='gthread')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.sessions} sessions, {os.cpu_count()} CPUs")
+    print(f"{'server':10s} {'reqs':>6s} {'err':>4s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'save p95':>9s}")
+    for name in ('dev', 'gunicorn'):
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serving.db')}"
+        if name == 'gunicorn':
+            # main.py creates the schema when run directly; gunicorn relies on the release step
+            subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=ROOT, check=True,
+                           env=dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING'),
+                           stdout=subprocess.DEVNULL)
+        result = serve(name, args, database_url)
+        print(f"{name:10s} {result['requests']:6d} {result['errors']:4d} {result['rps']:8.1f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f} {result['save_p95_ms']:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Server cost per attempt: one save_progress POST each vs. batched /sync_progress.
+
+Usage:
+    python benchmarks/bench_sync.py                       # throwaway SQLite file
+    python benchmarks/bench_sync.py --database-url postgresql://localhost/typing_bench --attempts 2000
+
+Every run saves the same number of attempts for fresh users, spread over the
+first few lessons, through the in-process test client. Reported per run:
+attempts/sec, server milliseconds per attempt and SQL statements per attempt.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_attempts(count, lessons, rng):
+    now = int(time.time() * 1000)
+    return [{
+        'key': uuid.uuid4().hex,
+        'lesson_id': rng.choice(lessons),
+        'wpm': round(rng.uniform(15, 60), 1),
+        'accuracy': round(rng.uniform(85, 100), 1),
+        'time_taken': rng.randint(20, 120),
+        'errors': rng.randint(0, 10),
+        'at': now - (count - i) * 1000,
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Database to write to (default: temporary SQLite file)")
+    parser.add_argument('--attempts', type=int, default=500, help="Attempts saved per run")
+    parser.add_argument('--lessons', type=int, default=5, help="Spread attempts over this many lessons")
+    parser.add_argument('--batches', default='1,10,50', help="Comma-separated /sync_progress batch sizes")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sync_bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from sqlalchemy import event
+    from app import app, db, init_db
+    from models import User, Lesson
+
+    with app.app_context():
+        init_db()
+        lessons = [lesson.id for lesson in Lesson.query.order_by(Lesson.number).limit(args.lessons)]
+        engine = db.engine
+
+    statements = [0]
+    event.listen(engine, 'before_cursor_execute', lambda *a, **kw: statements.__setitem__(0, statements[0] + 1))
+
+    runs = [('save_progress', 1)] + [('sync_progress', int(size)) for size in args.batches.split(',')]
+    print(f"{args.attempts} attempts per run over {len(lessons)} lessons")
+    print(f"{'endpoint':14s} {'batch':>6s} {'attempts/s':>11s} {'ms/attempt':>11s} {'queries/attempt':>16s}")
+    rng = random.Random(0)
+    for endpoint, size in runs:
+        with app.app_context():
+            user = User(email=f'sync-{uuid.uuid4().hex[:8]}@example.com', first_name='Bench',
+                        last_name='User', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+        attempts = make_attempts(args.attempts, lessons, rng)
+        statements[0] = 0
+        started = time.perf_counter()
+        if endpoint == 'save_progress':
+            for attempt in attempts:
+                response = client.post(f"/save_progress/{attempt['lesson_id']}", json=attempt)
+                assert response.status_code == 200, response.status_code
+        else:
+            for i in range(0, len(attempts), size):
+                response = client.post('/sync_progress', json={'attempts': attempts[i:i + size]})
+                assert response.status_code == 200, response.status_code
+        elapsed = time.perf_counter() - started
+        print(f"{endpoint:14s} {size:6d} {args.attempts / elapsed:11.1f} "
+              f"{elapsed * 1000 / args.attempts:11.2f} {statements[0] / args.attempts:16.2f}")
+
+
+if __name__ == '__main__':
+    main()
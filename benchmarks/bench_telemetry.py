@@ -0,0 +1,101 @@
+"""Measure keystroke telemetry ingestion throughput (events/sec per worker).
+
+Usage:
+    python benchmarks/bench_telemetry.py                       # throwaway SQLite file
+    python benchmarks/bench_telemetry.py --database-url postgresql://localhost/typing_bench
+
+Batches go through the same decode -> buffer -> bulk insert path as the
+/telemetry endpoint, so the numbers reflect what one worker process can absorb.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_batch(text, start, size):
+    positions = list(range(start, start + size))
+    expected = ''.join(text[i % len(text)] for i in positions)
+    typed = ''.join(c if random.random() > 0.05 else 'x' for c in expected)
+    return {
+        'p': positions,
+        'e': expected,
+        't': typed,
+        'd': [random.randint(80, 400) for _ in positions],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help="Database to write to (default: temporary SQLite file)")
+    parser.add_argument('--typists', type=int, default=1000, help="Concurrent attempts to simulate")
+    parser.add_argument('--batches', type=int, default=10, help="Batches per typist")
+    parser.add_argument('--batch-size', type=int, default=50, help="Keystrokes per batch")
+    parser.add_argument('--flush-size', type=int, default=500, help="Queued batches per bulk insert")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'telemetry_bench.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+
+    from app import app, db
+    from models import User, Lesson
+    import telemetry
+
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(email='bench@example.com').first()
+        if not user:
+            user = User(email='bench@example.com', first_name='Bench', last_name='User', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        lesson = Lesson.query.order_by(Lesson.number).first()
+        if lesson is None:
+            lesson = Lesson(number=1, content='asdf jkl; ' * 20, title='Lesson 1')
+            db.session.add(lesson)
+            db.session.commit()
+        user_id, lesson_id, text = user.id, lesson.id, lesson.content
+
+    buffer = telemetry.TelemetryBuffer(max_pending=10 ** 9)
+    buffer.app = app
+    attempts = [str(uuid.uuid4()) for _ in range(args.typists)]
+    payloads = [
+        (attempt, seq, make_batch(text, seq * args.batch_size, args.batch_size))
+        for seq in range(args.batches)
+        for attempt in attempts
+    ]
+
+    # Request-side cost: decode + enqueue, what the endpoint does before returning
+    start = time.perf_counter()
+    for attempt, seq, payload in payloads:
+        buffer._pending.append((user_id, lesson_id, attempt, seq, telemetry.decode_batch(payload)))
+    enqueue_seconds = time.perf_counter() - start
+
+    # Write-behind cost: bulk inserts in flush_size chunks
+    queued = list(buffer._pending)
+    buffer._pending.clear()
+    start = time.perf_counter()
+    for i in range(0, len(queued), args.flush_size):
+        buffer._pending.extend(queued[i:i + args.flush_size])
+        buffer.flush()
+    flush_seconds = time.perf_counter() - start
+
+    events = len(payloads) * args.batch_size
+    print(f"database:         {app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]}")
+    print(f"batches:          {len(payloads)} ({events} keystrokes)")
+    print(f"rows written:     {buffer.flushed_rows}")
+    print(f"enqueue:          {events / enqueue_seconds:,.0f} events/sec "
+          f"({enqueue_seconds / len(payloads) * 1e6:.1f} us per request)")
+    print(f"flush:            {events / flush_seconds:,.0f} events/sec")
+    print(f"end to end:       {events / (enqueue_seconds + flush_seconds):,.0f} events/sec per worker")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""Route-level load and latency benchmark.
+
+Usage:
+    python benchmarks/load_test.py                                # in-process server, throwaway SQLite
+    python benchmarks/load_test.py --database-url postgresql://localhost/typing_bench
+    python benchmarks/load_test.py --url http://127.0.0.1:5000    # an already running server
+    python benchmarks/load_test.py --save benchmarks/baseline.json
+    python benchmarks/load_test.py --compare benchmarks/baseline.json --tolerance 0.25
+
+Each simulated client runs a realistic session: register, login, lesson grid,
+practice page, several save_progress POSTs, lesson_complete and the progress
+page. Per endpoint it reports requests/sec, p50/p95/p99 latency and, when the
+app runs in-process, the number of SQL statements per request.
+
+--compare exits with status 1 if any endpoint's p95 latency grew by more than
+the tolerance or its queries per request went up.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time each request on its own instead of following redirects
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, endpoint, seconds, ok):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+
+class QueryCounter:
+    """Counts SQL statements per Flask endpoint for an in-process app"""
+
+    def __init__(self, app, db):
+        from flask import g, request, has_request_context
+        from sqlalchemy import event
+
+        self.lock = threading.Lock()
+        self.statements = defaultdict(int)
+        self.requests = defaultdict(int)
+
+        @app.before_request
+        def _start_count():
+            g.bench_statements = 0
+
+        @app.after_request
+        def _record_count(response):
+            endpoint = request.endpoint or 'unknown'
+            with self.lock:
+                self.statements[endpoint] += g.get('bench_statements', 0)
+                self.requests[endpoint] += 1
+            return response
+
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def _count(*args, **kwargs):
+            if has_request_context():
+                g.bench_statements = g.get('bench_statements', 0) + 1
+
+    def per_request(self, endpoint):
+        requests = self.requests.get(endpoint)
+        return round(self.statements[endpoint] / requests, 2) if requests else None
+
+
+def start_in_process(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('MAIL_IN_PROCESS_WORKERS', '0')
+
+    from werkzeug.serving import make_server
+    from app import app, db, init_db
+
+    with app.app_context():
+        init_db()
+    # werkzeug logs every request at INFO unless told otherwise
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    counter = QueryCounter(app, db)
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{port}', counter, server
+
+
+def run_session(base_url, recorder, saves, lesson_id):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()), NoRedirect)
+
+    def call(endpoint, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+        req = urllib.request.Request(base_url + path, data=body, headers=headers)
+        start = time.perf_counter()
+        try:
+            with opener.open(req, timeout=30) as response:
+                response.read()
+                ok = response.status < 400
+        except urllib.error.HTTPError as e:
+            e.read()
+            ok = e.code < 400
+        except (urllib.error.URLError, OSError):
+            ok = False
+        recorder.add(endpoint, time.perf_counter() - start, ok)
+
+    email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+    call('register', '/register', data={
+        'email': email, 'first_name': 'Bench', 'last_name': 'User', 'password': 'benchmark-pass',
+    })
+    call('login', '/login', data={'email': email, 'password': 'benchmark-pass'})
+    call('index', '/lessons')
+    call('practice', f'/lesson/{lesson_id}')
+    for attempt in range(saves):
+        call('save_progress', f'/save_progress/{lesson_id}', json_body={
+            'wpm': 20 + attempt, 'accuracy': 96.0, 'time_taken': 60, 'errors': 2,
+        })
+    call('lesson_complete', f'/lesson_complete/{lesson_id}')
+    call('progress', '/progress')
+    call('index', '/lessons')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarise(recorder, counter, elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(endpoint, 0),
+            'rps': round(len(values) / elapsed, 1),
+            'mean_ms': round(statistics.mean(values) * 1000, 2),
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+            'queries_per_request': counter.per_request(endpoint) if counter else None,
+        }
+    return endpoints
+
+
+def print_table(endpoints, total_requests, elapsed):
+    print(f"{'endpoint':16s} {'reqs':>6s} {'err':>4s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'queries':>8s}")
+    for endpoint, row in endpoints.items():
+        queries = '-' if row['queries_per_request'] is None else f"{row['queries_per_request']:.2f}"
+        print(f"{endpoint:16s} {row['requests']:6d} {row['errors']:4d} {row['rps']:8.1f} "
+              f"{row['p50_ms']:8.1f} {row['p95_ms']:8.1f} {row['p99_ms']:8.1f} {queries:>8s}")
+    print(f"total: {total_requests} requests in {elapsed:.1f}s ({total_requests / elapsed:.1f} req/s)")
+
+
+def compare(endpoints, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['endpoints']
+    regressions = []
+    for endpoint, old in baseline.items():
+        new = endpoints.get(endpoint)
+        if new is None:
+            continue
+        if old['p95_ms'] and new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {old['p95_ms']} ms -> {new['p95_ms']} ms")
+        if old.get('queries_per_request') is not None and new.get('queries_per_request') is not None \
+                and new['queries_per_request'] > old['queries_per_request']:
+            regressions.append(f"{endpoint}: queries/request {old['queries_per_request']} -> {new['queries_per_request']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="Benchmark a running server instead of starting one in-process")
+    parser.add_argument('--database-url', help="Database for the in-process server (default: throwaway SQLite)")
+    parser.add_argument('--clients', type=int, default=20, help="Concurrent clients")
+    parser.add_argument('--sessions', type=int, default=5, help="Sessions per client")
+    parser.add_argument('--saves', type=int, default=5, help="save_progress POSTs per session")
+    parser.add_argument('--lesson', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH', help="Write results as JSON")
+    parser.add_argument('--compare', metavar='PATH', help="Compare with a saved baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 growth for --compare")
+    args = parser.parse_args()
+
+    counter = server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+        base_url, counter, server = start_in_process(database_url)
+
+    recorder = Recorder()
+
+    def client():
+        for _ in range(args.sessions):
+            run_session(base_url, recorder, args.saves, args.lesson)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+
+    endpoints = summarise(recorder, counter, elapsed)
+    total_requests = sum(row['requests'] for row in endpoints.values())
+    print_table(endpoints, total_requests, elapsed)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'target': args.url or 'in-process',
+                    'clients': args.clients,
+                    'sessions': args.sessions,
+                    'saves': args.saves,
+                    'python': platform.python_version(),
+                    'elapsed_s': round(elapsed, 2),
+                    'total_rps': round(total_requests / elapsed, 1),
+                },
+                'endpoints': endpoints,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"saved {args.save}")
+
+    if args.compare:
+        regressions = compare(endpoints, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from bisect import bisect
+from collections import Counter, defaultdict
+from itertools import accumulate
+
+WORD_RE = re.compile(r'\S+')
+PRIOR_PRESSES = 20     # smoothing: every key starts as if typed this often...
+PRIOR_ERROR_RATE = 0.05  # ...with this error rate
+
+
+def word_keys(word):
+    """Characters and bigrams a word exercises, lowercased"""
+    lower = word.lower()
+    return frozenset(lower) | frozenset(lower[i:i + 2] for i in range(len(lower) - 1))
+
+
+def error_rates(rows):
+    """Smoothed error rate per key from (key, presses, errors) rows"""
+    return {
+        key: (errors + PRIOR_PRESSES * PRIOR_ERROR_RATE) / (presses + PRIOR_PRESSES)
+        for key, presses, errors in rows
+    }
+
+
+class Drill:
+    """A generated practice text, shaped like a catalog lesson for practice.html"""
+
+    def __init__(self, content, focus_keys, elapsed_ms):
+        self.id = 0
+        self.number = 0
+        self.title = "Adaptive Drill"
+        self.content = content
+        self.focus_keys = focus_keys
+        self.elapsed_ms = elapsed_ms
+
+    def __repr__(self):
+        return f"<Drill {self.focus_keys}>"
+
+
+class DrillIndex:
+    """Words of the lesson corpus indexed by every character and bigram they contain.
+
+    Built once per catalog version; generating a drill only reads these
+    structures, so a call costs well under a millisecond for the lesson corpus.
+    """
+
+    def __init__(self, contents):
+        frequency = Counter(word for content in contents for word in WORD_RE.findall(content))
+        self.words = sorted(frequency)
+        self.keys = [word_keys(word) for word in self.words]
+        self.by_key = defaultdict(list)
+        for word_id, keys in enumerate(self.keys):
+            for key in keys:
+                self.by_key[key].append(word_id)
+        # Corpus frequency keeps filler words natural
+        self.cum_frequency = list(accumulate(frequency[word] for word in self.words))
+
+    def weak_keys(self, rates, count):
+        """The keys with the highest error rate that some word can exercise"""
+        ranked = sorted((rate, key) for key, rate in rates.items() if key in self.by_key)
+        if not ranked:
+            return []
+        typical = sorted(rate for rate, _ in ranked)[len(ranked) // 2]
+        return [key for rate, key in reversed(ranked[-count:]) if rate > typical]
+
+    def generate(self, rates, length=300, focus=6, filler=0.25, rng=None):
+        """Build a practice text weighted toward the keys with the worst error rates.
+
+        Returns (text, focus keys). Without usable error data the text is a
+        frequency-weighted sample of the corpus.
+        """
+        rng = rng or random
+        if not self.words:
+            return '', []
+        weak = self.weak_keys(rates, focus)
+
+        candidates = []
+        cum_scores = []
+        if weak:
+            weight = {key: rates[key] for key in weak}
+            scored = {}
+            for key in weak:
+                for word_id in self.by_key[key]:
+                    if word_id not in scored:
+                        hit = sum(weight[k] for k in weak if k in self.keys[word_id])
+                        # Prefer short words packed with weak keys over long ones that touch one
+                        scored[word_id] = hit / (len(self.words[word_id]) ** 0.5)
+            candidates = list(scored)
+            cum_scores = list(accumulate(scored[word_id] for word_id in candidates))
+
+        words = []
+        size = 0
+        last = None
+        total_frequency = self.cum_frequency[-1]
+        while size < length:
+            if candidates and rng.random() >= filler:
+                word_id = candidates[bisect(cum_scores, rng.random() * cum_scores[-1])]
+            else:
+                word_id = bisect(self.cum_frequency, rng.random() * total_frequency)
+            if word_id == last:
+                # Avoid typing the same word twice in a row where possible
+                word_id = bisect(self.cum_frequency, rng.random() * total_frequency)
+            last = word_id
+            words.append(self.words[word_id])
+            size += len(self.words[word_id]) + 1
+        return ' '.join(words), weak
+
+
+class DrillEngine:
+    """Adaptive drills from the lesson corpus and each user's per-key error counts.
+
+    The index follows the lesson catalog and is rebuilt only when its content
+    hash changes. Per request the work is one primary-key range read of the
+    user's KeyErrorCount rows plus DrillIndex.generate().
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.length = 300
+        self.focus = 6
+        self._index = None
+        self._index_hash = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('DRILL_LENGTH', int(os.environ.get('DRILL_LENGTH', self.length)))
+        app.config.setdefault('DRILL_FOCUS_KEYS', int(os.environ.get('DRILL_FOCUS_KEYS', self.focus)))
+        self.length = app.config['DRILL_LENGTH']
+        self.focus = app.config['DRILL_FOCUS_KEYS']
+
+    def index(self):
+        from lesson_catalog import catalog
+
+        content_hash = catalog.content_hash
+        if self._index is None or self._index_hash != content_hash:
+            with self._lock:
+                if self._index is None or self._index_hash != content_hash:
+                    started = time.perf_counter()
+                    self._index = DrillIndex(lesson.content for lesson in catalog.all())
+                    self._index_hash = content_hash
+                    logging.info(f"Drill index built ({len(self._index.words)} words, "
+                                 f"{(time.perf_counter() - started) * 1000:.1f} ms)")
+        return self._index
+
+    def user_rates(self, user_id):
+        from models import KeyErrorCount
+
+        rows = KeyErrorCount.query.with_entities(
+            KeyErrorCount.key, KeyErrorCount.presses, KeyErrorCount.errors
+        ).filter(KeyErrorCount.user_id == user_id).all()
+        return error_rates(rows)
+
+    def build(self, user_id):
+        index = self.index()
+        rates = self.user_rates(user_id)
+        started = time.perf_counter()
+        text, focus_keys = index.generate(rates, self.length, self.focus)
+        return Drill(text, focus_keys, round((time.perf_counter() - started) * 1000, 2))
+
+
+drills = DrillEngine()
@@ -0,0 +1,158 @@
+import io
+import csv
+import json
+from datetime import datetime, date
+
+from sqlalchemy import select
+
+DATASETS = ('progress', 'attempts')
+FORMATS = ('csv', 'ndjson')
+YIELD_PER = 2000
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def parse_date(value):
+    """YYYY-MM-DD (or a full ISO timestamp) to a datetime; None passes through"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}; use YYYY-MM-DD")
+
+
+def parse_lesson(value):
+    """Lesson number from a query string; None passes through"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid lesson {value!r}; use a lesson number")
+
+
+def parse_cohort(value):
+    """Signup month YYYY-MM to the [start, end) datetimes it covers"""
+    if not value:
+        return None
+    try:
+        start = datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise ValueError(f"Invalid cohort {value!r}; use YYYY-MM")
+    end = datetime(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    return start, end
+
+
+def export_query(dataset='progress', lesson=None, since=None, until=None, cohort=None):
+    """Core SELECT of one row per Progress (or AttemptLog) row with its user and lesson.
+
+    lesson is a lesson number; since/until bound the row's own timestamp
+    (until is exclusive); cohort is a signup month, YYYY-MM. Rows come in
+    primary-key order so an interrupted export can be compared with a rerun.
+    """
+    from models import User, Lesson, Progress, AttemptLog
+
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}")
+    if dataset == 'progress':
+        table, stamp = Progress, Progress.timestamp
+        columns = [Progress.id.label('progress_id')]
+    else:
+        table, stamp = AttemptLog, AttemptLog.created_at
+        columns = [AttemptLog.id.label('attempt_id')]
+
+    columns += [
+        User.id.label('user_id'),
+        User.email,
+        User.first_name,
+        User.last_name,
+        User.created_at.label('signed_up_at'),
+        Lesson.number.label('lesson_number'),
+        Lesson.title.label('lesson_title'),
+        table.wpm,
+        table.accuracy,
+        table.time_taken,
+        table.error_count,
+        stamp.label('recorded_at'),
+    ]
+    query = select(*columns).join(User, User.id == table.user_id).join(Lesson, Lesson.id == table.lesson_id)
+
+    if lesson is not None:
+        query = query.where(Lesson.number == lesson)
+    since, until = parse_date(since), parse_date(until)
+    if since is not None:
+        query = query.where(stamp >= since)
+    if until is not None:
+        query = query.where(stamp < until)
+    cohort = parse_cohort(cohort)
+    if cohort is not None:
+        query = query.where(User.created_at >= cohort[0], User.created_at < cohort[1])
+    return query.order_by(table.id)
+
+
+def _csv_cell(value):
+    # A leading quote keeps names such as =HYPERLINK(...) as text in a spreadsheet
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def render(query, fmt='csv', yield_per=YIELD_PER):
+    """Encode the query's rows as CSV or NDJSON, one text chunk per fetched partition.
+
+    yield_per makes SQLAlchemy fetch through a server-side cursor (a named
+    cursor on PostgreSQL) in partitions of that many rows, so memory stays
+    flat however many rows match. The CSV header is yielded before the first
+    partition is fetched so clients see a response at once. CSV text cells
+    that a spreadsheet would run as a formula get a leading quote.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+    from app import db
+
+    result = db.session.execute(query.execution_options(yield_per=yield_per))
+    try:
+        keys = list(result.keys())
+        buffer = io.StringIO()
+        if fmt == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow(keys)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            write = lambda row: writer.writerow([_csv_cell(value) for value in row])
+        else:
+            dumps = json.JSONEncoder(default=_json_default, separators=(',', ':')).encode
+            write = lambda row: buffer.write(dumps(dict(zip(keys, row))) + '\n')
+
+        for partition in result.partitions():
+            for row in partition:
+                write(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    finally:
+        result.close()
+
+
+def filename(dataset, fmt, lesson=None, since=None, until=None, cohort=None):
+    parts = [dataset]
+    if lesson is not None:
+        parts.append(f"lesson{lesson}")
+    if cohort:
+        parts.append(f"cohort{cohort}")
+    if since or until:
+        parts.append(f"{since or 'start'}_{until or 'now'}")
+    return f"{'-'.join(parts)}.{fmt}"
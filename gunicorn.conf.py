@@ -0,0 +1,96 @@
+"""gunicorn settings for production serving.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Environment:
+    PORT                    port to bind (default 5000)
+    WEB_CONCURRENCY         worker processes (default one per CPU). Each worker has
+                            its own password hashing pool; PASSWORD_HASH_WORKERS
+                            defaults to half the CPUs divided by this, at least 1
+                            per worker (see hashing.py)
+    GUNICORN_THREADS        threads per worker for the gthread class (default 8)
+    GUNICORN_WORKER_CLASS   gthread (default), sync or gevent (needs gevent installed)
+    GUNICORN_PRELOAD        1 (default) imports the app once in the master and forks
+                            workers from it, so they share its memory copy-on-write
+    GUNICORN_TIMEOUT        seconds before a silent worker is restarted (default 30)
+    DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT
+                            SQLAlchemy pool per worker (see app.py); keep
+                            pool_size + max_overflow at or above GUNICORN_THREADS
+"""
+import os
+import multiprocessing
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+# hashing.py sizes each worker's hashing pool from this
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+# Logins and registrations park a thread while the hashing pool works, so
+# leave enough threads for the pages requested in the meantime
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so slow leaks cannot build up; jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        return
+    from app import app, db
+    from lesson_catalog import catalog
+    from drills import drills
+    from leaderboard import leaderboards
+
+    # Warm the lesson catalog, drill index and leaderboards once so every
+    # worker, including ones forked later to replace recycled workers, inherits them
+    with app.app_context():
+        try:
+            catalog.refresh()
+            drills.index()
+            server.log.info("Preloaded lesson catalog and drill index")
+        except Exception as e:
+            # Workers load them on first use instead
+            server.log.warning(f"Could not preload lessons: {e}")
+        try:
+            leaderboards.rebuild()
+            server.log.info("Preloaded leaderboards")
+        except Exception as e:
+            server.log.warning(f"Could not preload leaderboards: {e}")
+        # Never hand the master's connections to forked workers
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def post_fork(server, worker):
+    from app import app, db
+    from mailer import mail_queue
+
+    if server.cfg.preload_app:
+        # A connection opened before the fork must not be used by two processes;
+        # drop the inherited pool without closing sockets the master may still own
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+    # Drain mail from the start, so retries left by a recycled worker are not
+    # stranded until someone else enqueues a message
+    if app.config['MAIL_IN_PROCESS_WORKERS']:
+        mail_queue.start()
+
+
+def worker_exit(server, worker):
+    from telemetry import buffer
+    from hashing import hasher
+
+    buffer.flush()
+    hasher.shutdown()
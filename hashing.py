@@ -0,0 +1,225 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is full; the request should be retried later"""
+
+    def __init__(self, retry_after=5):
+        super().__init__("Password hashing is at capacity")
+        self.retry_after = retry_after
+
+
+def hash_method(pwhash):
+    """Method and parameters a stored hash was made with, e.g. 'scrypt:32768:8:1'"""
+    return pwhash.split('$', 1)[0]
+
+
+def verify_and_rehash(pwhash, password, method):
+    """Check a password and, if it matches an outdated hash, return a new hash too.
+
+    Runs inside a pool process. Returns (matches, new hash or None).
+    """
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if hash_method(pwhash) != canonical_method(method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+def canonical_method(method):
+    """Expand a configured method such as 'scrypt' to the prefix werkzeug writes"""
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        defaults = ['scrypt', '32768', '8', '1']
+    elif parts[0] == 'pbkdf2':
+        defaults = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join(parts + defaults[len(parts):])
+
+
+class PasswordHasher:
+    """Runs password hashing in a bounded process pool.
+
+    Hashing is slow on purpose, so a burst of logins would otherwise tie up
+    request threads and CPU that every other route needs. At most
+    PASSWORD_HASH_QUEUE hashes may be running or waiting in this worker;
+    beyond that HashingBusy is raised and the route answers 503 with
+    Retry-After instead of queueing. PASSWORD_HASH_WORKERS=0 hashes on the
+    request thread (still under the same limit). Each web worker has its own
+    pool, so the default is half the host's CPUs divided by WEB_CONCURRENCY,
+    and at least one process per worker.
+
+    PASSWORD_HASH_METHOD is passed to werkzeug; stored hashes made with other
+    settings are replaced on the user's next successful login.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = None
+        self.method = 'scrypt'
+        self.timeout = 10
+        self.retry_after = 5
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.busy_seconds = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('PASSWORD_HASH_METHOD', os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        # Every web worker builds its own pool, so share half the host's CPUs between them
+        web_workers = max(1, int(os.environ.get('WEB_CONCURRENCY') or 1))
+        config.setdefault('PASSWORD_HASH_WORKERS', int(os.environ.get('PASSWORD_HASH_WORKERS', max(1, (os.cpu_count() or 2) // 2 // web_workers))))
+        config.setdefault('PASSWORD_HASH_QUEUE', int(os.environ.get('PASSWORD_HASH_QUEUE', 4 * max(1, config['PASSWORD_HASH_WORKERS']))))
+        config.setdefault('PASSWORD_HASH_TIMEOUT', float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10)))
+        config.setdefault('PASSWORD_HASH_RETRY_AFTER', int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 5)))
+
+        self.method = config['PASSWORD_HASH_METHOD']
+        self.timeout = config['PASSWORD_HASH_TIMEOUT']
+        self.retry_after = config['PASSWORD_HASH_RETRY_AFTER']
+        self._slots = threading.BoundedSemaphore(config['PASSWORD_HASH_QUEUE'])
+
+    def _context(self):
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+    def _executor(self):
+        # A pool inherited through fork has no live processes, so each worker builds its own
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.app.config['PASSWORD_HASH_WORKERS'], mp_context=self._context())
+                self._pid = os.getpid()
+            return self._pool
+
+    def _finished(self, started):
+        with self._lock:
+            self.busy_seconds += time.perf_counter() - started
+            self.in_flight -= 1
+            self.completed += 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(self.retry_after)
+        started = time.perf_counter()
+        with self._lock:
+            self.in_flight += 1
+        if not self.app.config['PASSWORD_HASH_WORKERS']:
+            try:
+                return fn(*args)
+            finally:
+                self._finished(started)
+
+        try:
+            try:
+                future = self._executor().submit(fn, *args)
+            except BrokenProcessPool:
+                logging.warning("Password hashing pool broke; starting a new one")
+                self._pool = None
+                future = self._executor().submit(fn, *args)
+        except BaseException:
+            self._finished(started)
+            raise
+        # A job that timed out keeps running in its process, so its slot is
+        # only given back once it has really finished (or was cancelled)
+        future.add_done_callback(lambda _future: self._finished(started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(self.retry_after)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def hash_many(self, passwords, workers=None):
+        """Hash a batch of passwords for a bulk job, yielding the hashes in order.
+
+        With workers=None the shared pool is used, but only a couple of hashes
+        per pool process are queued at a time, so logins submitted meanwhile
+        wait behind a few hashes rather than the whole batch. A number starts a
+        pool of that size just for this call (for CLI jobs that should use
+        every core); 0 hashes in this process. Not subject to the admission
+        limit: callers are admin jobs, not per-user requests.
+        """
+        if workers is None:
+            workers = self.app.config['PASSWORD_HASH_WORKERS']
+            executor = self._executor() if workers else None
+            own = False
+        else:
+            executor = ProcessPoolExecutor(workers, mp_context=self._context()) if workers else None
+            own = True
+
+        pending = deque()
+        started = time.perf_counter()
+        try:
+            for password in passwords:
+                if executor is None:
+                    yield generate_password_hash(password, self.method)
+                    with self._lock:
+                        self.completed += 1
+                    continue
+                pending.append(executor.submit(generate_password_hash, password, self.method))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result(timeout=self.timeout)
+                    with self._lock:
+                        self.completed += 1
+            while pending:
+                yield pending.popleft().result(timeout=self.timeout)
+                with self._lock:
+                    self.completed += 1
+        finally:
+            for future in pending:
+                future.cancel()
+            if own and executor is not None:
+                executor.shutdown(cancel_futures=True)
+            with self._lock:
+                self.busy_seconds += time.perf_counter() - started
+
+    def verify(self, pwhash, password):
+        """Check a password. Returns (matches, replacement hash or None)."""
+        matches, new_hash = self._run(verify_and_rehash, pwhash, password, self.method)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return matches, new_hash
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed,
+            'busy_seconds': round(self.busy_seconds, 3),
+        }
+
+
+hasher = PasswordHasher()
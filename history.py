@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import case
+
+PERIODS = ('day', 'week')
+
+
+def period_start(period, when):
+    """First day of the rollup period containing when (weeks start on Monday)"""
+    day = when.date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def record_attempts(user_id, attempts):
+    """Append a user's attempts and fold them into the day and week rollups.
+
+    attempts are (lesson_id, wpm, accuracy, time_taken, errors, when) tuples;
+    when may be None for now. Attempts that share a rollup row are summed first,
+    so a synced batch costs one update per row rather than per attempt.
+    Rollups are updated with in-place increments so concurrent attempts do not
+    lose counts. The caller commits.
+    """
+    from app import db
+    from models import AttemptLog, AttemptRollup
+
+    now = datetime.utcnow()
+    groups = {}
+    for lesson_id, wpm, accuracy, time_taken, errors, when in attempts:
+        when = when or now
+        db.session.add(AttemptLog(
+            user_id=user_id,
+            lesson_id=lesson_id,
+            wpm=wpm,
+            accuracy=accuracy,
+            time_taken=time_taken,
+            error_count=errors,
+            created_at=when,
+        ))
+        for period in PERIODS:
+            key = (period, period_start(period, when), lesson_id)
+            count, wpm_sum, accuracy_sum, best_wpm = groups.get(key, (0, 0.0, 0.0, wpm))
+            groups[key] = (count + 1, wpm_sum + wpm, accuracy_sum + accuracy, max(best_wpm, wpm))
+
+    for (period, start, lesson_id), (count, wpm_sum, accuracy_sum, best_wpm) in groups.items():
+        updated = AttemptRollup.query.filter_by(
+            period=period, period_start=start, user_id=user_id, lesson_id=lesson_id
+        ).update({
+            AttemptRollup.attempts: AttemptRollup.attempts + count,
+            AttemptRollup.wpm_sum: AttemptRollup.wpm_sum + wpm_sum,
+            AttemptRollup.accuracy_sum: AttemptRollup.accuracy_sum + accuracy_sum,
+            AttemptRollup.best_wpm: case((AttemptRollup.best_wpm < best_wpm, best_wpm), else_=AttemptRollup.best_wpm),
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(AttemptRollup(
+                period=period,
+                period_start=start,
+                user_id=user_id,
+                lesson_id=lesson_id,
+                attempts=count,
+                wpm_sum=wpm_sum,
+                best_wpm=best_wpm,
+                accuracy_sum=accuracy_sum,
+            ))
+
+
+def user_trend(user_id, period='week', count=12, lesson_id=None):
+    """Per-period totals for a user, oldest first, read from the rollup rows only"""
+    from models import AttemptRollup
+
+    today = datetime.utcnow()
+    step = timedelta(weeks=1) if period == 'week' else timedelta(days=1)
+    since = period_start(period, today - step * (count - 1))
+
+    query = AttemptRollup.query.filter(
+        AttemptRollup.user_id == user_id,
+        AttemptRollup.period == period,
+        AttemptRollup.period_start >= since,
+    )
+    if lesson_id is not None:
+        query = query.filter(AttemptRollup.lesson_id == lesson_id)
+
+    buckets = {}
+    for row in query:
+        bucket = buckets.setdefault(row.period_start, {
+            'start': row.period_start, 'attempts': 0, 'wpm_sum': 0.0, 'accuracy_sum': 0.0, 'best_wpm': 0.0,
+        })
+        bucket['attempts'] += row.attempts
+        bucket['wpm_sum'] += row.wpm_sum
+        bucket['accuracy_sum'] += row.accuracy_sum
+        bucket['best_wpm'] = max(bucket['best_wpm'], row.best_wpm)
+
+    trend = []
+    for bucket in sorted(buckets.values(), key=lambda b: b['start']):
+        attempts = bucket['attempts']
+        trend.append({
+            'start': bucket['start'],
+            'attempts': attempts,
+            'mean_wpm': round(bucket['wpm_sum'] / attempts, 1),
+            'best_wpm': round(bucket['best_wpm'], 1),
+            'mean_accuracy': round(bucket['accuracy_sum'] / attempts, 1),
+        })
+    return trend
+
+
+def compact_attempts(raw_days=90, daily_days=400):
+    """Apply retention: drop raw attempts and daily rollups past their window.
+
+    Every attempt is already counted in the rollups when it is recorded, so
+    compaction only has to delete. Weekly rollups are kept indefinitely.
+    Returns (raw attempts deleted, daily rollups deleted).
+    """
+    from app import db
+    from models import AttemptLog, AttemptRollup
+
+    now = datetime.utcnow()
+    raw_cutoff = now - timedelta(days=raw_days)
+    daily_cutoff = (now - timedelta(days=daily_days)).date()
+
+    raw_deleted = AttemptLog.query.filter(AttemptLog.created_at < raw_cutoff).delete(synchronize_session=False)
+    daily_deleted = AttemptRollup.query.filter(
+        AttemptRollup.period == 'day',
+        AttemptRollup.period_start < daily_cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    logging.info(f"Compacted {raw_deleted} attempts and {daily_deleted} daily rollups")
+    return raw_deleted, daily_deleted
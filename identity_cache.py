@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+
+class UserSnapshot(UserMixin):
+    """Slim, detached copy of a User row for use as current_user.
+
+    It holds plain values only, so it is safe to share between requests and
+    never triggers lazy loads. Code that needs the ORM object should query it.
+    """
+
+    def __init__(self, id, email, first_name, last_name, created_at=None):
+        self.id = id
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.email, user.first_name, user.last_name, user.created_at)
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.id}>"
+
+
+class IdentityCache:
+    """Bounded LRU cache with a TTL in front of the Flask-Login user loader"""
+
+    def __init__(self, app=None, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_SIZE', int(os.environ.get('USER_CACHE_SIZE', self.max_size)))
+        app.config.setdefault('USER_CACHE_TTL', float(os.environ.get('USER_CACHE_TTL', self.ttl)))
+        self.max_size = app.config['USER_CACHE_SIZE']
+        self.ttl = app.config['USER_CACHE_TTL']
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                snapshot, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return snapshot
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, snapshot):
+        with self._lock:
+            self._entries[snapshot.id] = (snapshot, time.monotonic() + self.ttl)
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def load(self, user_id):
+        """Return a UserSnapshot for user_id, hitting the database only on a miss"""
+        from app import db
+        from models import User
+
+        snapshot = self.get(user_id)
+        if snapshot is not None:
+            return snapshot
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        self.put(snapshot)
+        return snapshot
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+identity_cache = IdentityCache()
@@ -0,0 +1,333 @@
+import os
+import sys
+import hmac
+import time
+import logging
+import threading
+from collections import defaultdict, deque, Counter
+
+from flask import g, request, has_request_context, Response, jsonify, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout"""
+
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        out = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            out.append(f"{name}_bucket{_labels(labels + (('le', _number(float(bound))),))} {cumulative}")
+        out.append(f"{name}_sum{_labels(labels)} {_number(self.total)}")
+        out.append(f"{name}_count{_labels(labels)} {self.count}")
+        return out
+
+
+class SamplingProfiler:
+    """Samples the stacks of threads that are serving a request.
+
+    A single background thread wakes every interval and records the current
+    stack of each registered request thread. Stacks of requests slower than the
+    threshold are appended to <PROFILE_DIR>/<endpoint>.folded in the folded
+    format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval=0.005, directory='profiles'):
+        self.interval = interval
+        self.directory = directory
+        self._active = {}  # thread ident -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+
+    def begin(self):
+        self._ensure_thread()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self):
+        with self._lock:
+            return self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def dump(self, endpoint, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{endpoint}.folded")
+        with open(path, 'a', encoding='utf-8') as f:
+            for stack, count in stacks.items():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class Instrumentation:
+    """Per-request latency, SQL statement counts and DB time, served at /metrics.
+
+    Request timing hangs off Flask's request hooks and SQL timing off the
+    SQLAlchemy cursor events, so no route needs changing. Each worker process
+    keeps its own numbers; scrape every worker or run a single-worker pool
+    behind the scrape target.
+
+    Configuration:
+        METRICS_ENABLED        turn the hooks on (default on)
+        METRICS_TOKEN          /metrics and /metrics/slow-queries require
+                               "Authorization: Bearer <token>"; unset, they answer 404
+        SLOW_QUERY_MS          statements slower than this are sampled (default 100)
+        SLOW_QUERY_SAMPLES     how many slow statements to keep (default 50)
+        PROFILE_SLOW_REQUESTS  opt-in sampling profiler (default off)
+        SLOW_REQUEST_MS        requests slower than this get their stacks dumped (default 500)
+        PROFILE_INTERVAL       seconds between stack samples (default 0.005)
+        PROFILE_DIR            where folded stacks are written (default instance/profiles)
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)  # (endpoint, method, status) -> count
+        self.latency = {}                 # endpoint -> Histogram
+        self.statements = {}              # endpoint -> Histogram
+        self.db_seconds = defaultdict(float)
+        self.slow_query_count = defaultdict(int)
+        self.slow_queries = deque(maxlen=50)
+        self.slow_query_seconds = 0.1
+        self.slow_request_seconds = 0.5
+        self.profiler = None
+        self._stats = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('METRICS_ENABLED', os.environ.get('METRICS_ENABLED', '1') != '0')
+        config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+        config.setdefault('SLOW_QUERY_MS', float(os.environ.get('SLOW_QUERY_MS', 100)))
+        config.setdefault('SLOW_QUERY_SAMPLES', 50)
+        config.setdefault('PROFILE_SLOW_REQUESTS', os.environ.get('PROFILE_SLOW_REQUESTS', '0') != '0')
+        config.setdefault('SLOW_REQUEST_MS', float(os.environ.get('SLOW_REQUEST_MS', 500)))
+        config.setdefault('PROFILE_INTERVAL', 0.005)
+        config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+        self.slow_query_seconds = config['SLOW_QUERY_MS'] / 1000
+        self.slow_request_seconds = config['SLOW_REQUEST_MS'] / 1000
+        self.slow_queries = deque(maxlen=config['SLOW_QUERY_SAMPLES'])
+        if config['PROFILE_SLOW_REQUESTS']:
+            self.profiler = SamplingProfiler(config['PROFILE_INTERVAL'], config['PROFILE_DIR'])
+
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.add_url_rule('/metrics/slow-queries', 'slow_queries', self.slow_queries_view)
+        if not config['METRICS_ENABLED']:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def register_stats(self, prefix, stats):
+        """Export a subsystem's stats() dict as gauges named <prefix>_<key>"""
+        self._stats.append((prefix, stats))
+
+    # Request hooks
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_db_seconds = 0.0
+        if self.profiler is not None:
+            self.profiler.begin()
+
+    def _after_request(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        status = g.pop('metrics_status', 500)
+        statements = g.pop('metrics_statements', 0)
+        db_seconds = g.pop('metrics_db_seconds', 0.0)
+
+        with self._lock:
+            self.requests[(endpoint, request.method, status)] += 1
+            if endpoint not in self.latency:
+                self.latency[endpoint] = Histogram(LATENCY_BUCKETS)
+                self.statements[endpoint] = Histogram(STATEMENT_BUCKETS)
+            self.latency[endpoint].observe(elapsed)
+            self.statements[endpoint].observe(statements)
+            self.db_seconds[endpoint] += db_seconds
+
+        if self.profiler is not None:
+            stacks = self.profiler.end()
+            if stacks and elapsed >= self.slow_request_seconds:
+                path = self.profiler.dump(endpoint, stacks)
+                logging.warning(f"Slow request {request.method} {request.path} took {elapsed * 1000:.0f} ms "
+                                f"({statements} statements); stacks appended to {path}")
+
+    # SQLAlchemy hooks
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if has_request_context():
+            endpoint = request.endpoint or 'unmatched'
+            g.metrics_statements = g.get('metrics_statements', 0) + 1
+            g.metrics_db_seconds = g.get('metrics_db_seconds', 0.0) + elapsed
+        else:
+            endpoint = f"thread:{threading.current_thread().name}"
+        if elapsed >= self.slow_query_seconds:
+            with self._lock:
+                self.slow_query_count[endpoint] += 1
+                self.slow_queries.append({
+                    'endpoint': endpoint,
+                    'ms': round(elapsed * 1000, 1),
+                    'statement': ' '.join(statement.split())[:1000],
+                    'at': time.time(),
+                })
+
+    # Views
+
+    def _check_token(self):
+        # Route names and SQL text are not for the public: no token, no metrics
+        token = self.app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f"Bearer {token}".encode()):
+            abort(403)
+
+    def metrics_view(self):
+        self._check_token()
+        return Response(self.render(), content_type=CONTENT_TYPE)
+
+    def slow_queries_view(self):
+        self._check_token()
+        with self._lock:
+            samples = list(self.slow_queries)
+        return jsonify(sorted(samples, key=lambda s: s['ms'], reverse=True))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            header('typing_http_requests_total', 'counter', 'Requests handled, by endpoint, method and status.')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f"typing_http_requests_total"
+                             f"{_labels((('endpoint', endpoint), ('method', method), ('status', status)))} {count}")
+
+            header('typing_http_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+            for endpoint, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('typing_http_request_duration_seconds', (('endpoint', endpoint),)))
+
+            header('typing_db_statements_per_request', 'histogram', 'SQL statements executed per request.')
+            for endpoint, histogram in sorted(self.statements.items()):
+                lines.extend(histogram.lines('typing_db_statements_per_request', (('endpoint', endpoint),)))
+
+            header('typing_db_seconds_total', 'counter', 'Time spent executing SQL, by endpoint.')
+            for endpoint, seconds in sorted(self.db_seconds.items()):
+                lines.append(f"typing_db_seconds_total{_labels((('endpoint', endpoint),))} {_number(seconds)}")
+
+            header('typing_db_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS.')
+            for endpoint, count in sorted(self.slow_query_count.items()):
+                lines.append(f"typing_db_slow_queries_total{_labels((('endpoint', endpoint),))} {count}")
+
+        for prefix, stats in self._stats:
+            try:
+                values = stats()
+            except Exception as e:
+                logging.error(f"Could not collect {prefix} stats: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                header(f"{prefix}_{key}", 'gauge', f"{prefix} {key}.")
+                lines.append(f"{prefix}_{key} {_number(value)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Instrumentation()
@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+PASSING_ACCURACY = 95.0
+NAME_CACHE_SIZE = 10000
+
+
+class LessonBoard:
+    """Best WPM per user for one lesson, kept sorted for bisect lookups"""
+
+    def __init__(self):
+        self.entries = []  # (wpm, user_id), ascending
+        self.scores = {}   # user_id -> wpm
+
+    def set(self, user_id, wpm):
+        old = self.scores.get(user_id)
+        if old == wpm:
+            return
+        if old is not None:
+            self._remove(old, user_id)
+        self.scores[user_id] = wpm
+        insort(self.entries, (wpm, user_id))
+
+    def discard(self, user_id):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self._remove(old, user_id)
+
+    def _remove(self, wpm, user_id):
+        i = bisect_left(self.entries, (wpm, user_id))
+        if i < len(self.entries) and self.entries[i] == (wpm, user_id):
+            del self.entries[i]
+
+    def slower_than(self, wpm):
+        """Number of scores strictly below wpm"""
+        return bisect_left(self.entries, (wpm,))
+
+    def rank(self, user_id):
+        """1-based rank (ties share the best rank), or None if not on the board"""
+        wpm = self.scores.get(user_id)
+        if wpm is None:
+            return None
+        faster = len(self.entries) - bisect_left(self.entries, (wpm, float('inf')))
+        return faster + 1
+
+    def top(self, n):
+        return [(user_id, wpm) for wpm, user_id in reversed(self.entries[-n:])]
+
+
+class Leaderboards:
+    """Per-lesson leaderboards updated incrementally from save_progress.
+
+    Only passing scores (95%+ accuracy) are ranked. Each worker keeps its own
+    boards, so they are rebuilt from Progress in the background every
+    LEADERBOARD_REBUILD_INTERVAL seconds to pick up other workers' writes.
+    With a preloaded app, gunicorn builds them once in the master (see
+    gunicorn.conf.py) so no request pays for the first full build.
+    """
+
+    def __init__(self, app=None, rebuild_interval=600):
+        self.app = app
+        self.rebuild_interval = rebuild_interval
+        self._boards = defaultdict(LessonBoard)
+        self._names = {}
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._rebuilding = False
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('LEADERBOARD_REBUILD_INTERVAL',
+                              float(os.environ.get('LEADERBOARD_REBUILD_INTERVAL', self.rebuild_interval)))
+        self.rebuild_interval = app.config['LEADERBOARD_REBUILD_INTERVAL']
+
+    def _ensure_built(self):
+        if self._built_at is None:
+            self.rebuild()
+        elif time.monotonic() - self._built_at > self.rebuild_interval and not self._rebuilding:
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild_in_background, name='leaderboard-rebuild', daemon=True).start()
+
+    def _rebuild_in_background(self):
+        try:
+            with self.app.app_context():
+                self.rebuild()
+        except Exception as e:
+            logging.error(f"Leaderboard rebuild error: {e}")
+        finally:
+            self._rebuilding = False
+
+    def rebuild(self):
+        """Rebuild every board from the Progress table"""
+        from app import db
+        from models import Progress
+
+        boards = defaultdict(LessonBoard)
+        # Lessons skipped by a roster placement are passed with no speed and are not ranked
+        rows = db.session.query(Progress.lesson_id, Progress.user_id, Progress.wpm).filter(
+            Progress.accuracy >= PASSING_ACCURACY, Progress.wpm > 0
+        )
+        entries = defaultdict(list)
+        for lesson_id, user_id, wpm in rows.yield_per(10000):
+            entries[lesson_id].append((wpm or 0.0, user_id))
+        for lesson_id, lesson_entries in entries.items():
+            board = boards[lesson_id]
+            lesson_entries.sort()
+            board.entries = lesson_entries
+            board.scores = {user_id: wpm for wpm, user_id in lesson_entries}
+
+        with self._lock:
+            self._boards = boards
+            self._built_at = time.monotonic()
+            # Names are re-read after every rebuild, which also picks up renamed users
+            self._names = {}
+
+    def record(self, lesson_id, user_id, wpm, accuracy):
+        """Apply the stored Progress values for one user and lesson"""
+        if self._built_at is None:
+            # Nothing to update yet; the first lookup builds from Progress
+            return
+        with self._lock:
+            board = self._boards[lesson_id]
+            if accuracy >= PASSING_ACCURACY and wpm > 0:
+                board.set(user_id, wpm)
+            else:
+                board.discard(user_id)
+
+    def standing(self, lesson_id, user_id):
+        """Rank, board size and percentage of other typists this user is faster than"""
+        self._ensure_built()
+        with self._lock:
+            board = self._boards.get(lesson_id)
+            if board is None or user_id not in board.scores:
+                return None
+            total = len(board.entries)
+            slower = board.slower_than(board.scores[user_id])
+            return {
+                'rank': board.rank(user_id),
+                'total': total,
+                'percentile': round(100.0 * slower / (total - 1), 1) if total > 1 else None,
+            }
+
+    def top(self, lesson_id, n=10):
+        """Top n scores for a lesson as dicts with rank, user_id, name and wpm"""
+        self._ensure_built()
+        with self._lock:
+            board = self._boards.get(lesson_id)
+            leaders = board.top(n) if board is not None else []
+        self._resolve_names([user_id for user_id, _ in leaders])
+
+        result = []
+        for user_id, wpm in leaders:
+            rank = result[-1]['rank'] if result and result[-1]['wpm'] == wpm else len(result) + 1
+            result.append({'rank': rank, 'user_id': user_id, 'name': self._names.get(user_id, ''), 'wpm': wpm})
+        return result
+
+    def _resolve_names(self, user_ids):
+        from models import User
+
+        missing = [user_id for user_id in user_ids if user_id not in self._names]
+        if not missing:
+            return
+        if len(self._names) + len(missing) > NAME_CACHE_SIZE:
+            self._names = {}
+        rows = User.query.with_entities(User.id, User.first_name, User.last_name).filter(User.id.in_(missing))
+        for user_id, first_name, last_name in rows:
+            self._names[user_id] = f"{first_name} {last_name[:1]}." if last_name else first_name
+
+
+leaderboards = Leaderboards()
@@ -0,0 +1,136 @@
+import os
+import json
+import logging
+from datetime import datetime
+
+from lesson_catalog import lesson_hash, catalog_hash, focus_keys_for, estimate_difficulty
+
+LESSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lessons')
+MANIFEST_NAME = 'manifest.json'
+STATE_KEY = 'lesson_bundle'
+
+
+class BundleError(Exception):
+    pass
+
+
+def _read_lesson(lesson_dir, filename):
+    with open(os.path.join(lesson_dir, filename), 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def _lesson_files(lesson_dir):
+    numbers = []
+    for name in os.listdir(lesson_dir):
+        if name.startswith('lesson') and name.endswith('.txt') and name[6:-4].isdigit():
+            numbers.append(int(name[6:-4]))
+    return [(number, f'lesson{number}.txt') for number in sorted(numbers)]
+
+
+def build_manifest(lesson_dir=LESSON_DIR):
+    """Write manifest.json for the lesson files, bumping the version if content changed"""
+    path = os.path.join(lesson_dir, MANIFEST_NAME)
+    previous = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    lessons = []
+    contents = []
+    for number, filename in _lesson_files(lesson_dir):
+        content = _read_lesson(lesson_dir, filename)
+        contents.append((number, content))
+        title = f"Lesson {number}"
+        if previous:
+            title = next((l['title'] for l in previous['lessons'] if l['number'] == number), title)
+        lessons.append({
+            'number': number,
+            'file': filename,
+            'title': title,
+            'sha256': lesson_hash(number, content),
+        })
+
+    bundle_hash = catalog_hash(contents)
+    version = 1
+    if previous:
+        version = previous['version'] + (1 if previous['bundle_sha256'] != bundle_hash else 0)
+
+    manifest = {'version': version, 'bundle_sha256': bundle_hash, 'lessons': lessons}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+    return manifest
+
+
+def load_bundle(lesson_dir=LESSON_DIR):
+    """Read the manifest and lesson files, verifying every hash"""
+    with open(os.path.join(lesson_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    lessons = []
+    for entry in manifest['lessons']:
+        content = _read_lesson(lesson_dir, entry['file'])
+        if lesson_hash(entry['number'], content) != entry['sha256']:
+            raise BundleError(f"{entry['file']} does not match the manifest; run 'flask build-lesson-bundle'")
+        lessons.append(dict(entry, content=content))
+
+    if catalog_hash([(l['number'], l['content']) for l in lessons]) != manifest['bundle_sha256']:
+        raise BundleError("Lesson bundle hash does not match the manifest")
+    return manifest, lessons
+
+
+def sync_lessons(lesson_dir=LESSON_DIR, force=False):
+    """Bring the Lesson table in line with the bundle, touching only what changed.
+
+    The applied bundle hash is recorded in AppState, so running this again
+    against the same bundle costs a single query. Returns a dict of counts.
+    """
+    from app import db
+    from models import Lesson, AppState
+    from lesson_catalog import catalog
+
+    manifest, lessons = load_bundle(lesson_dir)
+    state = db.session.get(AppState, STATE_KEY)
+    applied = f"{manifest['version']}:{manifest['bundle_sha256']}"
+    if state is not None and state.value == applied and not force:
+        return {'version': manifest['version'], 'added': 0, 'updated': 0, 'unchanged': len(lessons), 'skipped': True}
+
+    existing = {lesson.number: lesson for lesson in Lesson.query.all()}
+    added = updated = unchanged = 0
+    for entry in lessons:
+        focus_keys = focus_keys_for(entry['content'])
+        difficulty = estimate_difficulty(entry['content'])[1]
+        lesson = existing.get(entry['number'])
+        if lesson is None:
+            db.session.add(Lesson(
+                number=entry['number'],
+                content=entry['content'],
+                title=entry['title'],
+                focus_keys=focus_keys,
+                difficulty=difficulty,
+            ))
+            added += 1
+            logging.info(f"Added lesson {entry['number']}")
+        elif lesson_hash(lesson.number, lesson.content) != entry['sha256'] or lesson.title != entry['title']:
+            lesson.content = entry['content']
+            lesson.title = entry['title']
+            lesson.focus_keys = focus_keys
+            lesson.difficulty = difficulty
+            updated += 1
+            logging.info(f"Updated lesson {entry['number']}")
+        else:
+            if lesson.focus_keys != focus_keys or lesson.difficulty != difficulty:
+                # Rows from before these columns were derived here
+                lesson.focus_keys = focus_keys
+                lesson.difficulty = difficulty
+            unchanged += 1
+
+    # Running workers reload their lesson catalog when this row changes (see LessonCatalog)
+    if state is None:
+        db.session.add(AppState(key=STATE_KEY, value=applied))
+    else:
+        state.value = applied
+        state.updated_at = datetime.utcnow()
+    db.session.commit()
+    catalog.invalidate()
+    return {'version': manifest['version'], 'added': added, 'updated': updated, 'unchanged': unchanged, 'skipped': False}
@@ -0,0 +1,189 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+HOME_ROW = set("asdfghjkl;'")
+TOP_ROW = set("qwertyuiop[]\\")
+BOTTOM_ROW = set("zxcvbnm,./")
+UNSHIFTED_KEYS = HOME_ROW | TOP_ROW | BOTTOM_ROW
+
+
+def lesson_hash(number, content):
+    """Hash a single lesson so edited lessons can be detected"""
+    return hashlib.sha256(f"{number}\n{content}".encode('utf-8')).hexdigest()
+
+
+def catalog_hash(lessons):
+    """Hash the whole lesson set from (number, content) pairs"""
+    digest = hashlib.sha256()
+    for number, content in sorted(lessons):
+        digest.update(lesson_hash(number, content).encode('ascii'))
+    return digest.hexdigest()
+
+
+def focus_keys_for(content):
+    """Distinct keys a lesson uses, as stored in Lesson.focus_keys"""
+    keys = sorted({c.lower() for c in content if not c.isspace()})
+    return ''.join(keys)[:100]
+
+
+def estimate_difficulty(content, char_freq=None):
+    """Estimate lesson difficulty from the keys it uses. Returns (score 0-100, label)."""
+    char_freq = char_freq if char_freq is not None else Counter(content)
+    total = off_home = far_rows = shifted = 0
+    keys = set()
+    for char, count in char_freq.items():
+        if char.isspace():
+            continue
+        key = char.lower()
+        keys.add(key)
+        total += count
+        if key not in HOME_ROW:
+            off_home += count
+            if key not in TOP_ROW:
+                far_rows += count
+        if char.isupper() or not (char.isalnum() or key in UNSHIFTED_KEYS):
+            shifted += count
+    if not total:
+        return 0.0, 'beginner'
+
+    variety = min(len(keys) / 30, 1.0)
+    score = round(100 * (0.3 * off_home / total + 0.2 * far_rows / total + 0.2 * shifted / total + 0.3 * variety), 1)
+    if score < 25:
+        label = 'beginner'
+    elif score < 50:
+        label = 'intermediate'
+    else:
+        label = 'advanced'
+    return score, label
+
+
+class CatalogLesson:
+    """Read-only, detached copy of a Lesson row plus precomputed metadata"""
+
+    __slots__ = ('id', 'number', 'title', 'content', 'difficulty', 'difficulty_score',
+                 'focus_keys', 'char_count', 'char_freq', 'bigram_freq', 'content_hash')
+
+    def __init__(self, id, number, title, content):
+        self.id = id
+        self.number = number
+        self.title = title
+        self.content = content
+        self.char_count = len(content)
+        self.char_freq = Counter(content)
+        self.bigram_freq = Counter(content[i:i + 2] for i in range(len(content) - 1))
+        self.focus_keys = focus_keys_for(content)
+        self.difficulty_score, self.difficulty = estimate_difficulty(content, self.char_freq)
+        self.content_hash = lesson_hash(number, content)
+
+    def __repr__(self):
+        return f"<CatalogLesson {self.number}>"
+
+
+class LessonCatalog:
+    """Lessons loaded once per worker and served from memory.
+
+    The catalog is rebuilt after invalidate() (called by sync_lessons in the
+    process that ran it) and, every LESSON_CATALOG_TTL seconds, when the
+    AppState row sync_lessons writes shows that lessons were synced since the
+    last load; that check is a single primary-key read. A TTL of 0 turns the
+    revalidation off.
+    """
+
+    def __init__(self, app=None, ttl=30):
+        self.app = app
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._lessons = None
+        self._by_id = {}
+        self._by_number = {}
+        self._hash = None
+        self._marker = None
+        self._checked_at = 0.0
+        self.loads = 0
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('LESSON_CATALOG_TTL', float(os.environ.get('LESSON_CATALOG_TTL', self.ttl)))
+        self.ttl = app.config['LESSON_CATALOG_TTL']
+
+    def _snapshot(self):
+        if self._lessons is None:
+            self.refresh()
+        elif self.ttl and time.monotonic() - self._checked_at > self.ttl:
+            self.revalidate()
+        return self._lessons
+
+    def _sync_marker(self):
+        """Applied bundle and time of the last sync_lessons, or None before the first"""
+        from models import AppState
+        from lesson_bundle import STATE_KEY
+
+        row = AppState.query.with_entities(AppState.value, AppState.updated_at).filter_by(key=STATE_KEY).first()
+        return tuple(row) if row is not None else None
+
+    def revalidate(self):
+        """Reload only if lessons were synced since the last load"""
+        self._checked_at = time.monotonic()
+        if self._sync_marker() != self._marker:
+            return self.refresh()
+        return False
+
+    def refresh(self):
+        """Reload lessons from the database if their content hash changed.
+
+        Only reads, so it is safe to call in the middle of a request's
+        transaction; stored metadata is kept up to date by sync_lessons.
+        """
+        from models import Lesson
+
+        with self._lock:
+            # Read before the lessons, so a sync landing in between is seen next time
+            marker = self._sync_marker()
+            rows = Lesson.query.with_entities(Lesson.id, Lesson.number, Lesson.title, Lesson.content).order_by(
+                Lesson.number).all()
+            new_hash = catalog_hash([(row.number, row.content) for row in rows])
+            self._checked_at = time.monotonic()
+            self._marker = marker
+            if new_hash == self._hash and self._lessons is not None:
+                return False
+
+            lessons = [CatalogLesson(row.id, row.number, row.title, row.content) for row in rows]
+            self._by_id = {lesson.id: lesson for lesson in lessons}
+            self._by_number = {lesson.number: lesson for lesson in lessons}
+            self._lessons = lessons
+            self._hash = new_hash
+            self.loads += 1
+            logging.info(f"Lesson catalog loaded ({len(lessons)} lessons, hash {new_hash[:12]})")
+            return True
+
+    def invalidate(self):
+        """Drop the in-memory lessons so the next access reloads them"""
+        with self._lock:
+            self._lessons = None
+
+    @property
+    def content_hash(self):
+        self._snapshot()
+        return self._hash
+
+    def all(self):
+        return list(self._snapshot())
+
+    def get(self, lesson_id):
+        self._snapshot()
+        return self._by_id.get(lesson_id)
+
+    def by_number(self, number):
+        self._snapshot()
+        return self._by_number.get(number)
+
+    def by_id(self):
+        self._snapshot()
+        return dict(self._by_id)
+
+
+catalog = LessonCatalog()
@@ -0,0 +1,267 @@
+import os
+import time
+import socket
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+from sqlalchemy import or_
+
+
+def build_message(sender, recipient, subject, text_body, html_body=None):
+    """Build the MIME message for a queued mail"""
+    if html_body:
+        msg = MIMEMultipart("alternative")
+        msg.attach(MIMEText(text_body, "plain"))
+        msg.attach(MIMEText(html_body, "html"))
+    else:
+        msg = MIMEText(text_body, "plain")
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = recipient
+    return msg
+
+
+class SMTPConnection:
+    """One reusable SMTP session, reopened when it is closed or goes stale"""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True, timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _open(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        # Local stand-ins such as aiosmtpd do not offer AUTH
+        smtp.ehlo_or_helo_if_needed()
+        if self.username and self.password and smtp.has_extn('auth'):
+            smtp.login(self.username, self.password)
+        self.connects += 1
+        return smtp
+
+    def send(self, sender, recipient, message):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._smtp is None:
+            self._smtp = self._open()
+        try:
+            self._smtp.sendmail(sender, [recipient], message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+            # The server dropped an idle session; retry once on a fresh one
+            self.close()
+            self._smtp = self._open()
+            self._smtp.sendmail(sender, [recipient], message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class MailQueue:
+    """Outbound mail backed by the OutboundMail table.
+
+    Requests call enqueue() and return immediately. A pool of worker threads
+    claims due messages with a lease, sends them over long-lived SMTP
+    connections and reschedules failures with exponential backoff. A message
+    whose worker died is picked up again when its lease runs out.
+
+    With MAIL_IN_PROCESS_WORKERS (the default) every web worker starts its
+    threads when gunicorn forks it (and on first enqueue() otherwise); set
+    it to 0 and run ``flask --app app mail-worker`` as a separate process
+    instead.
+
+    Point MAIL_SERVER/MAIL_PORT at a local stand-in to test, e.g.
+    ``python -m aiosmtpd -n -l localhost:8025`` with MAIL_USE_TLS=0.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self.sent = 0
+        self.failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('MAIL_SERVER', os.environ.get('MAIL_SERVER', 'smtp.gmail.com'))
+        config.setdefault('MAIL_PORT', int(os.environ.get('MAIL_PORT', 587)))
+        config.setdefault('MAIL_USE_TLS', os.environ.get('MAIL_USE_TLS', '1') not in ('0', 'false', 'False'))
+        config.setdefault('MAIL_USERNAME', os.environ.get('MAIL_USERNAME'))
+        config.setdefault('MAIL_PASSWORD', os.environ.get('MAIL_PASSWORD'))
+        config.setdefault('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_DEFAULT_SENDER') or config['MAIL_USERNAME'])
+        config.setdefault('MAIL_WORKERS', int(os.environ.get('MAIL_WORKERS', 2)))
+        config.setdefault('MAIL_IN_PROCESS_WORKERS', os.environ.get('MAIL_IN_PROCESS_WORKERS', '1') != '0')
+        config.setdefault('MAIL_MAX_ATTEMPTS', 6)
+        config.setdefault('MAIL_RETRY_BASE', 30)       # seconds before the first retry
+        config.setdefault('MAIL_RETRY_MAX', 3600)      # longest wait between retries
+        config.setdefault('MAIL_LEASE', 300)           # seconds a worker may hold a message
+        config.setdefault('MAIL_POLL_INTERVAL', 10)
+        config.setdefault('MAIL_BATCH_SIZE', 20)
+
+    def enqueue(self, recipient, subject, text_body, html_body=None):
+        """Add a message to the queue. The caller commits the session."""
+        from app import db
+        from models import OutboundMail
+
+        mail = OutboundMail(recipient=recipient, subject=subject, text_body=text_body, html_body=html_body)
+        db.session.add(mail)
+        if self.app.config['MAIL_IN_PROCESS_WORKERS']:
+            self.start()
+        return mail
+
+    def notify(self):
+        """Wake the workers after the enqueuing transaction commits"""
+        self._wakeup.set()
+
+    def start(self, workers=None):
+        # Threads do not survive a fork, so each worker process starts its own pool
+        if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'mail-worker-{n}', daemon=True)
+                for n in range(workers or self.app.config['MAIL_WORKERS'])
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'workers': sum(1 for t in self._threads if t.is_alive()),
+        }
+
+    def _connection(self):
+        config = self.app.config
+        return SMTPConnection(
+            config['MAIL_SERVER'],
+            config['MAIL_PORT'],
+            config['MAIL_USERNAME'],
+            config['MAIL_PASSWORD'],
+            use_tls=config['MAIL_USE_TLS'],
+        )
+
+    def _run(self):
+        connection = self._connection()
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    processed = self.process_due(connection)
+            except Exception as e:
+                logging.error(f"Mail worker error: {e}")
+                processed = 0
+            if not processed:
+                connection.close_if_idle()
+                self._wakeup.wait(self.app.config['MAIL_POLL_INTERVAL'])
+                self._wakeup.clear()
+        connection.close()
+
+    def _claim(self, limit):
+        """Take a lease on up to limit due messages; safe across threads and processes"""
+        from app import db
+        from models import OutboundMail
+
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.app.config['MAIL_LEASE'])
+        candidates = OutboundMail.query.with_entities(
+            OutboundMail.id, OutboundMail.status, OutboundMail.next_attempt_at
+        ).filter(
+            or_(OutboundMail.status == 'pending', OutboundMail.status == 'sending'),
+            OutboundMail.next_attempt_at <= now,
+        ).order_by(OutboundMail.next_attempt_at).limit(limit).all()
+
+        claimed = []
+        for mail_id, status, next_attempt_at in candidates:
+            updated = OutboundMail.query.filter_by(
+                id=mail_id, status=status, next_attempt_at=next_attempt_at
+            ).update({'status': 'sending', 'next_attempt_at': lease_until}, synchronize_session=False)
+            if updated:
+                claimed.append(mail_id)
+        db.session.commit()
+        return claimed
+
+    def process_due(self, connection=None):
+        """Send every due message this worker can claim. Returns how many were handled."""
+        from app import db
+        from models import OutboundMail
+
+        config = self.app.config
+        own_connection = connection is None
+        connection = connection or self._connection()
+        handled = 0
+        try:
+            while not self._stop.is_set():
+                claimed = self._claim(config['MAIL_BATCH_SIZE'])
+                if not claimed:
+                    break
+                for mail in OutboundMail.query.filter(OutboundMail.id.in_(claimed)).all():
+                    sender = config['MAIL_DEFAULT_SENDER']
+                    message = build_message(sender, mail.recipient, mail.subject, mail.text_body, mail.html_body)
+                    mail.attempts += 1
+                    try:
+                        connection.send(sender, mail.recipient, message.as_string())
+                    except Exception as e:
+                        connection.close()
+                        mail.last_error = str(e)[:500]
+                        if mail.attempts >= config['MAIL_MAX_ATTEMPTS']:
+                            mail.status = 'failed'
+                            self.failed += 1
+                            logging.error(f"Giving up on mail {mail.id} to {mail.recipient}: {e}")
+                        else:
+                            delay = min(config['MAIL_RETRY_BASE'] * 2 ** (mail.attempts - 1), config['MAIL_RETRY_MAX'])
+                            mail.status = 'pending'
+                            mail.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                            logging.warning(f"Mail {mail.id} failed, retrying in {delay}s: {e}")
+                    else:
+                        mail.status = 'sent'
+                        mail.sent_at = datetime.utcnow()
+                        mail.last_error = None
+                        self.sent += 1
+                    # Commit per message so a crash never resends what already went out
+                    db.session.commit()
+                    handled += 1
+        finally:
+            if own_connection:
+                connection.close()
+        return handled
+
+
+mail_queue = MailQueue()
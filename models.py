@@ -39,4 +39,100 @@ class Achievement(db.Model):
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200))
     icon = db.Column(db.String(50), default="🏆")
-    earned_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    earned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class KeystrokeBatch(db.Model):
+    # One row per flushed group of keystrokes for an attempt, not one row per key
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    attempt_id = db.Column(db.String(36), nullable=False, index=True)
+    first_seq = db.Column(db.Integer, nullable=False)  # Client batch sequence numbers covered
+    last_seq = db.Column(db.Integer, nullable=False)
+    event_count = db.Column(db.Integer, nullable=False)
+    error_count = db.Column(db.Integer, default=0)
+    events = db.Column(db.LargeBinary, nullable=False)  # zlib-packed keystroke records, see telemetry.py
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class KeyErrorCount(db.Model):
+    # Running keystroke totals per user by expected key or two-key sequence, folded in by the telemetry flush
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(2), primary_key=True)  # one lowercased character or a bigram
+    presses = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UnlockFrontier(db.Model):
+    # Highest lesson number N such that lessons 1..N are all passed at 95% accuracy
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    frontier = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AttemptLog(db.Model):
+    # Append-only record of every completed attempt; Progress only keeps the best one
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    wpm = db.Column(db.Float, default=0.0)
+    accuracy = db.Column(db.Float, default=0.0)
+    time_taken = db.Column(db.Integer, default=0)  # in seconds
+    error_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class SyncReceipt(db.Model):
+    # Client idempotency keys of attempts already applied, so a retried sync never counts one twice
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(36), primary_key=True)
+    lesson_id = db.Column(db.Integer, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class AttemptRollup(db.Model):
+    # Daily and weekly aggregates of AttemptLog, updated as attempts are recorded
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(8), nullable=False)  # 'day' or 'week'
+    period_start = db.Column(db.Date, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lesson.id'), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    wpm_sum = db.Column(db.Float, nullable=False, default=0.0)
+    best_wpm = db.Column(db.Float, nullable=False, default=0.0)
+    accuracy_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('period', 'period_start', 'user_id', 'lesson_id', name='attempt_rollup_key'),
+        db.Index('attempt_rollup_user', 'user_id', 'period', 'period_start'),
+    )
+
+    @property
+    def mean_wpm(self):
+        return self.wpm_sum / self.attempts if self.attempts else 0.0
+
+    @property
+    def mean_accuracy(self):
+        return self.accuracy_sum / self.attempts if self.attempts else 0.0
+
+
+class OutboundMail(db.Model):
+    # Persistent mail queue drained by the workers in mailer.py
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    text_body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text)
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+class AppState(db.Model):
+    # Small key/value store for deployment bookkeeping, e.g. the applied lesson bundle
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.String(200), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+
+SESSION_KEY = 'progress_version'
+
+
+class MemoryBackend:
+    """LRU cache bounded by the total size of the stored values"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        value, _expires = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self._bytes, 'evictions': self.evictions}
+
+
+class FileSystemBackend:
+    """Cache shared by every worker on the host, one file per key.
+
+    Stands in for a shared cache server: all workers see each other's entries
+    and version bumps. Writes go through a temporary file and os.replace so
+    readers never see a partial entry. Every prune_every writes, expired files
+    are removed and then the oldest ones until the directory fits max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=32 * 1024 * 1024, prune_every=200):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self._writes = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires = float(f.readline())
+                if expires <= time.time():
+                    return None
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(f"{time.time() + ttl}\n".encode('ascii'))
+                f.write(value)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            logging.warning(f"Could not write page cache entry: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def prune(self):
+        """Delete expired entries, then the least recently written beyond max_bytes"""
+        now = time.time()
+        live = []  # (mtime, size, path)
+        for entry in os.scandir(self.directory):
+            try:
+                with open(entry.path, 'rb') as f:
+                    expired = float(f.readline()) <= now
+                stat = entry.stat()
+            except (OSError, ValueError):
+                expired = not entry.name.startswith('.tmp-')
+                stat = None
+            if expired:
+                self._evict(entry.path)
+            elif stat is not None:
+                live.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _mtime, size, _path in live)
+        for _mtime, size, path in sorted(live):
+            if total <= self.max_bytes:
+                break
+            self._evict(path)
+            total -= size
+
+    def _evict(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except OSError:
+            pass
+
+    def stats(self):
+        return {'evictions': self.evictions}
+
+
+class PageCache:
+    """Rendered-page and fragment cache with strong ETags.
+
+    Views decorated with cached_page get an ETag on every 200 response, so a
+    browser revalidating an unchanged page receives a 304. For anonymous
+    visitors the whole response is stored and replayed. Logged-in users share
+    nothing; instead views cache per-user fragments whose key includes the
+    user's progress version (bumped by save_progress) and the lesson catalog
+    hash, so neither stale progress nor stale lessons can be served.
+
+    PAGE_CACHE_BACKEND is 'memory' (per worker, LRU bounded by
+    PAGE_CACHE_MAX_BYTES), 'filesystem' (shared by all workers through
+    PAGE_CACHE_DIR, also bounded by PAGE_CACHE_MAX_BYTES) or 'none'.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = None
+        self.ttl = 600
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('PAGE_CACHE_BACKEND', os.environ.get('PAGE_CACHE_BACKEND', 'memory'))
+        config.setdefault('PAGE_CACHE_DIR', os.environ.get('PAGE_CACHE_DIR') or os.path.join(app.instance_path, 'page_cache'))
+        config.setdefault('PAGE_CACHE_MAX_BYTES', int(os.environ.get('PAGE_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+        config.setdefault('PAGE_CACHE_TTL', int(os.environ.get('PAGE_CACHE_TTL', 600)))
+
+        self.ttl = config['PAGE_CACHE_TTL']
+        backend = config['PAGE_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(config['PAGE_CACHE_MAX_BYTES'])
+        elif backend == 'filesystem':
+            self.backend = FileSystemBackend(config['PAGE_CACHE_DIR'], config['PAGE_CACHE_MAX_BYTES'])
+        elif backend == 'none':
+            self.backend = None
+        else:
+            raise RuntimeError(f"Unknown PAGE_CACHE_BACKEND {backend!r}")
+
+    def _release(self):
+        # Cached HTML embeds lesson data and asset URLs, so either changing retires it
+        from lesson_catalog import catalog
+        from assets import assets
+        return f"{catalog.content_hash[:16]}:{assets.build_id()}"
+
+    def _get(self, key):
+        value = self.backend.get(key) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _set(self, key, value, ttl=None):
+        if self.backend is not None:
+            self.backend.set(key, value, ttl or self.ttl)
+            self.stores += 1
+
+    # Per-user versions
+
+    def user_version(self, user_id):
+        """Token that changes whenever the user's progress does.
+
+        The shared part comes from the backend so progress made on another
+        device is seen; the session part makes this browser's own writes
+        visible at once even when each worker has its own memory backend.
+        """
+        shared = self.backend.get(f"version:user:{user_id}") if self.backend is not None else None
+        return f"{(shared or b'0').decode('ascii')}.{session.get(SESSION_KEY, 0)}"
+
+    def bump_user(self, user_id):
+        """Retire every cached fragment for the user"""
+        token = uuid.uuid4().hex[:12]
+        session[SESSION_KEY] = token
+        if self.backend is not None:
+            self.backend.set(f"version:user:{user_id}", token.encode('ascii'), max(self.ttl, 86400))
+
+    # Fragments
+
+    def fragment(self, name, user_id, render):
+        """Rendered HTML fragment for one user, from the cache when possible"""
+        key = f"fragment:{name}:{user_id}:{self.user_version(user_id)}:{self._release()}"
+        cached = self._get(key)
+        if cached is not None:
+            return Markup(cached.decode('utf-8'))
+        html = str(render())
+        self._set(key, html.encode('utf-8'))
+        return Markup(html)
+
+    # Whole pages
+
+    def conditional(self, response):
+        """Give a rendered 200 response a strong ETag and answer 304 if it matches"""
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32])
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def _cacheable(self):
+        return (
+            request.method == 'GET'
+            and not current_user.is_authenticated
+            and '_flashes' not in session
+        )
+
+    def cached_page(self, view):
+        """Decorator: store whole pages for anonymous visitors, ETag every page"""
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self._cacheable():
+                return self.conditional(make_response(view(*args, **kwargs)))
+
+            # Cached views ignore the query string, so it must not split the cache
+            key = f"page:{request.path}:{self._release()}"
+            cached = self._get(key)
+            if cached is not None:
+                header, body = cached.split(b'\n', 1)
+                meta = json.loads(header)
+                response = self.app.response_class(body, content_type=meta['content_type'])
+                return self.conditional(response)
+
+            response = make_response(view(*args, **kwargs))
+            # A view that touched the session is answering this visitor, not everyone
+            if response.status_code == 200 and not response.direct_passthrough and not session.modified:
+                header = json.dumps({'content_type': response.content_type}).encode('utf-8')
+                self._set(key, header + b'\n' + response.get_data())
+            return self.conditional(response)
+
+        return wrapper
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+page_cache = PageCache()
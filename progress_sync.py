@@ -0,0 +1,195 @@
+import math
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+MAX_BATCH = 100
+MAX_AGE = timedelta(days=30)  # oldest completion time accepted from a client clock
+FINAL_LESSON = 23
+MAX_WPM = 300  # well past the fastest recorded typists
+MAX_COUNT = 2**31 - 1  # time_taken and errors are 32-bit integer columns
+
+
+def parse_attempt(item, now=None):
+    """Validate one completed attempt sent by a client.
+
+    Returns a dict with key, lesson_id, wpm, accuracy, time_taken, errors and
+    when, or None if the item is unusable. 'at' is the client's completion time
+    in epoch milliseconds, clamped so a wrong clock cannot date an attempt far
+    into the past or into the future. Scores outside 0..MAX_WPM wpm or
+    0..100% accuracy, and negative times or error counts, make it unusable.
+    """
+    from lesson_catalog import catalog
+
+    if not isinstance(item, dict):
+        return None
+    now = now or datetime.utcnow()
+    key = str(item.get('key') or '')[:36]
+    try:
+        lesson_id = int(item['lesson_id'])
+        wpm = float(item.get('wpm', 0))
+        accuracy = float(item.get('accuracy', 0))
+        time_taken = int(item.get('time_taken', 0))
+        errors = int(item.get('errors', 0))
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return None
+    if not (math.isfinite(wpm) and 0 <= wpm <= MAX_WPM and math.isfinite(accuracy) and 0 <= accuracy <= 100):
+        return None
+    if not (0 <= time_taken <= MAX_COUNT and 0 <= errors <= MAX_COUNT):
+        return None
+    if not key or catalog.get(lesson_id) is None:
+        return None
+
+    when = now
+    at = item.get('at')
+    if isinstance(at, (int, float)) and not isinstance(at, bool):
+        try:
+            when = min(now, max(now - MAX_AGE, datetime.utcfromtimestamp(at / 1000)))
+        except (OverflowError, OSError, ValueError):
+            when = now
+    return {
+        'key': key,
+        'lesson_id': lesson_id,
+        'wpm': wpm,
+        'accuracy': accuracy,
+        'time_taken': time_taken,
+        'errors': errors,
+        'when': when,
+    }
+
+
+def achievements_for(lesson_id, wpm, accuracy):
+    achievements = []
+    if accuracy >= 95.0 and lesson_id < FINAL_LESSON:
+        achievements.append(f"Lesson {lesson_id} completed! Lesson {lesson_id + 1} unlocked!")
+    elif accuracy >= 95.0 and lesson_id == FINAL_LESSON:
+        achievements.append("Congratulations! You've completed all lessons!")
+
+    if wpm >= 40 and accuracy >= 95.0:
+        achievements.append("Speed Demon! 40+ WPM with 95%+ accuracy!")
+    return achievements
+
+
+def apply_best(progress, attempt):
+    """Fold an attempt into the user's Progress row for the lesson.
+
+    Always update while the stored accuracy is below 95%; after that only a
+    better attempt may replace the passing score.
+    """
+    wpm = attempt['wpm']
+    accuracy = attempt['accuracy']
+    current_accuracy = progress.accuracy if progress.accuracy is not None else 0.0
+    if current_accuracy < 95.0 or wpm > progress.wpm or (wpm == progress.wpm and accuracy > progress.accuracy):
+        progress.wpm = wpm
+        progress.accuracy = accuracy
+        progress.time_taken = attempt['time_taken']
+        progress.error_count = attempt['errors']
+
+
+def sync_attempts(user_id, attempts):
+    """Apply a user's completed attempts, in completion order, in one transaction.
+
+    attempts are dicts from parse_attempt. Returns one result per attempt, in
+    the order given. An attempt whose key has been applied before, earlier in
+    this batch or in an earlier request, comes back as 'duplicate' and changes
+    nothing, so clients can retry freely.
+    """
+    from app import db
+
+    try:
+        return _apply(user_id, attempts)
+    except IntegrityError:
+        # A concurrent retry stored some of the same keys first; the receipts now say which
+        db.session.rollback()
+        logging.info(f"Progress sync for user {user_id} raced a retry; reapplying")
+        return _apply(user_id, attempts)
+
+
+def _result(attempt, status):
+    return {
+        'key': attempt['key'],
+        'status': status,
+        'achievements': achievements_for(attempt['lesson_id'], attempt['wpm'], attempt['accuracy']),
+        'accuracy_met': attempt['accuracy'] >= 95.0,
+        'next_lesson_unlocked': attempt['accuracy'] >= 95.0 and attempt['lesson_id'] < FINAL_LESSON,
+    }
+
+
+def _apply(user_id, attempts):
+    from app import db
+    from models import Progress, SyncReceipt
+    from lesson_catalog import catalog
+    from leaderboard import leaderboards
+    import unlocks
+    import history
+
+    keys = {attempt['key'] for attempt in attempts}
+    seen = {key for (key,) in db.session.query(SyncReceipt.key).filter(
+        SyncReceipt.user_id == user_id, SyncReceipt.key.in_(keys)
+    )}
+
+    # A key repeated within the batch is applied once, for its first occurrence
+    first = {}
+    for index, attempt in enumerate(attempts):
+        first.setdefault(attempt['key'], index)
+
+    results = [None] * len(attempts)
+    fresh = []
+    for index in sorted(range(len(attempts)), key=lambda index: attempts[index]['when']):
+        attempt = attempts[index]
+        if first[attempt['key']] != index or attempt['key'] in seen:
+            results[index] = _result(attempt, 'duplicate')
+            continue
+        fresh.append(attempt)
+        results[index] = _result(attempt, 'saved')
+    if not fresh:
+        return results
+
+    # One read for every lesson the batch touches, then the best-score rule in memory
+    lesson_ids = {attempt['lesson_id'] for attempt in fresh}
+    progress = {row.lesson_id: row for row in Progress.query.filter(
+        Progress.user_id == user_id, Progress.lesson_id.in_(lesson_ids)
+    )}
+    for attempt in fresh:
+        row = progress.get(attempt['lesson_id'])
+        if row is None:
+            row = Progress(user_id=user_id, lesson_id=attempt['lesson_id'])
+            db.session.add(row)
+            progress[attempt['lesson_id']] = row
+        apply_best(row, attempt)
+
+    db.session.add_all(
+        SyncReceipt(user_id=user_id, key=attempt['key'], lesson_id=attempt['lesson_id'])
+        for attempt in fresh
+    )
+
+    # Keep the unlock frontier in step with the scores actually stored, lowest lesson first
+    for lesson_id in sorted(lesson_ids, key=lambda lesson_id: catalog.get(lesson_id).number):
+        unlocks.update_frontier(
+            user_id,
+            catalog.get(lesson_id).number,
+            progress[lesson_id].accuracy >= unlocks.PASSING_ACCURACY
+        )
+
+    # Every attempt goes to the append-only log and its rollups, not just the best one
+    history.record_attempts(user_id, [
+        (a['lesson_id'], a['wpm'], a['accuracy'], a['time_taken'], a['errors'], a['when'])
+        for a in fresh
+    ])
+    db.session.commit()
+
+    for lesson_id in lesson_ids:
+        leaderboards.record(lesson_id, user_id, progress[lesson_id].wpm, progress[lesson_id].accuracy)
+    return results
+
+
+def prune_receipts(days=90):
+    """Delete receipts older than any client would still retry. Returns the count."""
+    from app import db
+    from models import SyncReceipt
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    deleted = SyncReceipt.query.filter(SyncReceipt.received_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,215 @@
+import os
+import time
+import logging
+import threading
+from itertools import count
+
+from flask import request, session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+BIND_PREFIX = 'replica'
+SESSION_KEY = 'primary_until'
+READ_METHODS = ('GET', 'HEAD')
+
+# Seconds of replay lag on a PostgreSQL standby; 0 on a primary or anything else.
+# An idle primary makes this grow too, which only sends reads to the primary.
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_is_in_recovery() "
+    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+)
+
+
+def replica_binds(urls):
+    """SQLALCHEMY_BINDS entries for a comma-separated DATABASE_REPLICA_URLS value"""
+    binds = {}
+    for n, url in enumerate(u.strip() for u in (urls or '').split(',')):
+        if url:
+            if url.startswith("postgres://"):
+                url = url.replace("postgres://", "postgresql://", 1)
+            binds[f"{BIND_PREFIX}{n}"] = url
+    return binds
+
+
+class RoutingSession(Session):
+    """A session that sends reads to a replica and everything else to the primary.
+
+    Only statements issued while handling a GET or HEAD request may go to a
+    replica, and only plain SELECTs (no FOR UPDATE). The first flush or write
+    pins the session to the primary for the rest of the request, so a row that
+    is about to be changed is read from where it will be written. Each session
+    keeps to one replica so a request sees a single snapshot.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        engine = replicas.route(self, clause)
+        if engine is not None:
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _on_commit(db_session):
+    # Once this browser's writes are committed, keep its reads on the primary
+    # until every replica in use is guaranteed to have them
+    if db_session.info.get('wrote') and has_request_context():
+        session[SESSION_KEY] = time.time() + replicas.max_lag
+
+
+class ReplicaRouter:
+    """Routes read-only request work to read replicas (DATABASE_REPLICA_URLS).
+
+    Replicas are Flask-SQLAlchemy binds named replica0, replica1, ... and are
+    used round-robin by RoutingSession. Every REPLICA_CHECK_INTERVAL seconds a
+    background thread runs a health check on each one; a replica that cannot
+    be reached, or a PostgreSQL standby more than REPLICA_MAX_LAG seconds
+    behind, is skipped until a later check passes, and with no healthy replica
+    reads fall back to the primary. A connection error on a replica takes it
+    out at once; that request fails but the following ones do not.
+
+    Read-your-writes: a request that commits a write records, in the user's
+    session cookie, a deadline REPLICA_MAX_LAG seconds ahead; until then that
+    browser's reads stay on the primary.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.keys = []
+        self.state = {}
+        self.max_lag = 5.0
+        self.check_interval = 10.0
+        self._next = count()
+        self._checked_at = None
+        self._checking = False
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.fallbacks = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        self.app = app
+        config = app.config
+        config.setdefault('REPLICA_MAX_LAG', float(os.environ.get('REPLICA_MAX_LAG', 5)))
+        config.setdefault('REPLICA_CHECK_INTERVAL', float(os.environ.get('REPLICA_CHECK_INTERVAL', 10)))
+        self.max_lag = config['REPLICA_MAX_LAG']
+        self.check_interval = config['REPLICA_CHECK_INTERVAL']
+        self.keys = sorted(key for key in config.get('SQLALCHEMY_BINDS') or {} if key.startswith(BIND_PREFIX))
+        self.state = {key: {'healthy': True, 'lag': None, 'error': None} for key in self.keys}
+        if not self.keys:
+            return
+
+        with app.app_context():
+            for key in self.keys:
+                event.listen(db.engines[key], 'handle_error', self._connection_error(key))
+        logging.info(f"Routing reads to {len(self.keys)} replica(s)")
+
+    def _connection_error(self, key):
+        def handle_error(context):
+            if context.is_disconnect:
+                self._mark(key, False, error=str(context.original_exception))
+        return handle_error
+
+    def _mark(self, key, healthy, lag=None, error=None):
+        state = self.state[key]
+        if state['healthy'] != healthy:
+            if healthy:
+                logging.info(f"Replica {key} is back (lag {lag or 0:.1f}s)")
+            else:
+                logging.warning(f"Replica {key} taken out of rotation: {error or f'lag {lag:.1f}s'}")
+        state.update(healthy=healthy, lag=lag, error=error)
+
+    def check(self):
+        """Probe every replica now and update its health"""
+        from app import db
+
+        with self.app.app_context():
+            for key in self.keys:
+                engine = db.engines[key]
+                try:
+                    with engine.connect() as conn:
+                        if engine.dialect.name == 'postgresql':
+                            lag = float(conn.execute(POSTGRES_LAG).scalar() or 0)
+                        else:
+                            conn.execute(text('SELECT 1'))
+                            lag = 0.0
+                except Exception as e:
+                    self._mark(key, False, error=str(e).splitlines()[0])
+                    continue
+                self._mark(key, lag <= self.max_lag, lag=lag)
+        self._checked_at = time.monotonic()
+
+    def _check_in_background(self):
+        try:
+            self.check()
+        except Exception as e:
+            logging.error(f"Replica health check error: {e}")
+        finally:
+            self._checking = False
+
+    def _maybe_check(self):
+        if self._checking:
+            return
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._checking:
+                return
+            self._checking = True
+        threading.Thread(target=self._check_in_background, name='replica-check', daemon=True).start()
+
+    def _pick(self):
+        self._maybe_check()
+        healthy = [key for key in self.keys if self.state[key]['healthy']]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def _readable(self, db_session, clause):
+        if db_session.info.get('pinned') or db_session._flushing:
+            return False
+        if clause is None or not getattr(clause, 'is_select', False) or getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if not has_request_context() or request.method not in READ_METHODS:
+            return False
+        return session.get(SESSION_KEY, 0) <= time.time()
+
+    def route(self, db_session, clause):
+        """Engine for a statement in db_session, or None for the primary"""
+        if not self.keys:
+            return None
+        if not self._readable(db_session, clause):
+            if db_session._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                # From here on this session reads what it writes
+                db_session.info['pinned'] = db_session.info['wrote'] = True
+            elif clause is not None:
+                self.primary_reads += 1
+            return None
+
+        key = db_session.info.get('replica')
+        if key is None or not self.state[key]['healthy']:
+            key = self._pick()
+            if key is None:
+                self.fallbacks += 1
+                self.primary_reads += 1
+                return None
+            db_session.info['replica'] = key
+        self.replica_reads += 1
+        return db_session._db.engines[key]
+
+    def stats(self):
+        return {
+            'replicas': len(self.keys),
+            'healthy': sum(state['healthy'] for state in self.state.values()),
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'fallbacks': self.fallbacks,
+        }
+
+
+replicas = ReplicaRouter()
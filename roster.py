@@ -0,0 +1,273 @@
+import csv
+import time
+import logging
+import secrets
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+REQUIRED_COLUMNS = ('email', 'first_name', 'last_name')
+MIN_PASSWORD_LENGTH = 6
+CHUNK_SIZE = 500
+# Stays well under every database's bound-parameter limit
+LOOKUP_BATCH = 5000
+
+
+def _column(name):
+    return (name or '').strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def parse_start_lesson(value, lesson_count):
+    """Lesson number a student starts on, or None for lesson 1"""
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"start lesson {value!r} is not a number")
+    if not 1 <= number <= lesson_count:
+        raise ValueError(f"start lesson {number} is not between 1 and {lesson_count}")
+    return number if number > 1 else None
+
+
+def read_roster(lines, start_lesson=None):
+    """Parse a CSV roster in one pass.
+
+    Columns: email, first_name, last_name and, optionally, password and
+    start_lesson (header case and spacing are ignored). A missing password is
+    generated; start_lesson falls back to the start_lesson argument. Returns
+    (entries, problems): entries are dicts ready for import_entries, problems
+    are (line, email, reason) for rows that were left out, including repeats
+    of an email earlier in the file.
+    """
+    from lesson_catalog import catalog
+
+    lesson_count = len(catalog.all())
+    default_start = parse_start_lesson(start_lesson, lesson_count)
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return [], []
+    reader.fieldnames = [_column(name) for name in reader.fieldnames]
+    missing = [name for name in REQUIRED_COLUMNS if name not in reader.fieldnames]
+    if missing:
+        raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+
+    entries, problems, seen = [], [], set()
+    for row in reader:
+        line = reader.line_num
+        email = (row.get('email') or '').strip()
+        first_name = (row.get('first_name') or '').strip()
+        last_name = (row.get('last_name') or '').strip()
+        password = row.get('password') or ''
+        if not (email or first_name or last_name):
+            continue
+        if not (email and first_name and last_name):
+            problems.append((line, email, "email, first_name and last_name are required"))
+            continue
+        if len(email) > 120 or len(first_name) > 64 or len(last_name) > 64:
+            problems.append((line, email, "a field is too long"))
+            continue
+        if password and len(password) < MIN_PASSWORD_LENGTH:
+            problems.append((line, email, f"password is shorter than {MIN_PASSWORD_LENGTH} characters"))
+            continue
+        try:
+            start = parse_start_lesson(row.get('start_lesson'), lesson_count)
+        except ValueError as e:
+            problems.append((line, email, str(e)))
+            continue
+        if email.lower() in seen:
+            problems.append((line, email, "repeats an earlier row"))
+            continue
+        seen.add(email.lower())
+        entries.append({
+            'line': line,
+            'email': email,
+            'first_name': first_name,
+            'last_name': last_name,
+            'password': password,
+            'generated': not password,
+            'start_lesson': start or default_start,
+        })
+    return entries, problems
+
+
+def existing_emails(emails):
+    """The subset of emails that already have an account, in one query per LOOKUP_BATCH"""
+    from app import db
+    from models import User
+
+    emails = list(emails)
+    found = set()
+    for i in range(0, len(emails), LOOKUP_BATCH):
+        found.update(email for (email,) in db.session.query(User.email).filter(User.email.in_(emails[i:i + LOOKUP_BATCH])))
+    return found
+
+
+def _placement(user_id, start_lesson, now):
+    """Progress and UnlockFrontier rows that open lessons before start_lesson.
+
+    Skipped lessons are recorded as passed with no speed or time, so the
+    unlock frontier and check-frontiers agree and leaderboards ignore them.
+    """
+    from lesson_catalog import catalog
+    from unlocks import PASSING_ACCURACY
+
+    frontier = (start_lesson or 1) - 1
+    progress = [{
+        'user_id': user_id,
+        'lesson_id': catalog.by_number(number).id,
+        'wpm': 0.0,
+        'accuracy': PASSING_ACCURACY,
+        'time_taken': 0,
+        'error_count': 0,
+        'timestamp': now,
+    } for number in range(1, frontier + 1)]
+    return progress, {'user_id': user_id, 'frontier': frontier, 'updated_at': now}
+
+
+def _insert_chunk(chunk, now):
+    """Insert one chunk of users with their placement rows; the caller commits"""
+    from app import db
+    from models import User, Progress, UnlockFrontier
+
+    users = [{
+        'email': entry['email'],
+        'first_name': entry['first_name'],
+        'last_name': entry['last_name'],
+        'password_hash': entry['password_hash'],
+        'created_at': now,
+    } for entry in chunk]
+    if db.engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+        created = db.session.execute(
+            insert(User).returning(User.id, User.email, sort_by_parameter_order=True), users
+        ).all()
+    else:
+        # No INSERT .. RETURNING for executemany (MySQL); emails are unique, so read the ids back at once
+        db.session.execute(insert(User), users)
+        ids = dict(db.session.query(User.email, User.id).filter(User.email.in_([user['email'] for user in users])))
+        created = [(ids[user['email']], user['email']) for user in users]
+
+    progress, frontiers = [], []
+    for entry, (user_id, _email) in zip(chunk, created):
+        rows, frontier = _placement(user_id, entry['start_lesson'], now)
+        progress.extend(rows)
+        frontiers.append(frontier)
+    if progress:
+        db.session.execute(insert(Progress), progress)
+    db.session.execute(insert(UnlockFrontier), frontiers)
+
+
+def _store_chunk(chunk, now):
+    """Insert and commit one chunk. Returns (created entries, (line, email, reason) for the rest)."""
+    from app import db
+
+    try:
+        _insert_chunk(chunk, now)
+        db.session.commit()
+        return chunk, []
+    except IntegrityError:
+        db.session.rollback()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Roster import: chunk of {len(chunk)} user(s) not saved: {e}")
+        return [], [(entry['line'], entry['email'], "could not be saved") for entry in chunk]
+
+    # Someone registered one of these emails meanwhile; retry once without the taken ones
+    taken = existing_emails(entry['email'] for entry in chunk)
+    logging.warning(f"Roster import: {len(taken)} email(s) were registered during the import")
+    skipped = [(entry['line'], entry['email'], "account already exists") for entry in chunk if entry['email'] in taken]
+    chunk = [entry for entry in chunk if entry['email'] not in taken]
+    if not chunk:
+        return [], skipped
+    try:
+        _insert_chunk(chunk, now)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logging.error(f"Roster import: chunk of {len(chunk)} user(s) not saved on retry: {e}")
+        return [], skipped + [(entry['line'], entry['email'], "could not be saved") for entry in chunk]
+    return chunk, skipped
+
+
+def import_entries(entries, chunk_size=CHUNK_SIZE, workers=None):
+    """Create accounts for parsed roster entries.
+
+    Emails that already exist are found with one set-based lookup, passwords
+    are hashed across the hasher's processes (see PasswordHasher.hash_many)
+    and each chunk of chunk_size users goes in with executemany INSERTs and
+    its own commit. A chunk that hits the unique email constraint (someone
+    registered meanwhile) is rolled back, re-checked and retried once without
+    the taken emails. A chunk whose hashing or insert fails is reported row by
+    row and the import carries on with the next one.
+
+    Returns (created, skipped): created entries, and (line, email, reason) for
+    the ones left out.
+    """
+    from hashing import hasher
+
+    taken = existing_emails(entry['email'] for entry in entries)
+    skipped = [(entry['line'], entry['email'], "account already exists") for entry in entries if entry['email'] in taken]
+    entries = [entry for entry in entries if entry['email'] not in taken]
+    for entry in entries:
+        if entry['generated']:
+            entry['password'] = secrets.token_urlsafe(9)
+
+    def hash_from(position):
+        return hasher.hash_many((entry['password'] for entry in entries[position:]), workers=workers)
+
+    created = []
+    now = datetime.utcnow()
+    hashes = hash_from(0)
+    try:
+        for i in range(0, len(entries), chunk_size):
+            chunk = entries[i:i + chunk_size]
+            try:
+                for entry in chunk:
+                    entry['password_hash'] = next(hashes)
+            except Exception as e:
+                # e.g. TimeoutError while the shared pool is busy with logins
+                reason = str(e) or type(e).__name__
+                logging.error(f"Roster import: hashing failed for {len(chunk)} user(s): {reason}")
+                skipped.extend((entry['line'], entry['email'], "password hashing failed") for entry in chunk)
+                hashes.close()
+                hashes = hash_from(i + chunk_size)
+                continue
+            stored, failed = _store_chunk(chunk, now)
+            created.extend(stored)
+            skipped.extend(failed)
+    finally:
+        hashes.close()
+    return created, skipped
+
+
+def import_roster(lines, start_lesson=None, chunk_size=CHUNK_SIZE, workers=None, dry_run=False):
+    """Read a CSV roster and create its accounts.
+
+    Returns a summary dict: created and skipped counts, problems as
+    (line, email, reason), credentials as (email, password) for every account
+    whose password was generated, and the elapsed seconds. With dry_run the
+    roster is only validated and checked against existing accounts.
+    """
+    started = time.perf_counter()
+    entries, problems = read_roster(lines, start_lesson)
+    if dry_run:
+        taken = existing_emails(entry['email'] for entry in entries)
+        problems += [(entry['line'], entry['email'], "account already exists") for entry in entries if entry['email'] in taken]
+        created = [entry for entry in entries if entry['email'] not in taken]
+        credentials = []
+    else:
+        created, skipped = import_entries(entries, chunk_size=chunk_size, workers=workers)
+        problems += skipped
+        credentials = [(entry['email'], entry['password']) for entry in created if entry['generated']]
+
+    elapsed = time.perf_counter() - started
+    logging.info(f"Roster import: {len(created)} created, {len(problems)} skipped in {elapsed:.2f}s")
+    return {
+        'created': len(created),
+        'skipped': len(problems),
+        'problems': sorted(problems),
+        'credentials': credentials,
+        'seconds': round(elapsed, 3),
+        'dry_run': dry_run,
+    }
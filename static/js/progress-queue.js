@@ -0,0 +1,104 @@
+// Completed attempts wait here until the server has acknowledged them, so a
+// result typed offline (or lost to a failed request) is sent on a later visit.
+// Attempts live in IndexedDB; without it (private browsing) they are kept in memory.
+const ProgressQueue = {
+    dbName: 'typing-tutor',
+    storeName: 'pending-attempts',
+    syncUrl: '/sync_progress',
+    batchSize: 50,
+    memory: new Map(),
+    dbPromise: null,
+    flushing: Promise.resolve(),
+
+    open() {
+        if (!this.dbPromise) {
+            this.dbPromise = new Promise((resolve, reject) => {
+                if (!self.indexedDB) {
+                    reject(new Error('IndexedDB unavailable'));
+                    return;
+                }
+                const request = indexedDB.open(this.dbName, 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore(this.storeName, { keyPath: 'key' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            }).catch(() => null);
+        }
+        return this.dbPromise;
+    },
+
+    async run(mode, action) {
+        const unwrap = request => request && 'result' in request ? request.result : undefined;
+        const db = await this.open();
+        if (!db) return unwrap(action(null));
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(this.storeName, mode);
+            const request = action(tx.objectStore(this.storeName));
+            tx.oncomplete = () => resolve(unwrap(request));
+            tx.onerror = () => reject(tx.error);
+        });
+    },
+
+    add(attempt) {
+        return this.run('readwrite', store => {
+            if (!store) {
+                this.memory.set(attempt.key, attempt);
+                return null;
+            }
+            return store.put(attempt);
+        });
+    },
+
+    async pending(userId) {
+        const attempts = await this.run('readonly', store => store ? store.getAll() : { result: [...this.memory.values()] });
+        // The same browser may be shared; each user only ever sends their own attempts
+        return (attempts || []).filter(attempt => String(attempt.user) === String(userId));
+    },
+
+    remove(keys) {
+        return this.run('readwrite', store => {
+            keys.forEach(key => store ? store.delete(key) : this.memory.delete(key));
+            return null;
+        });
+    },
+
+    // Send every pending attempt for the user in batches. Resolves to the
+    // server's per-attempt results, or null if the server could not be reached.
+    // Calls are serialised so an attempt queued during a flush is sent by the next one.
+    flush(userId) {
+        const next = this.flushing.then(() => this.send(userId));
+        this.flushing = next.catch(() => null);
+        return next;
+    },
+
+    async send(userId) {
+        const pending = (await this.pending(userId)).sort((a, b) => a.at - b.at);
+        const results = [];
+        for (let i = 0; i < pending.length; i += this.batchSize) {
+            const batch = pending.slice(i, i + this.batchSize);
+            let response;
+            try {
+                response = await fetch(this.syncUrl, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ attempts: batch }),
+                    credentials: 'same-origin',
+                    // A logged-out session is redirected to the login page; keep the attempts
+                    redirect: 'manual'
+                });
+            } catch (error) {
+                return null;
+            }
+            if (!response.ok) return null;
+
+            const body = await response.json();
+            // saved, duplicate and invalid are all final; only unanswered attempts stay queued
+            await this.remove(body.results.map(result => result.key).filter(Boolean));
+            results.push(...body.results);
+        }
+        return results;
+    }
+};
+
+self.ProgressQueue = ProgressQueue;
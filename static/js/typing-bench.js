@@ -0,0 +1,148 @@
+// Input-to-paint micro-benchmark for the practice page.
+//
+// Open any lesson with ?bench=1 (lesson 20 is the longest). A simulated typist
+// sends one keydown per animation frame through the real handler, with a few
+// mistakes and backspaces, twice: once with the previous renderer (the visible
+// window rebuilt and the stats redrawn on every key, keys found with
+// querySelector) and once with the incremental one. Per keystroke it records:
+//
+//   script  time spent in the keydown handler
+//   layout  the style and layout work the handler left behind (forced right after)
+//   paint   time from the key until the frame showing it has been painted
+//
+// Results appear in a panel on the page and in the console.
+class TypingBench {
+    constructor(tutor) {
+        this.tutor = tutor;
+        this.errorRate = 0.03;
+    }
+
+    nextFrame() {
+        return new Promise(resolve => requestAnimationFrame(resolve));
+    }
+
+    afterPaint() {
+        // A task queued from rAF runs once that frame has been painted
+        return new Promise(resolve => requestAnimationFrame(() => setTimeout(resolve, 0)));
+    }
+
+    keydown(key) {
+        this.tutor.textDisplay.dispatchEvent(new KeyboardEvent('keydown', { key: key, bubbles: true, cancelable: true }));
+    }
+
+    // The renderer typing.js used before spans were kept between keystrokes
+    useLegacyRenderer() {
+        const tutor = this.tutor;
+        tutor.renderText = function () {
+            this.textDisplay.innerHTML = '';
+            const startIndex = Math.max(0, this.currentPosition - 10);
+            const endIndex = Math.min(this.lessonContent.length, startIndex + 50);
+            for (let i = startIndex; i < endIndex; i++) {
+                const char = this.lessonContent[i];
+                const span = document.createElement('span');
+                span.textContent = char === ' ' ? '\u00A0' : char;
+                span.className = 'char';
+                span.dataset.index = i;
+                if (i < this.currentPosition) {
+                    span.classList.add(i < this.typedText.length && this.typedText[i] === char ? 'correct' : 'incorrect');
+                } else if (i === this.currentPosition) {
+                    span.classList.add('current');
+                }
+                this.textDisplay.appendChild(span);
+            }
+        };
+        tutor.buildText = tutor.renderText;
+        tutor.scheduleStats = tutor.updateStats;
+        tutor.highlightKey = function () {
+            document.querySelectorAll('.key.active').forEach(k => k.classList.remove('active'));
+            const expectedChar = this.lessonContent[this.currentPosition];
+            if (expectedChar) {
+                const keyElement = document.querySelector(`.key[data-key="${expectedChar.toLowerCase()}"]`);
+                if (keyElement) keyElement.classList.add('active');
+            }
+        };
+    }
+
+    useIncrementalRenderer() {
+        for (const name of ['renderText', 'buildText', 'scheduleStats', 'highlightKey']) {
+            delete this.tutor[name];
+        }
+    }
+
+    async typeLesson() {
+        const tutor = this.tutor;
+        const text = tutor.lessonContent;
+        const samples = { script: [], layout: [], paint: [] };
+        tutor.reset();
+        await this.afterPaint();
+
+        // Stop one short of the end so no result is shown or saved
+        let i = 0;
+        while (i < text.length - 1) {
+            const mistake = Math.random() < this.errorRate;
+            for (const key of mistake ? ['x', 'Backspace', text[i]] : [text[i]]) {
+                await this.nextFrame();
+                const start = performance.now();
+                this.keydown(key);
+                const scripted = performance.now();
+                void tutor.textDisplay.offsetWidth;
+                const laidOut = performance.now();
+                await this.afterPaint();
+                samples.script.push(scripted - start);
+                samples.layout.push(laidOut - scripted);
+                samples.paint.push(performance.now() - start);
+            }
+            i++;
+        }
+        return samples;
+    }
+
+    summarise(values) {
+        const sorted = [...values].sort((a, b) => a - b);
+        const pick = pct => sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * pct / 100))];
+        return { p50: pick(50).toFixed(2), p95: pick(95).toFixed(2), max: sorted[sorted.length - 1].toFixed(2) };
+    }
+
+    async run() {
+        const tutor = this.tutor;
+        await tutor.ready;
+        // Benchmark keystrokes are not practice: send no telemetry and save nothing
+        tutor.telemetryUrl = null;
+        tutor.userId = null;
+
+        const rows = [];
+        for (const [name, setup] of [['legacy', () => this.useLegacyRenderer()], ['incremental', () => this.useIncrementalRenderer()]]) {
+            setup();
+            const samples = await this.typeLesson();
+            for (const metric of ['script', 'layout', 'paint']) {
+                rows.push(Object.assign({ renderer: name, metric: metric, keys: samples[metric].length }, this.summarise(samples[metric])));
+            }
+        }
+        this.useIncrementalRenderer();
+        tutor.reset();
+        console.table(rows);
+        this.show(rows);
+        return rows;
+    }
+
+    show(rows) {
+        const panel = document.createElement('pre');
+        panel.id = 'typingBenchResults';
+        panel.style.cssText = 'position:fixed;right:1rem;bottom:1rem;z-index:1000;padding:1rem;' +
+            'background:#111827;color:#e5e7eb;font-size:12px;border-radius:8px;max-width:90vw;overflow:auto';
+        const lines = [`${this.tutor.lessonContent.length} chars, ms per keystroke`,
+            'renderer     metric   p50     p95     max'];
+        rows.forEach(row => {
+            lines.push(`${row.renderer.padEnd(12)} ${row.metric.padEnd(8)} ${row.p50.padStart(6)}  ${row.p95.padStart(6)}  ${row.max.padStart(6)}`);
+        });
+        panel.textContent = lines.join('\n');
+        document.body.appendChild(panel);
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    // typing.js creates the tutor in its own DOMContentLoaded handler, which runs first
+    if (window.typingTutor) {
+        new TypingBench(window.typingTutor).run();
+    }
+});
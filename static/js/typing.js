@@ -1,13 +1,26 @@
 class TypingTutor {
     constructor() {
-        this.lessonContent = document.querySelector('meta[name="lesson-content"]').getAttribute('content');
+        // Drills are generated per request and inline their text; lessons fetch theirs (see loadLesson)
+        const contentMeta = document.querySelector('meta[name="lesson-content"]');
+        this.lessonContent = contentMeta ? contentMeta.getAttribute('content') : '';
         this.lessonId = document.querySelector('meta[name="lesson-id"]').getAttribute('content');
+        const userMeta = document.querySelector('meta[name="user-id"]');
+        this.userId = userMeta ? userMeta.getAttribute('content') : null;
         this.currentPosition = 0;
         this.errors = 0;
         this.startTime = null;
         this.isCompleted = false;
         this.typedText = '';
         
+        // Keystroke telemetry is only sent for logged-in users
+        const telemetryMeta = document.querySelector('meta[name="telemetry-url"]');
+        this.telemetryUrl = telemetryMeta ? telemetryMeta.getAttribute('content') : null;
+        // Adaptive drills are not lessons: no progress to save and no next lesson
+        const modeMeta = document.querySelector('meta[name="practice-mode"]');
+        this.mode = modeMeta ? modeMeta.getAttribute('content') : 'lesson';
+        this.telemetryBatchSize = 50;
+        this.resetTelemetry();
+        
         this.textDisplay = document.getElementById('textDisplay');
         this.wpmDisplay = document.getElementById('wpmDisplay');
         this.accuracyDisplay = document.getElementById('accuracyDisplay');
@@ -18,52 +31,127 @@ class TypingTutor {
         this.resultsModal = document.getElementById('resultsModal');
         this.virtualKeyboard = document.getElementById('virtualKeyboard');
         
+        this.ready = this.start();
+    }
+    
+    async start() {
+        // Keep offering a retry until the lesson text arrives; only then is there anything to type
+        for (;;) {
+            try {
+                await this.loadLesson();
+                break;
+            } catch (error) {
+                console.error('Error loading lesson:', error);
+                await this.showLoadError();
+            }
+        }
         this.init();
     }
     
+    async loadLesson() {
+        const srcMeta = document.querySelector('meta[name="lesson-src"]');
+        if (!srcMeta) return;
+        // Versioned URL: served from the HTTP cache or the service worker after the first visit
+        const response = await fetch(srcMeta.getAttribute('content'), { credentials: 'same-origin' });
+        if (!response.ok) {
+            throw new Error(`Lesson request failed with status ${response.status}`);
+        }
+        const lesson = await response.json();
+        if (typeof lesson.content !== 'string') {
+            throw new Error('Lesson response has no content');
+        }
+        this.lessonContent = lesson.content;
+    }
+    
+    showLoadError() {
+        // Resolves when the user asks to try again
+        return new Promise(resolve => {
+            const message = document.createElement('span');
+            message.className = 'load-error';
+            message.textContent = navigator.onLine === false
+                ? 'You are offline and this lesson has not been saved for offline use yet. '
+                : 'This lesson could not be loaded. ';
+            const retry = document.createElement('button');
+            retry.type = 'button';
+            retry.className = 'btn btn-primary';
+            retry.textContent = 'Try again';
+            retry.addEventListener('click', () => {
+                message.textContent = 'Loading\u2026';
+                resolve();
+            }, { once: true });
+            message.appendChild(retry);
+            this.textDisplay.replaceChildren(message);
+        });
+    }
+    
     init() {
-        this.renderText();
+        this.buildText();
+        // The key map must exist before bindEvents highlights the first key
+        this.createVirtualKeyboard();
         this.bindEvents();
         this.startTimer();
-        this.createVirtualKeyboard();
         
         // Focus on the text display for direct typing
         this.textDisplay.focus();
     }
     
-    renderText() {
-        // Clear previous content
-        this.textDisplay.innerHTML = '';
+    buildText() {
+        // One span per character, built once per lesson; keystrokes then only touch the spans that change
+        const fragment = document.createDocumentFragment();
+        this.charSpans = new Array(this.lessonContent.length);
+        for (let i = 0; i < this.lessonContent.length; i++) {
+            const char = this.lessonContent[i];
+            const span = document.createElement('span');
+            span.textContent = char === ' ' ? '\u00A0' : char; // Use non-breaking space
+            span.className = 'char off';
+            this.charSpans[i] = span;
+            fragment.appendChild(span);
+        }
+        this.textDisplay.replaceChildren(fragment);
+        this.windowStart = 0;
+        this.windowEnd = 0;
+        this.renderedPosition = 0;
+        this.textDisplay.style.transform = 'translateX(0)';
+        this.renderText(true);
+    }
+    
+    charClass(i) {
+        if (i < this.currentPosition) {
+            return i < this.typedText.length && this.typedText[i] === this.lessonContent[i] ? 'char correct' : 'char incorrect';
+        }
+        return i === this.currentPosition ? 'char current' : 'char';
+    }
+    
+    renderText(full = false) {
+        const spans = this.charSpans;
         
         // Single line display - show only a window of characters
         const windowSize = 50; // Characters visible at once
         const startIndex = Math.max(0, this.currentPosition - 10); // Show 10 chars before current
-        const endIndex = Math.min(this.lessonContent.length, startIndex + windowSize);
-        
-        // Create character spans for the visible window
-        for (let i = startIndex; i < endIndex; i++) {
-            const char = this.lessonContent[i];
-            const span = document.createElement('span');
-            span.textContent = char === ' ' ? '\u00A0' : char; // Use non-breaking space
-            span.className = 'char';
-            span.dataset.index = i;
-            
-            // Apply styling based on position
-            if (i < this.currentPosition) {
-                if (i < this.typedText.length && this.typedText[i] === char) {
-                    span.classList.add('correct');
-                } else {
-                    span.classList.add('incorrect');
-                }
-            } else if (i === this.currentPosition) {
-                span.classList.add('current');
-            }
-            
-            this.textDisplay.appendChild(span);
+        const endIndex = Math.min(spans.length, startIndex + windowSize);
+        
+        // Only the characters between the last rendered position and the current one changed state
+        const from = full ? 0 : Math.min(this.renderedPosition, this.currentPosition);
+        const to = full ? spans.length - 1 : Math.min(spans.length - 1, Math.max(this.renderedPosition, this.currentPosition));
+        for (let i = from; i <= to; i++) {
+            const visible = i >= startIndex && i < endIndex;
+            const className = visible ? this.charClass(i) : this.charClass(i) + ' off';
+            if (spans[i].className !== className) spans[i].className = className;
         }
         
-       // Always ensure text is left-aligned without any transform
-            this.textDisplay.style.transform = 'translateX(0)';
+        // Slide the visible window: hide what scrolled out, show what scrolled in
+        const toggle = (begin, end, off) => {
+            for (let i = begin; i < end; i++) {
+                if (i < from || i > to) spans[i].classList.toggle('off', off);
+            }
+        };
+        toggle(this.windowStart, Math.min(this.windowEnd, startIndex), true);
+        toggle(Math.max(this.windowStart, endIndex), this.windowEnd, true);
+        toggle(startIndex, Math.min(endIndex, this.windowStart), false);
+        toggle(Math.max(startIndex, this.windowEnd), endIndex, false);
+        this.windowStart = startIndex;
+        this.windowEnd = endIndex;
+        this.renderedPosition = this.currentPosition;
     }
     
     centerCurrentChar() {
@@ -149,6 +237,10 @@ class TypingTutor {
         
         this.virtualKeyboard.appendChild(fingerGuides);
         
+        // Looked up on every key press, so keep a map instead of querying the DOM
+        this.keyElements = {};
+        this.activeKey = null;
+        
         keyboardLayout.forEach(row => {
             const keyboardRow = document.createElement('div');
             keyboardRow.className = 'keyboard-row';
@@ -158,6 +250,9 @@ class TypingTutor {
                 keyElement.className = 'key';
                 keyElement.textContent = key === ' ' ? 'Space' : key;
                 keyElement.dataset.key = key.toLowerCase();
+                if (!this.keyElements[key.toLowerCase()]) {
+                    this.keyElements[key.toLowerCase()] = keyElement;
+                }
                 
                 // Add finger color classes
                 if (fingerMapping[key.toLowerCase()]) {
@@ -179,18 +274,18 @@ class TypingTutor {
         });
     }
     
-    highlightKey(key) {
-        // Remove previous highlights
-        document.querySelectorAll('.key.active').forEach(k => k.classList.remove('active'));
-        
+    highlightKey() {
         // Highlight current key that should be pressed
         const expectedChar = this.lessonContent[this.currentPosition];
-        if (expectedChar) {
-            const keyElement = document.querySelector(`.key[data-key="${expectedChar.toLowerCase()}"]`);
-            if (keyElement) {
-                keyElement.classList.add('active');
-            }
+        const keyElement = expectedChar ? this.keyElements[expectedChar.toLowerCase()] : null;
+        if (keyElement === this.activeKey) return;
+        if (this.activeKey) {
+            this.activeKey.classList.remove('active');
+        }
+        if (keyElement) {
+            keyElement.classList.add('active');
         }
+        this.activeKey = keyElement || null;
     }
     
     bindEvents() {
@@ -236,9 +331,10 @@ class TypingTutor {
         // Handle backspace
         if (e.key === 'Backspace' && this.currentPosition > 0) {
             this.currentPosition--;
+            this.recordKeystroke(this.lessonContent[this.currentPosition], '\b');
             this.typedText = this.typedText.slice(0, -1);
             this.renderText();
-            this.updateStats();
+            this.scheduleStats();
             this.highlightKey();
             return;
         }
@@ -258,9 +354,8 @@ class TypingTutor {
         const typedChar = e.key;
         
         // Update keyboard visual feedback
-        const keyElement = document.querySelector(`.key[data-key="${expectedChar.toLowerCase()}"]`);
+        const keyElement = this.keyElements[expectedChar.toLowerCase()];
         if (keyElement) {
-            keyElement.classList.remove('active');
             if (typedChar === expectedChar) {
                 keyElement.classList.add('correct');
                 setTimeout(() => keyElement.classList.remove('correct'), 200);
@@ -272,6 +367,7 @@ class TypingTutor {
         
         // Track the typed character
         this.typedText += typedChar;
+        this.recordKeystroke(expectedChar, typedChar);
         
         // Check if character is correct
         if (typedChar !== expectedChar) {
@@ -279,11 +375,9 @@ class TypingTutor {
         }
         
         this.currentPosition++;
-        this.updateStats();
         this.renderText();
         this.highlightKey();
-        
-        
+        this.scheduleStats();
         
         // Check if lesson is complete
         if (this.currentPosition >= this.lessonContent.length) {
@@ -291,6 +385,68 @@ class TypingTutor {
         }
     }
     
+    newAttemptId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+    }
+    
+    resetTelemetry() {
+        this.attemptId = this.newAttemptId();
+        this.telemetrySeq = 0;
+        this.lastKeyTime = null;
+        this.telemetryBatch = { p: [], e: '', t: '', d: [] };
+    }
+    
+    recordKeystroke(expectedChar, typedChar) {
+        if (!this.telemetryUrl) return;
+        
+        const now = Date.now();
+        const batch = this.telemetryBatch;
+        batch.p.push(this.currentPosition);
+        batch.e += expectedChar;
+        batch.t += typedChar;
+        batch.d.push(this.lastKeyTime ? now - this.lastKeyTime : 0);
+        this.lastKeyTime = now;
+        
+        if (batch.p.length >= this.telemetryBatchSize) {
+            this.flushTelemetry();
+        }
+    }
+    
+    flushTelemetry() {
+        const batch = this.telemetryBatch;
+        if (!this.telemetryUrl || batch.p.length === 0) return;
+        
+        const body = JSON.stringify({
+            attempt: this.attemptId,
+            seq: this.telemetrySeq++,
+            p: batch.p,
+            e: batch.e,
+            t: batch.t,
+            d: batch.d
+        });
+        this.telemetryBatch = { p: [], e: '', t: '', d: [] };
+        
+        // Fire and forget - telemetry must never slow down typing
+        fetch(this.telemetryUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body,
+            keepalive: true
+        }).catch(error => console.error('Error sending telemetry:', error));
+    }
+    
+    scheduleStats() {
+        // Keys can arrive faster than frames; draw the stats at most once per frame
+        if (this.statsFrame) return;
+        this.statsFrame = requestAnimationFrame(() => {
+            this.statsFrame = null;
+            this.updateStats();
+        });
+    }
+    
     updateStats() {
         const timeElapsed = this.startTime ? (Date.now() - this.startTime) / 1000 : 0;
         const wpm = this.calculateWPM(timeElapsed);
@@ -338,6 +494,7 @@ class TypingTutor {
     completeLesson() {
         this.isCompleted = true;
         clearInterval(this.timerInterval);
+        this.flushTelemetry();
         
         const timeElapsed = (Date.now() - this.startTime) / 1000;
         const wpm = this.calculateWPM(timeElapsed);
@@ -346,7 +503,7 @@ class TypingTutor {
         this.showResults(wpm, accuracy, timeElapsed);
         
         // Save progress if user is logged in
-        if (document.querySelector('meta[name="csrf-token"]') || true) { // Assuming user is logged in
+        if (this.mode !== 'adaptive') {
             this.saveProgress(wpm, accuracy, timeElapsed);
         }
     }
@@ -381,7 +538,7 @@ class TypingTutor {
         
         // Handle next lesson button
         const nextLessonBtn = document.getElementById('nextLessonBtn');
-        if (accuracy >= 95 && parseInt(this.lessonId) < 21) {
+        if (this.mode !== 'adaptive' && accuracy >= 95 && parseInt(this.lessonId) < 21) {
             nextLessonBtn.style.display = 'inline-flex';
             nextLessonBtn.onclick = () => {
                 window.location.href = `/lesson/${parseInt(this.lessonId) + 1}`;
@@ -406,29 +563,42 @@ class TypingTutor {
     }
     
     async saveProgress(wpm, accuracy, timeElapsed) {
+        if (!this.userId) return;
+        // The attempt id doubles as the idempotency key, so a retried sync never counts it twice
+        const attempt = {
+            key: this.attemptId,
+            user: this.userId,
+            lesson_id: parseInt(this.lessonId),
+            wpm: wpm,
+            accuracy: accuracy,
+            time_taken: Math.round(timeElapsed),
+            errors: this.errors,
+            at: Date.now()
+        };
         try {
-            const response = await fetch(`/save_progress/${this.lessonId}`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({
-                    wpm: wpm,
-                    accuracy: accuracy,
-                    time_taken: Math.round(timeElapsed),
-                    errors: this.errors
-                })
-            });
-            
-            if (response.ok) {
-                const result = await response.json();
+            await ProgressQueue.add(attempt);
+            const results = await ProgressQueue.flush(this.userId);
+            const result = results && results.find(r => r.key === attempt.key);
+            if (result && result.status !== 'invalid') {
                 this.showAchievements(result.achievements);
+            } else if (!results) {
+                this.showOfflineNotice();
             }
         } catch (error) {
             console.error('Error saving progress:', error);
         }
     }
     
+    showOfflineNotice() {
+        const achievementsList = document.getElementById('achievementsList');
+        achievementsList.innerHTML = `
+            <div class="achievement-item">
+                <i class="fas fa-cloud-upload-alt"></i>
+                <span>Saved on this device. Your result will sync when you are back online.</span>
+            </div>
+        `;
+    }
+    
     showAchievements(achievements) {
         const achievementsList = document.getElementById('achievementsList');
         achievementsList.innerHTML = '';
@@ -450,13 +620,15 @@ class TypingTutor {
         this.startTime = null;
         this.isCompleted = false;
         this.typedText = '';
+        this.resetTelemetry();
         
         // Clear keyboard highlights
         document.querySelectorAll('.key.active, .key.correct, .key.incorrect').forEach(key => {
             key.classList.remove('active', 'correct', 'incorrect');
         });
+        this.activeKey = null;
         
-        this.renderText();
+        this.buildText();
         this.updateStats();
         this.highlightKey();
         
@@ -474,7 +646,21 @@ class TypingTutor {
 
 // Initialize the typing tutor when the page loads
 document.addEventListener('DOMContentLoaded', () => {
-    new TypingTutor();
+    if (document.querySelector('meta[name="lesson-id"]')) {
+        window.typingTutor = new TypingTutor();
+    }
+});
+
+// Offline support: cache lessons and assets, and send results queued while offline
+document.addEventListener('DOMContentLoaded', () => {
+    if ('serviceWorker' in navigator) {
+        navigator.serviceWorker.register('/sw.js').catch(error => console.error('Service worker registration failed:', error));
+    }
+    const userMeta = document.querySelector('meta[name="user-id"]');
+    if (!userMeta || !window.ProgressQueue) return;
+    const userId = userMeta.getAttribute('content');
+    ProgressQueue.flush(userId);
+    window.addEventListener('online', () => ProgressQueue.flush(userId));
 });
 
 // Modal close functionality
@@ -0,0 +1,331 @@
+import os
+import math
+import zlib
+import struct
+import atexit
+import logging
+import threading
+from collections import deque, defaultdict
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.exc import IntegrityError, DataError
+
+# Each keystroke is packed as (position, expected codepoint, typed codepoint, delta ms)
+EVENT_FORMAT = struct.Struct('<IIIH')
+MAX_POSITION = 0xFFFFFFFF
+MAX_DELTA_MS = 0xFFFF
+MAX_SEQ = 2 ** 31 - 1  # KeystrokeBatch.first_seq/last_seq are 32-bit integers
+BACKSPACE = '\b'
+
+
+def decode_batch(payload):
+    """Validate a client batch and return a list of (position, expected, typed, delta) tuples.
+
+    The client sends batches in columnar form to keep them small:
+    {"p": [positions], "e": "expected chars", "t": "typed chars", "d": [ms deltas]}
+    """
+    positions = payload.get('p')
+    expected = payload.get('e')
+    typed = payload.get('t')
+    deltas = payload.get('d')
+    if not isinstance(positions, list) or not isinstance(deltas, list):
+        raise ValueError("positions and deltas must be lists")
+    if not isinstance(expected, str) or not isinstance(typed, str):
+        raise ValueError("expected and typed must be strings")
+    if not (len(positions) == len(expected) == len(typed) == len(deltas)):
+        raise ValueError("batch columns have different lengths")
+
+    events = []
+    for position, exp, act, delta in zip(positions, expected, typed, deltas):
+        # bool is an int subclass
+        if not isinstance(position, int) or not isinstance(delta, (int, float)) or position < 0 \
+                or isinstance(position, bool) or isinstance(delta, bool):
+            raise ValueError("positions and deltas must be non-negative numbers")
+        # JSON may carry Infinity and NaN
+        if not math.isfinite(delta):
+            raise ValueError("deltas must be finite")
+        if position > MAX_POSITION:
+            raise ValueError("position out of range")
+        events.append((position, exp, act, min(max(int(delta), 0), MAX_DELTA_MS)))
+    return events
+
+
+def pack_events(events):
+    """Pack decoded keystroke events into a compressed blob"""
+    raw = b''.join(
+        EVENT_FORMAT.pack(position, ord(exp), ord(act), delta)
+        for position, exp, act, delta in events
+    )
+    return zlib.compress(raw)
+
+
+def unpack_events(blob):
+    """Inverse of pack_events"""
+    return [
+        (position, chr(exp), chr(act), delta)
+        for position, exp, act, delta in EVENT_FORMAT.iter_unpack(zlib.decompress(blob))
+    ]
+
+
+def count_errors(events):
+    """Count keystrokes that did not match the expected character"""
+    return sum(1 for _, exp, act, _ in events if act != BACKSPACE and act != exp)
+
+
+def count_keys(items):
+    """Presses and errors per (user, key) from queued batches.
+
+    Keys are lowercased expected characters plus, where the previous position
+    was typed in the same attempt, the two-character sequence ending there.
+    Backspaces and spaces are not counted.
+    """
+    counts = defaultdict(lambda: [0, 0])
+    previous = {}
+    for user_id, lesson_id, attempt_id, seq, events in items:
+        last_position, last_char = previous.get(attempt_id, (None, None))
+        for position, expected, typed, _delta in events:
+            if typed == BACKSPACE:
+                continue
+            char = expected.lower()
+            error = typed != expected
+            if not char.isspace():
+                entry = counts[(user_id, char)]
+                entry[0] += 1
+                entry[1] += error
+                if last_position == position - 1 and last_char and not last_char.isspace():
+                    entry = counts[(user_id, last_char + char)]
+                    entry[0] += 1
+                    entry[1] += error
+            last_position, last_char = position, char
+        previous[attempt_id] = (last_position, last_char)
+    return counts
+
+
+class TelemetryBuffer:
+    """Write-behind buffer for keystroke batches.
+
+    Requests only append to an in-memory queue; a background thread drains it and
+    writes one compact row per attempt per flush with a single bulk insert.
+    """
+
+    def __init__(self, app=None, flush_interval=2.0, flush_size=500, max_pending=50000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed_events = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+
+    def init_app(self, app):
+        self.app = app
+        config = app.config
+        config.setdefault('TELEMETRY_FLUSH_INTERVAL', float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', self.flush_interval)))
+        config.setdefault('TELEMETRY_FLUSH_SIZE', int(os.environ.get('TELEMETRY_FLUSH_SIZE', self.flush_size)))
+        config.setdefault('TELEMETRY_MAX_PENDING', int(os.environ.get('TELEMETRY_MAX_PENDING', self.max_pending)))
+        self.flush_interval = config['TELEMETRY_FLUSH_INTERVAL']
+        self.flush_size = config['TELEMETRY_FLUSH_SIZE']
+        self.max_pending = config['TELEMETRY_MAX_PENDING']
+        atexit.register(self.flush)
+
+    def submit(self, user_id, lesson_id, attempt_id, seq, events):
+        """Queue a decoded batch. Returns False if the buffer is full."""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((user_id, lesson_id, attempt_id, seq, events))
+            self.accepted += 1
+            pending = len(self._pending)
+        self._ensure_worker()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+        return True
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so start the flusher lazily in each worker process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='telemetry-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Telemetry flush error: {e}")
+
+    def _drain(self):
+        with self._lock:
+            items = list(self._pending)
+            self._pending.clear()
+        return items
+
+    def build_rows(self, items):
+        """Merge queued batches into one row per attempt"""
+        grouped = {}
+        for user_id, lesson_id, attempt_id, seq, events in items:
+            key = (user_id, lesson_id, attempt_id)
+            group = grouped.get(key)
+            if group is None:
+                grouped[key] = group = {'seqs': [], 'events': []}
+            group['seqs'].append(seq)
+            group['events'].extend(events)
+
+        rows = []
+        for (user_id, lesson_id, attempt_id), group in grouped.items():
+            if lesson_id is None:
+                # Adaptive drills only feed the per-key counts
+                continue
+            events = group['events']
+            try:
+                packed = pack_events(events)
+            except (struct.error, TypeError, ValueError) as e:
+                # decode_batch should make this impossible; never let one attempt sink the flush
+                self.failed_rows += 1
+                logging.error(f"Telemetry: skipping attempt {attempt_id} of user {user_id}: {e}")
+                continue
+            rows.append({
+                'user_id': user_id,
+                'lesson_id': lesson_id,
+                'attempt_id': attempt_id,
+                'first_seq': min(group['seqs']),
+                'last_seq': max(group['seqs']),
+                'event_count': len(events),
+                'error_count': count_errors(events),
+                'events': packed,
+            })
+        return rows
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of rows inserted."""
+        items = self._drain()
+        if not items or self.app is None:
+            return 0
+
+        from app import db
+
+        rows = self.build_rows(items)
+        with self.app.app_context():
+            try:
+                rows = self._insert_rows(rows)
+            except Exception:
+                # Nothing was written (e.g. the database is unreachable); try again next flush
+                self._requeue(items)
+                raise
+            try:
+                self.apply_key_counts(count_keys(items))
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Telemetry: per-key counts for {len(items)} batch(es) not saved: {e}")
+        self.flushed_rows += len(rows)
+        self.flushed_events += sum(row['event_count'] for row in rows)
+        return len(rows)
+
+    def _insert_rows(self, rows):
+        """Bulk insert rows; if one of them is rejected, insert them one by one and skip the bad ones.
+
+        Returns the rows that were written. Errors other than a rejected row
+        are raised with nothing written.
+        """
+        from app import db
+        from models import KeystrokeBatch
+
+        if not rows:
+            return rows
+        try:
+            db.session.execute(insert(KeystrokeBatch), rows)
+            db.session.commit()
+            return rows
+        except (IntegrityError, DataError) as e:
+            db.session.rollback()
+            logging.warning(f"Telemetry bulk insert rejected ({e.orig}); inserting {len(rows)} row(s) one at a time")
+        except Exception:
+            db.session.rollback()
+            raise
+
+        written = []
+        for row in rows:
+            try:
+                db.session.execute(insert(KeystrokeBatch), [row])
+                db.session.commit()
+                written.append(row)
+            except (IntegrityError, DataError) as e:
+                db.session.rollback()
+                self.failed_rows += 1
+                logging.error(f"Telemetry: dropping attempt {row['attempt_id']} of user {row['user_id']}: {e.orig}")
+        return written
+
+    def _requeue(self, items):
+        with self._lock:
+            room = max(0, self.max_pending - len(self._pending))
+            self._pending.extendleft(reversed(items[:room]))
+            self.dropped += len(items) - room
+
+    def apply_key_counts(self, counts):
+        """Add per-key totals to KeyErrorCount with one insert and one batched update"""
+        from app import db
+        from models import KeyErrorCount
+
+        if not counts:
+            return
+        table = KeyErrorCount.__table__
+        increment = update(table).where(
+            table.c.user_id == bindparam('b_user'),
+            table.c.key == bindparam('b_key'),
+        ).values(
+            presses=table.c.presses + bindparam('b_presses'),
+            errors=table.c.errors + bindparam('b_errors'),
+        )
+        user_ids = {user_id for user_id, _ in counts}
+        # Another worker may insert the same new key first; the retry then updates it
+        for attempt in range(2):
+            try:
+                existing = set(db.session.query(KeyErrorCount.user_id, KeyErrorCount.key).filter(
+                    KeyErrorCount.user_id.in_(user_ids)
+                ))
+                new_rows = [
+                    {'user_id': user_id, 'key': key, 'presses': presses, 'errors': errors}
+                    for (user_id, key), (presses, errors) in counts.items() if (user_id, key) not in existing
+                ]
+                increments = [
+                    {'b_user': user_id, 'b_key': key, 'b_presses': presses, 'b_errors': errors}
+                    for (user_id, key), (presses, errors) in counts.items() if (user_id, key) in existing
+                ]
+                if new_rows:
+                    db.session.execute(insert(KeyErrorCount), new_rows)
+                if increments:
+                    db.session.execute(increment, increments)
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt:
+                    raise
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'accepted': self.accepted,
+            'dropped': self.dropped,
+            'flushed_rows': self.flushed_rows,
+            'flushed_events': self.flushed_events,
+            'failed_rows': self.failed_rows,
+        }
+
+
+buffer = TelemetryBuffer()
@@ -0,0 +1,74 @@
+// Service worker: keeps lessons, assets and visited pages available offline.
+// Rendered by the service_worker view; a new asset build or lesson catalog changes VERSION.
+const VERSION = {{ version|tojson }};
+const STATIC_CACHE = `typing-static-${VERSION}`;
+const PAGE_CACHE = `typing-pages-${VERSION}`;
+const PRECACHE = {{ precache|tojson }};
+
+// Fingerprinted assets and versioned lesson text never change under the same URL
+const IMMUTABLE = [/^\/assets\//, /^\/lesson\/\d+\/content$/];
+// Pages worth having offline; everything else goes straight to the network
+const PAGES = [/^\/$/, /^\/lessons$/, /^\/index$/, /^\/lesson\/\d+$/];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(STATIC_CACHE)
+            .then(cache => cache.addAll(PRECACHE))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => name.startsWith('typing-') && name !== STATIC_CACHE && name !== PAGE_CACHE)
+                    .map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(STATIC_CACHE);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function networkFirst(request) {
+    try {
+        const response = await fetch(request);
+        // Redirects (to login, or away from a locked lesson) are not the page that was asked for
+        if (response.ok && !response.redirected) {
+            const cache = await caches.open(PAGE_CACHE);
+            cache.put(request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(request);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (request.method !== 'GET' || url.origin !== self.location.origin) return;
+
+    if (url.pathname === '/logout') {
+        // Pages cached for this user must not be shown to the next one
+        event.waitUntil(caches.delete(PAGE_CACHE));
+        return;
+    }
+    if (IMMUTABLE.some(pattern => pattern.test(url.pathname))) {
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate' && PAGES.some(pattern => pattern.test(url.pathname))) {
+        event.respondWith(networkFirst(request));
+    }
+});
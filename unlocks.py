@@ -0,0 +1,170 @@
+import logging
+from collections import defaultdict
+
+from flask import session, has_request_context
+from sqlalchemy.exc import IntegrityError
+
+PASSING_ACCURACY = 95.0
+SESSION_KEY = 'unlock_frontier'
+
+
+def frontier_from_passed(passed_numbers):
+    """Highest lesson number N such that lessons 1..N are all in passed_numbers"""
+    frontier = 0
+    while frontier + 1 in passed_numbers:
+        frontier += 1
+    return frontier
+
+
+def is_unlocked(frontier, lesson_number):
+    """Lesson 1 is always open; every other lesson needs the one before it passed"""
+    return lesson_number <= frontier + 1
+
+
+def unlocked_numbers(frontier, lesson_count):
+    return list(range(1, min(frontier + 1, lesson_count) + 1))
+
+
+def _lesson_numbers():
+    from lesson_catalog import catalog
+    return {lesson.id: lesson.number for lesson in catalog.all()}
+
+
+def _passed_numbers(user_id, min_number=None):
+    from models import Progress
+
+    numbers = _lesson_numbers()
+    rows = Progress.query.with_entities(Progress.lesson_id).filter(
+        Progress.user_id == user_id,
+        Progress.accuracy >= PASSING_ACCURACY,
+    ).all()
+    passed = {numbers.get(lesson_id, lesson_id) for (lesson_id,) in rows}
+    if min_number is not None:
+        passed = {n for n in passed if n >= min_number}
+    return passed
+
+
+def _cache(user_id, frontier):
+    if has_request_context():
+        session[SESSION_KEY] = [user_id, frontier]
+
+
+def _cached(user_id):
+    if has_request_context():
+        cached = session.get(SESSION_KEY)
+        if cached and cached[0] == user_id:
+            return cached[1]
+    return None
+
+
+def load_frontier(user_id):
+    """Read the stored frontier, building it from Progress the first time"""
+    from app import db
+    from models import UnlockFrontier
+
+    row = db.session.get(UnlockFrontier, user_id)
+    if row is None:
+        row = UnlockFrontier(user_id=user_id, frontier=frontier_from_passed(_passed_numbers(user_id)))
+        db.session.add(row)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent first request (or a read from a lagging replica) missed the
+            # row another request stored; the stored one is just as good
+            db.session.rollback()
+            row = db.session.get(UnlockFrontier, user_id, populate_existing=True)
+    _cache(user_id, row.frontier)
+    return row.frontier
+
+
+def get_frontier(user_id):
+    """Frontier for the user, served from the session when possible"""
+    cached = _cached(user_id)
+    if cached is not None:
+        return cached
+    return load_frontier(user_id)
+
+
+def check_unlocked(user_id, lesson_number):
+    """Unlock check that costs nothing unless the cached frontier says no.
+
+    A frontier cached in this browser's session can lag behind progress made
+    elsewhere, so a negative answer is confirmed against the stored row.
+    """
+    if is_unlocked(get_frontier(user_id), lesson_number):
+        return True
+    return is_unlocked(load_frontier(user_id), lesson_number)
+
+
+def update_frontier(user_id, lesson_number, passed):
+    """Apply one saved Progress result to the frontier.
+
+    Call after the Progress row has its final values, so a passing score that
+    was overwritten by a failing one moves the frontier back. The caller commits.
+    """
+    from app import db
+    from models import UnlockFrontier
+
+    row = db.session.get(UnlockFrontier, user_id)
+    if row is None:
+        # The Progress change is already flushed, so a full build sees it
+        db.session.flush()
+        frontier = frontier_from_passed(_passed_numbers(user_id))
+        db.session.add(UnlockFrontier(user_id=user_id, frontier=frontier))
+        _cache(user_id, frontier)
+        return frontier
+
+    frontier = row.frontier
+    if passed and lesson_number == frontier + 1:
+        # Lessons beyond this one may already be passed; extend over them
+        db.session.flush()
+        passed_after = _passed_numbers(user_id, min_number=lesson_number + 1)
+        frontier = lesson_number
+        while frontier + 1 in passed_after:
+            frontier += 1
+    elif not passed and lesson_number <= frontier:
+        frontier = lesson_number - 1
+
+    if frontier != row.frontier:
+        row.frontier = frontier
+    _cache(user_id, frontier)
+    return frontier
+
+
+def rebuild_frontiers(fix=False):
+    """Recompute every user's frontier from Progress in bulk.
+
+    Returns a list of (user_id, stored, expected) for rows that disagree.
+    With fix=True the stored rows are corrected.
+    """
+    from app import db
+    from models import Progress, UnlockFrontier, User
+
+    numbers = _lesson_numbers()
+    passed = defaultdict(set)
+    rows = db.session.query(Progress.user_id, Progress.lesson_id).filter(
+        Progress.accuracy >= PASSING_ACCURACY
+    )
+    for user_id, lesson_id in rows.yield_per(5000):
+        passed[user_id].add(numbers.get(lesson_id, lesson_id))
+
+    stored = {row.user_id: row for row in UnlockFrontier.query.all()}
+    mismatches = []
+    user_ids = [user_id for (user_id,) in db.session.query(User.id)]
+    for user_id in user_ids:
+        expected = frontier_from_passed(passed.get(user_id, set()))
+        row = stored.get(user_id)
+        current = row.frontier if row is not None else None
+        if current == expected or (row is None and expected == 0):
+            continue
+        mismatches.append((user_id, current, expected))
+        if fix:
+            if row is None:
+                db.session.add(UnlockFrontier(user_id=user_id, frontier=expected))
+            else:
+                row.frontier = expected
+
+    if fix and mismatches:
+        db.session.commit()
+        logging.info(f"Rebuilt {len(mismatches)} unlock frontiers")
+    return mismatches
@@ -1,4 +1,7 @@
 import math
+from collections import namedtuple
+
+import numpy as np
 
 def calculate_wpm(text, time_seconds):
     """Calculate Words Per Minute based on standard 5 characters per word"""
@@ -85,3 +88,238 @@ def calculate_typing_errors(original, typed):
             })
     
     return errors
+
+
+# Batch scoring
+#
+# The functions below score many (original, typed) pairs at once with NumPy
+# array operations. Results are arrays indexed like the input pairs rather
+# than lists of dicts, so rescoring jobs and the keystroke ingestion path can
+# aggregate them without touching Python objects per character.
+
+OP_MATCH = 0
+OP_SUBSTITUTION = 1
+OP_OMISSION = 2   # a character of the original was never typed
+OP_INSERTION = 3  # an extra character was typed
+
+BatchScores = namedtuple('BatchScores', 'correct total accuracy incorrect missing extra')
+BatchAlignment = namedtuple('BatchAlignment', 'distance substitutions omissions insertions accuracy errors')
+
+ERROR_DTYPE = np.dtype([
+    ('position', np.uint32),   # index into the original text
+    ('op', np.uint8),          # OP_SUBSTITUTION, OP_OMISSION or OP_INSERTION
+    ('expected', np.uint32),   # code point, 0 for insertions
+    ('actual', np.uint32),     # code point, 0 for omissions
+])
+
+
+def encode_text(text):
+    """Return the code points of text as a uint32 array"""
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def score_batch(originals, typed_texts):
+    """Positional scoring for many pairs at once.
+
+    Matches calculate_accuracy and the error counts of calculate_typing_errors
+    for every pair, but compares all pairs in one vectorized pass.
+    """
+    orig_lengths = np.fromiter((len(t) for t in originals), dtype=np.int64, count=len(originals))
+    typed_lengths = np.fromiter((len(t) for t in typed_texts), dtype=np.int64, count=len(typed_texts))
+    overlap = np.minimum(orig_lengths, typed_lengths)
+
+    # Compare the overlapping prefixes of every pair as one flat array
+    flat_orig = encode_text(''.join(o[:n] for o, n in zip(originals, overlap)))
+    flat_typed = encode_text(''.join(t[:n] for t, n in zip(typed_texts, overlap)))
+    matches = np.concatenate(([0], np.cumsum(flat_orig == flat_typed)))
+    ends = np.cumsum(overlap)
+    correct = matches[ends] - matches[ends - overlap]
+
+    total = np.maximum(orig_lengths, typed_lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = np.where(orig_lengths == 0, 100.0, np.round(correct / total * 100, 2))
+
+    return BatchScores(
+        correct=correct,
+        total=total,
+        accuracy=accuracy,
+        incorrect=overlap - correct,
+        missing=orig_lengths - overlap,
+        extra=typed_lengths - overlap,
+    )
+
+
+MOVE_DIAGONAL = 0
+MOVE_UP = 1
+MOVE_LEFT = 2
+
+
+def _banded_moves(orig_codes, typed_codes, orig_lengths, typed_lengths, band):
+    """Banded Levenshtein DP over a batch of pairs.
+
+    Row i holds cells j = i - band .. i + band. Each row is computed for all
+    pairs at once; the left-neighbour dependency is resolved with a running
+    minimum instead of a Python loop. Returns the final distances and a
+    (rows, pairs, 2*band+1) uint8 table of the move that reached each cell.
+    """
+    pairs, rows = orig_codes.shape[0], orig_codes.shape[1] + 1
+    width = 2 * band + 1
+    inf = np.int32(np.iinfo(np.int32).max // 2)
+    offsets = np.arange(width, dtype=np.int32)
+    pair_index = np.arange(pairs)
+
+    moves = np.full((rows, pairs, width), MOVE_LEFT, dtype=np.uint8)
+    distance = np.zeros(pairs, dtype=np.int32)
+    first = offsets - band
+    row = np.where((first >= 0) & (first[None, :] <= typed_lengths[:, None]), first, inf).astype(np.int32)
+    done = orig_lengths == 0
+    distance[done] = typed_lengths[done]
+
+    padded_typed = np.concatenate((np.zeros((pairs, 1), dtype=np.uint32), typed_codes), axis=1)
+    for i in range(1, rows):
+        prev = row
+        cols = offsets + (i - band)  # absolute column of each band cell
+        in_range = (cols >= 0)[None, :] & (cols[None, :] <= typed_lengths[:, None])
+
+        typed_at = padded_typed[:, np.clip(cols, 0, padded_typed.shape[1] - 1)]
+        cost = (typed_at != orig_codes[:, i - 1:i]).astype(np.int32)
+        diagonal = np.where((cols >= 1)[None, :], prev + cost, inf)
+        up = np.concatenate((prev[:, 1:], np.full((pairs, 1), inf, dtype=np.int32)), axis=1) + 1
+
+        best = np.where(in_range, np.minimum(diagonal, up), inf)
+        row = np.minimum.accumulate(best - offsets, axis=1) + offsets
+        row = np.where(in_range, np.minimum(row, inf), inf)
+        moves[i] = np.where(row == best, np.where(diagonal <= up, MOVE_DIAGONAL, MOVE_UP), MOVE_LEFT)
+
+        finished = orig_lengths == i
+        if finished.any():
+            distance[finished] = row[pair_index[finished], (typed_lengths - i + band)[finished]]
+
+    return distance, moves
+
+
+def _align_chunk(originals, typed_texts, band):
+    count = len(originals)
+    orig_lengths = np.array([len(t) for t in originals], dtype=np.int64)
+    typed_lengths = np.array([len(t) for t in typed_texts], dtype=np.int64)
+
+    orig_codes = np.zeros((count, max(int(orig_lengths.max(initial=0)), 1)), dtype=np.uint32)
+    typed_codes = np.zeros((count, max(int(typed_lengths.max(initial=0)), 1)), dtype=np.uint32)
+    for index, (original, typed) in enumerate(zip(originals, typed_texts)):
+        orig_codes[index, :len(original)] = encode_text(original)
+        typed_codes[index, :len(typed)] = encode_text(typed)
+
+    distance, moves = _banded_moves(orig_codes, typed_codes, orig_lengths, typed_lengths, band)
+
+    # Walk every pair back from its final cell in lock step
+    matches = np.zeros(count, dtype=np.int64)
+    steps = []
+    i, j = orig_lengths.copy(), typed_lengths.copy()
+    active = np.nonzero((i > 0) | (j > 0))[0]
+    while active.size:
+        ai, aj = i[active], j[active]
+        move = moves[ai, active, aj - ai + band]
+        expected = orig_codes[active, np.maximum(ai - 1, 0)]
+        actual = typed_codes[active, np.maximum(aj - 1, 0)]
+
+        diagonal = move == MOVE_DIAGONAL
+        same = diagonal & (expected == actual)
+        matches[active[same]] += 1
+
+        op = np.where(diagonal, OP_SUBSTITUTION, np.where(move == MOVE_UP, OP_OMISSION, OP_INSERTION))
+        error = ~same
+        if error.any():
+            position = np.where(op == OP_INSERTION, ai, ai - 1)
+            steps.append((
+                active[error],
+                position[error],
+                op[error],
+                np.where(op == OP_INSERTION, 0, expected)[error],
+                np.where(op == OP_OMISSION, 0, actual)[error],
+            ))
+
+        i[active] -= move != MOVE_LEFT
+        j[active] -= move != MOVE_UP
+        active = active[(i[active] > 0) | (j[active] > 0)]
+
+    if steps:
+        owner, position, op, expected, actual = (np.concatenate(column)[::-1] for column in zip(*steps))
+    else:
+        owner = position = op = expected = actual = np.zeros(0, dtype=np.int64)
+    order = np.argsort(owner, kind='stable')
+    records = np.zeros(order.size, dtype=ERROR_DTYPE)
+    records['position'] = position[order]
+    records['op'] = op[order]
+    records['expected'] = expected[order]
+    records['actual'] = actual[order]
+    errors = np.split(records, np.searchsorted(owner[order], np.arange(1, count)))
+
+    return orig_lengths, typed_lengths, distance, matches, errors
+
+
+# Upper bound on one chunk's move table (one byte per cell); a single pair may exceed it
+MAX_MOVE_CELLS = 64 * 1024 * 1024
+
+
+def _band_for(orig_length, typed_length, band):
+    """Band wide enough for the pair's length difference, rounded up by doubling"""
+    needed = abs(orig_length - typed_length)
+    if needed <= band:
+        return band
+    width = max(band, 1)
+    while width < needed:
+        width *= 2
+    return width
+
+
+def align_batch(originals, typed_texts, band=32, chunk_size=256):
+    """Alignment-aware scoring for many pairs.
+
+    Uses a banded edit distance so a single missed or extra keystroke is
+    reported as one omission or insertion instead of marking the rest of the
+    text incorrect. The band widens automatically to cover each pair's length
+    difference; pairs needing a wider band are aligned in chunks of their own. Returns a BatchAlignment whose per-pair fields
+    are arrays and whose errors field holds one ERROR_DTYPE array per pair,
+    ordered by position.
+    """
+    originals, typed_texts = list(originals), list(typed_texts)
+    if not originals:
+        empty = np.zeros(0, dtype=np.int64)
+        return BatchAlignment(empty, empty, empty, empty, np.zeros(0), [])
+
+    # Chunk pairs that need a similar band and have a similar length together, so
+    # one truncated attempt widens only its own chunk and little of each table is padding
+    bands = [_band_for(len(o), len(t), band) for o, t in zip(originals, typed_texts)]
+    order = sorted(range(len(originals)), key=lambda index: (bands[index], len(originals[index])))
+    parts = []
+    chunk = []
+    for index in order:
+        if chunk:
+            chunk_band = bands[chunk[0]]
+            cells = (len(originals[index]) + 1) * (len(chunk) + 1) * (2 * chunk_band + 1)
+            if bands[index] != chunk_band or len(chunk) >= chunk_size or cells > MAX_MOVE_CELLS:
+                parts.append(_align_chunk([originals[i] for i in chunk], [typed_texts[i] for i in chunk], chunk_band))
+                chunk = []
+        chunk.append(index)
+    parts.append(_align_chunk([originals[i] for i in chunk], [typed_texts[i] for i in chunk], bands[chunk[0]]))
+
+    restore = np.argsort(np.array(order))
+    orig_lengths, typed_lengths, distance, matches = (
+        np.concatenate(column)[restore] for column in list(zip(*parts))[:4]
+    )
+    sorted_errors = [pair_errors for part in parts for pair_errors in part[4]]
+    errors = [sorted_errors[index] for index in restore]
+    counts = np.array([np.bincount(e['op'], minlength=4) for e in errors]).reshape(-1, 4)
+
+    total = np.maximum(orig_lengths, typed_lengths)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = np.where(orig_lengths == 0, 100.0, np.round(matches / total * 100, 2))
+
+    return BatchAlignment(
+        distance=distance,
+        substitutions=counts[:, OP_SUBSTITUTION],
+        omissions=counts[:, OP_OMISSION],
+        insertions=counts[:, OP_INSERTION],
+        accuracy=accuracy,
+        errors=errors,
+    )